@@ -1,14 +1,45 @@
 // API基础URL
 const API_BASE_URL = 'http://localhost:8000/api';
 
+// 携带幂等键的请求在网络错误时的重试次数
+const MAX_RETRIES = 2;
+
+/**
+ * 生成幂等键（同一次提交的重试使用同一个键，服务器不会重复保存）
+ * @returns {string}
+ */
+function newIdempotencyKey() {
+    if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+/**
+ * 为一次表单提交选择幂等键：内容与上一次尚未成功的提交相同（重复点击、响应丢失后重试）时沿用原来的键，
+ * 内容改变后换新键，否则服务器会因同一个键携带不同的请求体而拒绝（422）
+ * @param {Object} pending - 该表单上一次提交的状态 {body, key}
+ * @param {Object} data - 本次提交的数据
+ * @returns {string}
+ */
+function idempotencyKeyFor(pending, data) {
+    const body = JSON.stringify(data);
+    if (pending.body !== body) {
+        pending.body = body;
+        pending.key = newIdempotencyKey();
+    }
+    return pending.key;
+}
+
 /**
  * 通用API请求函数
  * @param {string} endpoint - API端点
  * @param {Object} data - 请求数据
  * @param {string} method - HTTP方法
+ * @param {string} idempotencyKey - 幂等键（可选），携带时网络错误会自动重试
  * @returns {Promise} - 返回Promise对象
  */
-async function apiRequest(endpoint, data = null, method = 'GET') {
+async function apiRequest(endpoint, data = null, method = 'GET', idempotencyKey = null) {
     try {
         const url = `${API_BASE_URL}/${endpoint}`;
         const options = {
@@ -22,8 +53,22 @@ async function apiRequest(endpoint, data = null, method = 'GET') {
         if (data && (method === 'POST' || method === 'PUT' || method === 'PATCH')) {
             options.body = JSON.stringify(data);
         }
+        if (idempotencyKey) {
+            options.headers['Idempotency-Key'] = idempotencyKey;
+        }
 
-        const response = await fetch(url, options);
+        let response;
+        for (let attempt = 0; ; attempt++) {
+            try {
+                response = await fetch(url, options);
+                break;
+            } catch (networkError) {
+                if (!idempotencyKey || attempt >= MAX_RETRIES) {
+                    throw networkError;
+                }
+                await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+            }
+        }
         
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({}));
@@ -40,28 +85,31 @@ async function apiRequest(endpoint, data = null, method = 'GET') {
 /**
  * 提交申请表
  * @param {Object} applicationData - 申请表数据
+ * @param {string} idempotencyKey - 幂等键（可选）
  * @returns {Promise}
  */
-async function submitApplication(applicationData) {
-    return await apiRequest('apply', applicationData, 'POST');
+async function submitApplication(applicationData, idempotencyKey = null) {
+    return await apiRequest('apply', applicationData, 'POST', idempotencyKey);
 }
 
 /**
  * 提交联系表单
  * @param {Object} contactData - 联系表单数据
+ * @param {string} idempotencyKey - 幂等键（可选）
  * @returns {Promise}
  */
-async function submitContact(contactData) {
-    return await apiRequest('contact', contactData, 'POST');
+async function submitContact(contactData, idempotencyKey = null) {
+    return await apiRequest('contact', contactData, 'POST', idempotencyKey);
 }
 
 /**
  * 订阅通讯
  * @param {Object} newsletterData - 通讯订阅数据
+ * @param {string} idempotencyKey - 幂等键（可选）
  * @returns {Promise}
  */
-async function subscribeNewsletter(newsletterData) {
-    return await apiRequest('newsletter', newsletterData, 'POST');
+async function subscribeNewsletter(newsletterData, idempotencyKey = null) {
+    return await apiRequest('newsletter', newsletterData, 'POST', idempotencyKey);
 }
 
 // 活动日历功能已移除
@@ -81,6 +129,8 @@ function initFormSubmissions() {
     // 申请表单处理
     const applicationForm = document.querySelector('#join form');
     if (applicationForm) {
+        // 同一份表单内容的重复点击和重试共用一个幂等键，内容改变或提交成功后换新键
+        const pending = {};
         applicationForm.addEventListener('submit', async (e) => {
             e.preventDefault();
             
@@ -105,7 +155,8 @@ function initFormSubmissions() {
                 submitButton.textContent = '提交中...';
                 
                 // 提交数据
-                const result = await submitApplication(data);
+                const result = await submitApplication(data, idempotencyKeyFor(pending, data));
+                pending.body = null;
                 
                 // 显示成功消息
                 alert(result.message);
@@ -129,6 +180,8 @@ function initFormSubmissions() {
     // 联系表单处理
     const contactForm = document.querySelector('#contact form');
     if (contactForm) {
+        // 同一份表单内容的重复点击和重试共用一个幂等键，内容改变或提交成功后换新键
+        const pending = {};
         contactForm.addEventListener('submit', async (e) => {
             e.preventDefault();
             
@@ -148,7 +201,8 @@ function initFormSubmissions() {
                 submitButton.textContent = '发送中...';
                 
                 // 提交数据
-                const result = await submitContact(data);
+                const result = await submitContact(data, idempotencyKeyFor(pending, data));
+                pending.body = null;
                 
                 // 显示成功消息
                 alert(result.message);
@@ -172,6 +226,8 @@ function initFormSubmissions() {
     // 订阅表单处理
     const newsletterForm = document.querySelector('footer form');
     if (newsletterForm) {
+        // 同一份表单内容的重复点击和重试共用一个幂等键，内容改变或提交成功后换新键
+        const pending = {};
         newsletterForm.addEventListener('submit', async (e) => {
             e.preventDefault();
             
@@ -188,7 +244,8 @@ function initFormSubmissions() {
                 submitButton.textContent = '订阅中...';
                 
                 // 提交数据
-                const result = await subscribeNewsletter(data);
+                const result = await subscribeNewsletter(data, idempotencyKeyFor(pending, data));
+                pending.body = null;
                 
                 // 显示成功消息
                 alert(result.message);
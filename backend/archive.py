@@ -0,0 +1,325 @@
+"""
+历史数据归档与空间回收
+
+按保留策略把不再需要频繁访问的行（已读的旧联系消息、早已被拒绝的申请、长期未激活的订阅）
+从主数据库移动到单独的归档数据库，保持主库和它的页缓存足够小：
+
+1. 按id顺序每次读取一小批符合条件的行，先写入归档库并提交（按主键覆盖，重复执行安全）；
+2. 再在主库的一个短事务中删除这批行（删除时重新校验条件，期间被修改而不再符合条件的行保留在主库，
+   并从归档库中撤回），每批之间暂停一下，让在线写请求拿到写锁；
+3. 全部完成后分步执行 PRAGMA incremental_vacuum 把空闲页还给文件系统，并报告移动的行数和释放的字节数。
+
+按天汇总的统计（rollups）记录的是历史数据，归档不会修改它们。
+
+用法：
+    python archive.py                           # 按策略归档并回收空间
+    python archive.py --dry-run                 # 只统计各策略待归档的行数
+    python archive.py enable-incremental-vacuum # 把已有数据库切换为增量回收模式（执行一次完整VACUUM）
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, MetaData, Table, create_engine, delete, func, select
+from sqlalchemy.engine import make_url
+
+from models import Application, ContactMessage, Newsletter, application_tag
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_VACUUM_STEP_PAGES = 1000
+
+
+class Policy:
+    """一条保留策略：超过days天且满足条件的行被归档（days<=0表示不启用）"""
+
+    def __init__(self, name, model, days, condition, age_column):
+        self.name = name
+        self.model = model
+        self.table = model.__table__
+        self.days = days
+        self.condition = condition
+        self.age_column = age_column
+
+    def criteria(self, now):
+        cutoff = now - timedelta(days=self.days)
+        return (self.condition(), self.age_column() < cutoff)
+
+
+def default_policies():
+    """从环境变量读取各策略的保留天数"""
+    return [
+        Policy('read_contacts', ContactMessage, int(os.getenv('ARCHIVE_READ_CONTACTS_DAYS', 180)),
+               lambda: ContactMessage.is_read.is_(True),
+               lambda: ContactMessage.created_at),
+        Policy('rejected_applications', Application, int(os.getenv('ARCHIVE_REJECTED_APPLICATIONS_DAYS', 180)),
+               lambda: Application.status == 'rejected',
+               lambda: func.coalesce(Application.updated_at, Application.created_at)),
+        Policy('inactive_subscribers', Newsletter, int(os.getenv('ARCHIVE_INACTIVE_SUBSCRIBERS_DAYS', 365)),
+               lambda: Newsletter.is_active.is_(False),
+               lambda: Newsletter.subscribed_at),
+    ]
+
+
+def archive_url_for(database_url):
+    """归档库地址：优先使用ARCHIVE_DATABASE_URL，否则在主库旁边创建 *_archive.db
+
+    database_url 应传入主库引擎实际使用的地址（db.engine.url），其中的相对路径
+    已经按实例目录解析过，不受当前工作目录影响。
+    """
+    if os.getenv('ARCHIVE_DATABASE_URL'):
+        return os.getenv('ARCHIVE_DATABASE_URL')
+    url = make_url(database_url)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise ValueError('非SQLite主库需要设置 ARCHIVE_DATABASE_URL')
+    root, ext = os.path.splitext(os.path.abspath(url.database))
+    return url.set(database=f'{root}_archive{ext or ".db"}').render_as_string(hide_password=False)
+
+
+def _archive_tables(policies):
+    """归档表与原表列相同，只保留主键（不带唯一索引，同一邮箱/学号可以被多次归档），另加archived_at"""
+    metadata = MetaData()
+    tables = {}
+    for policy in policies:
+        if policy.table.name in tables:
+            continue
+        columns = [Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False)
+                   for c in policy.table.columns]
+        tables[policy.table.name] = Table(policy.table.name, metadata, *columns, Column('archived_at', DateTime))
+    return metadata, tables
+
+
+def database_size(conn):
+    """返回 (数据库逻辑大小字节数, 空闲页字节数)"""
+    if conn.dialect.name != 'sqlite':
+        return 0, 0
+    page_size = conn.exec_driver_sql('PRAGMA page_size').scalar()
+    page_count = conn.exec_driver_sql('PRAGMA page_count').scalar()
+    freelist = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+    return page_count * page_size, freelist * page_size
+
+
+def _archive_batch(engine, archive_engine, policy, archive_table, ids, now):
+    """移动一批行，返回实际从主库删除的行数"""
+    table = policy.table
+    with engine.connect() as conn:
+        rows = [dict(row._mapping) for row in conn.execute(select(table).where(table.c.id.in_(ids)))]
+    for row in rows:
+        row['archived_at'] = now
+
+    # 1. 先写归档库（按主键覆盖，中断后重跑不会产生重复）
+    with archive_engine.begin() as conn:
+        conn.execute(delete(archive_table).where(archive_table.c.id.in_(ids)))
+        if rows:
+            conn.execute(archive_table.insert(), rows)
+
+    # 2. 主库短事务：重新校验条件后删除，申请还要删除标签关联（SQLite未开启外键级联）
+    still_matching = select(table.c.id).where(table.c.id.in_(ids), *policy.criteria(now))
+    with engine.begin() as conn:
+        if table is Application.__table__:
+            conn.execute(delete(application_tag).where(application_tag.c.application_id.in_(still_matching)))
+        deleted = conn.execute(delete(table).where(table.c.id.in_(ids), *policy.criteria(now))).rowcount
+        kept = set(conn.execute(select(table.c.id).where(table.c.id.in_(ids))).scalars()) if deleted < len(ids) else set()
+
+    # 3. 期间被修改而保留在主库的行从归档库撤回
+    if kept:
+        with archive_engine.begin() as conn:
+            conn.execute(delete(archive_table).where(archive_table.c.id.in_(kept)))
+    return deleted
+
+
+def incremental_vacuum(engine, step_pages=DEFAULT_VACUUM_STEP_PAGES):
+    """分步回收空闲页，每步一个短事务；数据库未开启增量回收时返回False"""
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect() as conn:
+        if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2:
+            return False
+    remaining = None
+    while True:
+        with engine.connect() as conn:
+            free = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+            # 没有空闲页，或上一步没有进展（例如被长时间的读事务阻挡）时停止
+            if not free or free == remaining:
+                break
+            remaining = free
+            conn.rollback()
+            # sqlite3驱动的execute只执行一步（只释放一页），executescript会把语句执行完
+            conn.connection.driver_connection.executescript(f'PRAGMA incremental_vacuum({int(step_pages)})')
+        time.sleep(0.01)
+    with engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)')
+    return True
+
+
+def enable_incremental_vacuum(engine):
+    """把已有数据库切换为增量回收模式（需要一次完整VACUUM，期间会阻塞写入）"""
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.exec_driver_sql('VACUUM')
+        return conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2
+
+
+def run_archive(engine, archive_engine, policies=None, batch_size=None, pause=None, now=None, dry_run=False):
+    """按策略归档并回收空间，返回报告字典"""
+    policies = [p for p in (policies or default_policies()) if p.days > 0]
+    batch_size = batch_size or int(os.getenv('ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+    pause = pause if pause is not None else float(os.getenv('ARCHIVE_BATCH_PAUSE_MS', 50)) / 1000
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+
+    report = {'moved': {}, 'dry_run': dry_run}
+    with engine.connect() as conn:
+        size_before, _ = database_size(conn)
+
+    if dry_run:
+        with engine.connect() as conn:
+            for policy in policies:
+                report['moved'][policy.name] = conn.execute(
+                    select(func.count()).select_from(policy.table).where(*policy.criteria(now))
+                ).scalar()
+        return report
+
+    metadata, tables = _archive_tables(policies)
+    metadata.create_all(archive_engine)
+
+    for policy in policies:
+        moved = 0
+        last_id = 0
+        while True:
+            # 按id游标分批，整个过程只扫描一遍表
+            with engine.connect() as conn:
+                ids = conn.execute(
+                    select(policy.table.c.id)
+                    .where(policy.table.c.id > last_id, *policy.criteria(now))
+                    .order_by(policy.table.c.id)
+                    .limit(batch_size)
+                ).scalars().all()
+            if not ids:
+                break
+            moved += _archive_batch(engine, archive_engine, policy, tables[policy.table.name], ids, now)
+            last_id = ids[-1]
+            if pause:
+                time.sleep(pause)
+        report['moved'][policy.name] = moved
+
+    report['vacuumed'] = incremental_vacuum(
+        engine, int(os.getenv('ARCHIVE_VACUUM_STEP_PAGES', DEFAULT_VACUUM_STEP_PAGES)))
+    with engine.connect() as conn:
+        size_after, free_after = database_size(conn)
+    report.update({
+        'bytes_before': size_before,
+        'bytes_after': size_after,
+        'bytes_freed': size_before - size_after,
+        'bytes_free_pages': free_after,
+        'seconds': round(time.perf_counter() - started, 3),
+    })
+    return report
+
+
+def format_report(report):
+    lines = [f'{name}: {"待归档" if report["dry_run"] else "已归档"} {count} 行'
+             for name, count in report['moved'].items()]
+    if not report['dry_run']:
+        if not report['vacuumed']:
+            lines.append('数据库未开启增量回收，请先执行 python archive.py enable-incremental-vacuum')
+        lines.append(f'数据库大小 {report["bytes_before"]} -> {report["bytes_after"]} 字节，'
+                     f'释放 {report["bytes_freed"]} 字节，剩余空闲页 {report["bytes_free_pages"]} 字节，'
+                     f'耗时 {report["seconds"]} 秒')
+    return '\n'.join(lines)
+
+
+def _default_lock_path():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'bciai_club_archive.lock')
+
+
+def _try_lock(lock_file):
+    """非阻塞地取得文件锁，已被其他进程持有时返回False"""
+    try:
+        import fcntl
+    except ImportError:
+        # Windows没有fcntl，改用msvcrt锁住文件的第一个字节（关闭文件时释放）
+        import msvcrt
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def start_archiver(app, db, interval=None, on_change=None):
+    """启动定期归档的后台线程（ARCHIVE_INTERVAL_HOURS<=0时不启动）
+
+    每个worker都会启动线程，但通过文件锁保证同一时间只有一个进程在归档。
+    """
+    interval = interval if interval is not None else float(os.getenv('ARCHIVE_INTERVAL_HOURS', 0)) * 3600
+    if interval <= 0:
+        return None
+    lock_path = os.getenv('ARCHIVE_LOCK_FILE') or _default_lock_path()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with open(lock_path, 'w') as lock_file:
+                    if not _try_lock(lock_file):
+                        continue
+                    with app.app_context():
+                        archive_engine = create_engine(archive_url_for(db.engine.url))
+                        try:
+                            report = run_archive(db.engine, archive_engine)
+                        finally:
+                            archive_engine.dispose()
+                    if on_change is not None and any(report['moved'].values()):
+                        on_change()
+                    logger.info('定期归档完成\n%s', format_report(report))
+            except Exception as e:
+                logger.warning('定期归档失败：%s', e)
+
+    thread = threading.Thread(target=run, name='archiver', daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='归档历史数据并回收数据库空间')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'enable-incremental-vacuum'])
+    parser.add_argument('--dry-run', action='store_true', help='只统计待归档的行数，不做修改')
+    parser.add_argument('--batch-size', type=int, help='每批移动的行数')
+    args = parser.parse_args(argv)
+
+    from production_start import app, db, invalidate_stats
+
+    with app.app_context():
+        if args.command == 'enable-incremental-vacuum':
+            ok = enable_incremental_vacuum(db.engine)
+            print('✓ 已开启增量回收' if ok else '✗ 开启增量回收失败')
+            return 0 if ok else 1
+
+        archive_engine = create_engine(archive_url_for(db.engine.url))
+        try:
+            report = run_archive(db.engine, archive_engine, batch_size=args.batch_size, dry_run=args.dry_run)
+        finally:
+            archive_engine.dispose()
+        if not args.dry_run and any(report['moved'].values()):
+            invalidate_stats()
+        print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
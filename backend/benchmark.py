@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SAU脑机与人工智能俱乐部网站 - 并发压测脚本
+在本地用gunicorn启动 production_start:app（使用预先灌入数据的临时SQLite数据库），
+按配置的并发数和读写比例压测主要接口，输出吞吐量、p50/p95/p99延迟以及错误率和锁冲突率，
+并可与保存的基线结果比较，出现性能回退时以非零状态码退出。
+
+用法示例：
+    python benchmark.py --concurrency 32 --duration 30 --output result.json
+    python benchmark.py --baseline baseline.json            # 与基线比较
+    python benchmark.py --save-baseline baseline.json       # 保存为新的基线
+    python benchmark.py --url http://localhost:8000/api     # 压测已运行的服务
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 默认读写比例（权重）
+DEFAULT_MIX = 'stats=40,applications=35,apply=10,contact=10,newsletter=5'
+
+# 默认回退容忍度：吞吐量下降或p95延迟上升超过该比例即判定为回退
+DEFAULT_TOLERANCE = 0.2
+
+INTERESTS = ['脑机接口', '人工智能', '神经科学', '医疗应用', '机器人']
+SKILLS = ['python', 'c++', 'matlab', 'pytorch', 'eeg', 'web']
+
+
+def parse_mix(value):
+    """解析 "stats=40,apply=10" 形式的权重配置"""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'未知的操作: {name}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def seed_database(applications, contacts, subscribers, events):
+    """向DATABASE_URL指向的数据库批量灌入测试数据"""
+    sys.path.insert(0, BACKEND_DIR)
+    from production_start import app
+    from models import db, Application, ContactMessage, Newsletter, Event
+    import tags
+
+    def insert_rows(model, rows):
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+
+    now = datetime.utcnow()
+    rng = random.Random(42)
+    with app.app_context():
+        chunk = 1000
+        for start in range(0, applications, chunk):
+            rows = []
+            for i in range(start, min(start + chunk, applications)):
+                rows.append({
+                    'name': f'压测用户{i}', 'student_id': f'S{i:08d}', 'email': f'user{i}@example.com',
+                    'phone': '13800000000', 'major': rng.choice(['计算机', '生物医学工程', '自动化']),
+                    'position': rng.choice(['研究员', '开发', '运营']),
+                    'interests': ','.join(rng.sample(INTERESTS, 2)), 'skills': ','.join(rng.sample(SKILLS, 2)),
+                    'experience': '参与过脑电信号处理与机器学习相关项目。' * 5,
+                    'reason': '希望在俱乐部中学习脑机接口前沿技术。' * 3,
+                    'created_at': now - timedelta(minutes=i), 'updated_at': now - timedelta(minutes=i),
+                    'status': rng.choice(['pending', 'approved', 'rejected']),
+                    'interview_status': 'not_scheduled',
+                })
+            result = db.session.execute(Application.__table__.insert().returning(
+                Application.id, Application.interests, Application.skills), rows)
+            tags.set_application_tags(db.session, [tuple(row) for row in result])
+            db.session.commit()
+
+        insert_rows(ContactMessage, [{
+            'contact_name': f'访客{i}', 'contact_email': f'visitor{i}@example.com',
+            'contact_subject': '合作咨询', 'contact_message': '希望了解俱乐部的活动安排。',
+            'created_at': now - timedelta(minutes=i), 'is_read': i % 2 == 0,
+        } for i in range(contacts)])
+        insert_rows(Newsletter, [{
+            'email': f'subscriber{i}@example.com', 'subscribed_at': now, 'is_active': i % 10 != 0,
+        } for i in range(subscribers)])
+        insert_rows(Event, [{
+            'title': f'讲座{i}', 'description': '脑机接口前沿讲座', 'location': '图书馆报告厅',
+            'date': now + timedelta(days=i - events // 2), 'created_at': now,
+        } for i in range(events)])
+        db.session.commit()
+
+
+def start_server(workers, port, env):
+    """启动gunicorn并等待服务可用，返回 (进程, 启动耗时秒数)"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+         '--log-level', 'warning', 'production_start:app'],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn启动失败')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+            return process, time.perf_counter() - started
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('等待gunicorn启动超时')
+
+
+# ---------------------------------------------------------------------------
+# 压测操作：每个函数发出一个请求并返回响应
+# ---------------------------------------------------------------------------
+
+def op_stats(session, api, n, timeout):
+    return session.get(f'{api}/stats', timeout=timeout)
+
+
+def op_applications(session, api, n, timeout):
+    return session.get(f'{api}/applications', params={'limit': 50}, timeout=timeout)
+
+
+def op_apply(session, api, n, timeout):
+    return session.post(f'{api}/apply', json={
+        'name': f'压测提交{n}', 'student_id': f'B{n}', 'email': f'bench{n}@example.com',
+        'phone': '13900000000', 'major': '计算机', 'position': '开发',
+        'interests': random.sample(INTERESTS, 2), 'skills': random.sample(SKILLS, 2),
+        'experience': '压测数据', 'reason': '压测数据',
+    }, timeout=timeout)
+
+
+def op_contact(session, api, n, timeout):
+    return session.post(f'{api}/contact', json={
+        'contact-name': f'压测{n}', 'contact-email': f'bench{n}@example.com',
+        'contact-subject': '压测', 'contact-message': '压测消息',
+    }, timeout=timeout)
+
+
+def op_newsletter(session, api, n, timeout):
+    return session.post(f'{api}/newsletter', json={'email': f'bench{n}@example.com'}, timeout=timeout)
+
+
+OPERATIONS = {
+    'stats': op_stats,
+    'applications': op_applications,
+    'apply': op_apply,
+    'contact': op_contact,
+    'newsletter': op_newsletter,
+}
+
+
+def run_load(api, mix, concurrency, duration, timeout):
+    """按权重随机选择操作，并发执行指定时长，返回每个操作的原始样本"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+    counter = iter(range(10 ** 9))
+    stop_at = time.perf_counter() + duration
+    run_id = int(time.time())
+
+    def worker(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            name = rng.choices(names, weights)[0]
+            with lock:
+                n = f'{run_id}-{next(counter)}'
+            start = time.perf_counter()
+            try:
+                response = OPERATIONS[name](session, api, n, timeout)
+                status = response.status_code
+                locked = 'database is locked' in response.text
+            except requests.exceptions.RequestException:
+                status, locked = 0, False
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples[name].append((elapsed, status, locked))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def measure_first_requests(api, timeout, names=('stats', 'applications')):
+    """服务刚启动时各读接口第一个请求的延迟（毫秒），用于与稳定后的p50比较"""
+    session = requests.Session()
+    first = {}
+    for name in names:
+        start = time.perf_counter()
+        OPERATIONS[name](session, api, 'first', timeout)
+        first[name] = round((time.perf_counter() - start) * 1000, 2)
+    return first
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples, duration):
+    """计算吞吐量、延迟分位数、错误率和锁冲突率（延迟单位：毫秒）"""
+    def stats(items):
+        latencies = sorted(elapsed * 1000 for elapsed, _, _ in items)
+        count = len(items)
+        errors = sum(1 for _, status, _ in items if status == 0 or status >= 500)
+        locks = sum(1 for _, _, locked in items if locked)
+        return {
+            'requests': count,
+            'throughput': round(count / duration, 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'error_rate': round(errors / count, 4) if count else 0.0,
+            'lock_rate': round(locks / count, 4) if count else 0.0,
+        }
+
+    all_items = [item for items in samples.values() for item in items]
+    return {
+        'overall': stats(all_items),
+        'endpoints': {name: stats(items) for name, items in samples.items()},
+    }
+
+
+def compare_with_baseline(result, baseline, tolerance):
+    """与基线比较，返回回退项列表"""
+    regressions = []
+    for name, current in [('overall', result['overall'])] + list(result['endpoints'].items()):
+        base = baseline['overall'] if name == 'overall' else baseline.get('endpoints', {}).get(name)
+        if not base or not base.get('requests'):
+            continue
+        if current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: 吞吐量 {current['throughput']} < 基线 {base['throughput']}")
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms > 基线 {base['p95_ms']}ms")
+        if current['error_rate'] > base['error_rate'] + 0.01:
+            regressions.append(f"{name}: 错误率 {current['error_rate']} > 基线 {base['error_rate']}")
+        if current['lock_rate'] > base['lock_rate'] + 0.01:
+            regressions.append(f"{name}: 锁冲突率 {current['lock_rate']} > 基线 {base['lock_rate']}")
+    return regressions
+
+
+def print_report(result):
+    print(f"\n{'接口':<14}{'请求数':>8}{'吞吐(req/s)':>13}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'错误率':>8}{'锁冲突':>8}")
+    rows = list(result['endpoints'].items()) + [('overall', result['overall'])]
+    for name, s in rows:
+        print(f"{name:<14}{s['requests']:>8}{s['throughput']:>13}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+              f"{s['p99_ms']:>10}{s['error_rate']:>8}{s['lock_rate']:>8}")
+    startup = result.get('startup')
+    if startup:
+        print(f"\n启动耗时 {startup['seconds']}s")
+        for name, elapsed in startup['first_request_ms'].items():
+            p50 = result['endpoints'].get(name, {}).get('p50_ms')
+            print(f"  {name} 首个请求 {elapsed}ms" + (f"，稳定后p50 {p50}ms" if p50 is not None else ''))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='并发压测主要API接口')
+    parser.add_argument('--url', help='压测已运行服务的API基础URL（不指定则在本地启动gunicorn）')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn工作进程数')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=20, help='压测时长（秒）')
+    parser.add_argument('--warmup', type=float, default=2, help='正式压测前的预热时长（秒）')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'操作权重，默认 {DEFAULT_MIX}')
+    parser.add_argument('--seed-applications', type=int, default=5000)
+    parser.add_argument('--seed-contacts', type=int, default=2000)
+    parser.add_argument('--seed-subscribers', type=int, default=2000)
+    parser.add_argument('--seed-events', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=10, help='单个请求超时（秒）')
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    parser.add_argument('--baseline', help='与该JSON基线比较，出现回退时以状态码1退出')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许的回退比例')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = None
+    workdir = None
+    startup = None
+
+    try:
+        if args.url:
+            api = args.url.rstrip('/')
+        else:
+            workdir = tempfile.TemporaryDirectory(prefix='bciai_bench_')
+            # 数据库、缓存、指标和限流文件都放在临时目录，不影响生产环境的共享文件
+            isolated = {
+                'DATABASE_URL': f"sqlite:///{os.path.join(workdir.name, 'bench.db')}",
+                'CACHE_DIR': os.path.join(workdir.name, 'cache'),
+                'METRICS_DIR': os.path.join(workdir.name, 'metrics'),
+                'RATE_LIMIT_DB': os.path.join(workdir.name, 'ratelimit.db'),
+                # 压测流量全部来自本机，关闭限流以免测到的是429
+                'RATE_LIMIT_ENABLED': '0',
+            }
+            env = dict(os.environ, **isolated)
+            os.environ.update(isolated)
+
+            print('灌入测试数据...')
+            seed_database(args.seed_applications, args.seed_contacts, args.seed_subscribers, args.seed_events)
+            port = free_port()
+            print(f'启动gunicorn（{args.workers}个工作进程，端口{port}）...')
+            server, startup_seconds = start_server(args.workers, port, env)
+            api = f'http://127.0.0.1:{port}/api'
+            startup = {'seconds': round(startup_seconds, 3),
+                       'first_request_ms': measure_first_requests(api, args.timeout)}
+
+        if args.warmup > 0:
+            run_load(api, args.mix, args.concurrency, args.warmup, args.timeout)
+
+        print(f'压测中：并发 {args.concurrency}，时长 {args.duration} 秒...')
+        samples = run_load(api, args.mix, args.concurrency, args.duration, args.timeout)
+        result = summarize(samples, args.duration)
+        result['config'] = {
+            'workers': args.workers, 'concurrency': args.concurrency, 'duration': args.duration,
+            'mix': args.mix, 'url': args.url,
+        }
+        if startup is not None:
+            result['startup'] = startup
+        print_report(result)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+        if args.save_baseline:
+            with open(args.save_baseline, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f'\n基线已保存到 {args.save_baseline}')
+
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions = compare_with_baseline(result, baseline, args.tolerance)
+            if regressions:
+                print('\n❌ 检测到性能回退：')
+                for item in regressions:
+                    print(f'   - {item}')
+                return 1
+            print('\n✓ 未检测到性能回退')
+        return 0
+
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if workdir is not None:
+            workdir.cleanup()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
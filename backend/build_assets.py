@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+前端静态资源构建
+
+把仓库根目录下的页面和静态资源构建到输出目录（默认 dist/），由Nginx直接提供：
+- SVG：数字按 --svg-precision 位小数取整、去掉多余空白和XML声明（原图尺寸远大于显示尺寸，肉眼无差别）
+- HTML：去掉注释、合并空白，内联脚本按JS规则处理
+- JS：去掉缩进、空行和整行注释（保留换行，不依赖分号自动插入规则以外的改写）
+- SVG/JS使用带内容哈希的文件名（如 images/logo.1a2b3c4d5e.svg），页面中的引用同步改写，
+  可以永久缓存；页面本身文件名不变，每次都重新验证
+- 每个文件另外生成 .gz 和 .br（需要brotli包）预压缩版本，Nginx按Accept-Encoding直接发送
+
+用法：
+    python build_assets.py                      # 构建到仓库根目录下的dist/
+    python build_assets.py --output /var/www/html --svg-precision 0
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，缺少时只生成.gz
+    brotli = None
+
+FRONTEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 需要构建的页面和带哈希的资源（相对于FRONTEND_DIR）
+PAGE_PATTERNS = ('*.html',)
+ASSET_PATTERNS = ('images/*.svg', '*.js')
+
+MANIFEST_NAME = 'asset-manifest.json'
+HASH_LENGTH = 10
+COMPRESS_MIN_SIZE = 256  # 小于该字节数的文件不生成压缩版本
+DEFAULT_SVG_PRECISION = 1
+
+_NUMBER = re.compile(r'-?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?')
+_NUMERIC_ATTRIBUTE = re.compile(r'\b(d|points|transform|viewBox)="([^"]*)"')
+_IDENTITY_TRANSFORM = re.compile(r'\s+transform="translate\(\s*0(?:\s*[, ]\s*0)?\s*\)"')
+
+
+def _format_number(value, precision):
+    text = f'{round(value, precision):.{precision}f}'
+    if precision:
+        text = text.rstrip('0').rstrip('.')
+    if text in ('-0', ''):
+        return '0'
+    if text.startswith('0.'):
+        return text[1:]
+    if text.startswith('-0.'):
+        return '-' + text[2:]
+    return text
+
+
+def minify_svg(text, precision=DEFAULT_SVG_PRECISION):
+    """压缩SVG：数字取整、去掉空白、XML声明、注释和恒等变换"""
+    text = re.sub(r'<\?xml[^>]*\?>', '', text)
+    text = re.sub(r'<!--.*?-->', '', text, flags=re.S)
+    text = re.sub(r'\s+version="1\.1"', '', text)
+    text = _IDENTITY_TRANSFORM.sub('', text)
+
+    def shorten(match):
+        name, value = match.groups()
+        value = _NUMBER.sub(lambda number: _format_number(float(number.group()), precision), value)
+        value = re.sub(r'\s+', ' ', value).strip()
+        if name == 'd':
+            value = re.sub(r' ?([A-Za-z]) ?', r'\1', value)  # 命令字母两侧不需要空格
+            value = re.sub(r' (-)', r'\1', value)            # 负号本身就是分隔符
+            value = re.sub(r'(\.\d+) (?=\.)', r'\1', value)  # ".5 .5" 可以写成 ".5.5"
+        return f'{name}="{value}"'
+
+    text = _NUMERIC_ATTRIBUTE.sub(shorten, text)
+    text = re.sub(r'>\s+<', '><', text)
+    return text.strip()
+
+
+def minify_js(text):
+    """去掉缩进、行尾空白、空行和整行注释（多行模板字符串和块注释内部保持不变）"""
+    lines = []
+    in_template = in_comment = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if in_comment:
+                if '*/' in stripped:
+                    in_comment = False
+                    rest = stripped.split('*/', 1)[1].strip()
+                    if rest:
+                        lines.append(rest)
+                continue
+            if not stripped or stripped.startswith('//'):
+                continue
+            if stripped.startswith('/*'):
+                if '*/' not in stripped:
+                    in_comment = True
+                    continue
+                stripped = stripped.split('*/', 1)[1].strip()
+                if not stripped:
+                    continue
+            lines.append(stripped)
+        # 未转义的反引号个数为奇数时，模板字符串跨到了下一行
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines)
+
+
+_RAW_BLOCK = re.compile(r'(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)', re.S | re.I)
+
+
+def minify_html(text):
+    """去掉注释并合并空白；<pre>、<textarea>原样保留，内联脚本和样式单独处理"""
+    text = re.sub(r'<!--(?!\[if).*?-->', '', text, flags=re.S)
+    blocks = []
+
+    def stash(match):
+        open_tag, tag, body, close_tag = match.groups()
+        tag = tag.lower()
+        if tag == 'script' and not re.search(r'\bsrc=', open_tag, re.I):
+            body = minify_js(body)
+        elif tag == 'style':
+            body = '\n'.join(line.strip() for line in body.splitlines() if line.strip())
+        blocks.append(open_tag + body + close_tag)
+        return f'\x00{len(blocks) - 1}\x00'
+
+    text = _RAW_BLOCK.sub(stash, text)
+    # 只合并空白、不删除空白，行内元素之间的空格仍然保留
+    text = re.sub(r'\s+', lambda m: '\n' if '\n' in m.group() else ' ', text)
+    text = re.sub(r'\x00(\d+)\x00', lambda m: blocks[int(m.group(1))], text)
+    return text.strip() + '\n'
+
+
+_REFERENCE = re.compile(r'(?<=["\'(=])(\./)?([A-Za-z0-9_\-/.]+\.(?:svg|js))(?=["\')\s>])')
+
+
+def rewrite_references(text, mapping):
+    """把页面中对资源的引用改为带哈希的文件名，返回 (新文本, 找不到的本地资源列表)"""
+    missing = []
+
+    def replace(match):
+        prefix, path = match.groups()
+        path = path.lstrip('/')
+        if path in mapping:
+            return (prefix or '') + mapping[path]
+        if path.startswith('images/') and path not in missing:
+            missing.append(path)
+        return match.group()
+
+    return _REFERENCE.sub(replace, text), missing
+
+
+def hashed_name(path, data):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def write_variants(output_dir, path, data):
+    """写入文件及其 .gz/.br 预压缩版本，返回各版本的字节数"""
+    target = os.path.join(output_dir, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(data)
+    sizes = {'bytes': len(data)}
+    if len(data) < COMPRESS_MIN_SIZE:
+        return sizes
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        with open(target + '.gz', 'wb') as f:
+            f.write(compressed)
+        sizes['gzip'] = len(compressed)
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            with open(target + '.br', 'wb') as f:
+                f.write(compressed)
+            sizes['br'] = len(compressed)
+    return sizes
+
+
+def _collect(source_dir, patterns):
+    paths = []
+    for pattern in patterns:
+        paths.extend(os.path.relpath(path, source_dir).replace(os.sep, '/')
+                     for path in glob.glob(os.path.join(source_dir, pattern)))
+    return sorted(paths)
+
+
+def _prepare_output(output_dir):
+    """清空上一次的构建结果；目录中有其他内容时拒绝覆盖"""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        return
+    if os.listdir(output_dir) and not os.path.exists(os.path.join(output_dir, MANIFEST_NAME)):
+        raise ValueError(f'{output_dir} 不是空目录，也不是之前的构建结果，拒绝覆盖')
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def build(source_dir=FRONTEND_DIR, output_dir=None, svg_precision=DEFAULT_SVG_PRECISION):
+    """构建全部资源，返回报告字典"""
+    output_dir = output_dir or os.path.join(source_dir, 'dist')
+    started = time.perf_counter()
+    _prepare_output(output_dir)
+
+    mapping = {}
+    files = {}
+    for path in _collect(source_dir, ASSET_PATTERNS):
+        with open(os.path.join(source_dir, path), 'r', encoding='utf-8') as f:
+            original = f.read()
+        minified = minify_svg(original, svg_precision) if path.endswith('.svg') else minify_js(original)
+        data = minified.encode('utf-8')
+        mapping[path] = hashed_name(path, data)
+        sizes = write_variants(output_dir, mapping[path], data)
+        files[path] = dict(sizes, output=mapping[path], original=len(original.encode('utf-8')))
+
+    pages = {}
+    missing = {}
+    for path in _collect(source_dir, PAGE_PATTERNS):
+        with open(os.path.join(source_dir, path), 'r', encoding='utf-8') as f:
+            original = f.read()
+        html, not_found = rewrite_references(minify_html(original), mapping)
+        if not_found:
+            missing[path] = not_found
+        sizes = write_variants(output_dir, path, html.encode('utf-8'))
+        files[path] = dict(sizes, output=path, original=len(original.encode('utf-8')))
+        pages[path] = sorted({source for source, target in mapping.items() if target in html})
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(mapping, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    return {
+        'output': output_dir,
+        'files': files,
+        'pages': pages,
+        'missing': missing,
+        'brotli': brotli is not None,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def _page_weight(report, page):
+    """页面及其引用的资源：(原始字节数, 构建后实际传输的字节数)"""
+    paths = [page] + report['pages'][page]
+    original = sum(report['files'][path]['original'] for path in paths)
+    transferred = sum(min(report['files'][path].get(key, report['files'][path]['bytes'])
+                          for key in ('bytes', 'gzip', 'br'))
+                      for path in paths)
+    return original, transferred
+
+
+def format_report(report):
+    def size(value):
+        return f'{value:,}' if value is not None else '-'
+
+    lines = [f'{"文件":<28}{"原始":>12}{"压缩后":>12}{"gzip":>12}{"br":>12}  输出']
+    for path, sizes in sorted(report['files'].items()):
+        lines.append(f'{path:<28}{size(sizes["original"]):>12}{size(sizes["bytes"]):>12}'
+                     f'{size(sizes.get("gzip")):>12}{size(sizes.get("br")):>12}  {sizes["output"]}')
+    lines.append('')
+    for page in sorted(report['pages']):
+        original, transferred = _page_weight(report, page)
+        lines.append(f'{page} 页面总重量：{original / 1024:,.0f} KB -> {transferred / 1024:,.0f} KB'
+                     f'（减少 {100 * (1 - transferred / original):.1f}%）')
+    for page, paths in report['missing'].items():
+        lines.append(f'⚠ {page} 引用了不存在的资源：{", ".join(paths)}')
+    if not report['brotli']:
+        lines.append('⚠ 未安装brotli，只生成了.gz版本（pip install brotli）')
+    lines.append(f'输出目录 {report["output"]}，耗时 {report["seconds"]} 秒')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='压缩前端资源、生成带哈希的文件名和预压缩版本')
+    parser.add_argument('--source', default=FRONTEND_DIR, help='前端文件所在目录（默认仓库根目录）')
+    parser.add_argument('--output', help='输出目录（默认 <source>/dist）')
+    parser.add_argument('--svg-precision', type=int, default=DEFAULT_SVG_PRECISION, help='SVG数字保留的小数位数')
+    args = parser.parse_args(argv)
+    try:
+        report = build(args.source, args.output, args.svg_precision)
+    except ValueError as e:
+        print(f'✗ {e}')
+        return 1
+    print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+跨进程共享的TTL缓存
+
+gunicorn的多个worker各自拥有独立内存，进程内字典无法共享缓存或统一失效。
+这里把缓存条目以JSON文件形式保存在共享目录（默认优先使用/dev/shm内存文件系统），
+读写都不经过SQLite，写入通过临时文件加os.replace保证原子性。
+
+失效时除了删除条目，还会为该键写入新的代数标记（generation）。条目中记录生成时的代数，
+读取时代数不一致的条目视为不存在，因此失效之前开始计算、之后才写入的旧结果不会被使用。
+"""
+
+import json
+import os
+import tempfile
+import time
+import uuid
+
+
+def _default_cache_dir():
+    """选择默认缓存目录：优先内存文件系统，否则使用系统临时目录"""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'bciai_club_cache')
+
+
+class SharedCache:
+    """基于共享目录的简单TTL缓存，所有worker看到同一份数据"""
+
+    def __init__(self, cache_dir=None, default_ttl=60):
+        self.cache_dir = cache_dir or os.getenv('CACHE_DIR') or _default_cache_dir()
+        self.default_ttl = default_ttl
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _generation_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.generation')
+
+    def _write(self, path, data):
+        """先写临时文件再原子替换"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def generation(self, key):
+        """该键当前的代数标记（每次失效生成新的随机值，从未失效过时为空字符串）"""
+        try:
+            with open(self._generation_path(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def get(self, key):
+        """读取缓存，不存在、已过期或生成后被失效过时返回None"""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) < time.time():
+            return None
+        if entry.get('generation', '') != self.generation(key):
+            return None
+        return entry.get('value')
+
+    def set(self, key, value, ttl=None, generation=None):
+        """写入缓存；传入generation时，计算期间该键被失效过则不写入，返回是否写入"""
+        current = self.generation(key)
+        if generation is not None and generation != current:
+            return False
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = {'expires_at': time.time() + ttl, 'generation': current, 'value': value}
+        self._write(self._path(key), json.dumps(entry, ensure_ascii=False))
+        return True
+
+    def delete(self, key):
+        """删除缓存条目"""
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def invalidate(self, key):
+        """写操作后的失效：更新代数标记并删除条目，正在计算的旧结果不会再写入或被读到"""
+        self._write(self._generation_path(key), uuid.uuid4().hex)
+        self.delete(key)
+
+    def get_or_set(self, key, factory, ttl=None):
+        """命中则直接返回，否则调用factory生成并写入缓存（计算期间被失效时只返回不写入）"""
+        value = self.get(key)
+        if value is None:
+            generation = self.generation(key)
+            value = factory()
+            self.set(key, value, ttl, generation=generation)
+        return value
@@ -0,0 +1,88 @@
+"""
+响应压缩
+
+Nginx只反向代理/api而不压缩，这里由应用根据Accept-Encoding对较大的文本响应做
+brotli（安装了brotli时）或gzip压缩。流式导出按块增量压缩，不会把整个文件读入内存。
+"""
+
+import gzip
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def choose_encoding(accept_encoding):
+    """根据Accept-Encoding选择压缩算法，优先brotli"""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def _stream_gzip(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31：带gzip头
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _stream_brotli(chunks, level):
+    compressor = brotli.Compressor(quality=min(level, 11))
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def init_compression(app, min_size=None, level=None):
+    """注册after_request钩子，对超过阈值的响应进行压缩"""
+    min_size = min_size if min_size is not None else int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    level = level or int(os.getenv('COMPRESS_LEVEL', 6))
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            stream = _stream_brotli if encoding == 'br' else _stream_gzip
+            response.response = stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < min_size:
+                return response
+            if encoding == 'br':
+                response.set_data(brotli.compress(body, quality=min(level, 11)))
+            else:
+                response.set_data(gzip.compress(body, compresslevel=level))
+
+        response.headers['Content-Encoding'] = encoding
+        # 压缩后的表示与原始内容不同，强ETag改为弱ETag
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
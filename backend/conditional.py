@@ -0,0 +1,71 @@
+"""
+条件GET支持（ETag / Last-Modified）
+
+视图通过 @conditional(version_fn) 声明如何计算资源的版本。version_fn 只做一次
+轻量查询（例如max(id)、行数或单行的updated_at），返回 (版本标识, 最后修改时间)；
+客户端携带的If-None-Match / If-Modified-Since与之匹配时直接返回304，
+完全跳过ORM对象加载和JSON序列化。
+
+删除行不会改变max(updated_at)，最后修改时间不足以判断集合是否变化的资源
+使用 @conditional(version_fn, use_last_modified=False)：仍然返回Last-Modified，
+但只按ETag返回304。
+"""
+
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import request, make_response
+
+
+def make_etag(token):
+    """把版本标识转换为不透明的ETag"""
+    return hashlib.md5(str(token).encode('utf-8')).hexdigest()
+
+
+def is_not_modified(etag, last_modified=None):
+    """判断客户端缓存是否仍然有效（If-None-Match优先于If-Modified-Since）"""
+    if request.if_none_match:
+        # 压缩后的响应使用弱ETag，这里按弱比较匹配
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional(version_fn, use_last_modified=True):
+    """为GET视图添加ETag/Last-Modified校验
+
+    version_fn 接收与视图相同的参数，返回 (版本标识, 最后修改时间或None)；
+    返回None（例如资源不存在）或计算出错时按普通请求处理，由视图自行返回结果。
+    use_last_modified=False 时只带If-Modified-Since的请求不会得到304。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                version = version_fn(*args, **kwargs)
+            except Exception:
+                version = None
+            if version is None:
+                return view(*args, **kwargs)
+
+            token, last_modified = version
+            etag = make_etag(token)
+            if is_not_modified(etag, last_modified if use_last_modified else None):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # 允许缓存，但每次使用前都要向服务器验证
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,56 @@
+"""
+流式导出（CSV / NDJSON）
+
+查询结果通过yield_per按块从数据库游标读取，每块编码后立即发送给客户端，
+内存占用只和块大小有关，与表的总行数无关。
+"""
+
+import csv
+import io
+from datetime import datetime
+
+from serializers import dumps
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def iter_csv(result, columns):
+    """把查询结果按块编码为CSV文本（带BOM，便于Excel正确识别中文）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for partition in result.partitions():
+        for row in partition:
+            writer.writerow([_format_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(result, columns):
+    """把查询结果按块编码为NDJSON（每行一个JSON对象）"""
+    for partition in result.partitions():
+        lines = [
+            dumps(dict(zip(columns, (_format_value(value) for value in row))))
+            for row in partition
+        ]
+        yield b'\n'.join(lines) + b'\n'
+
+
+def stream_rows(session, stmt, columns, fmt, chunk_size=500):
+    """执行查询并返回对应格式的文本生成器"""
+    result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    encoder = iter_csv if fmt == 'csv' else iter_ndjson
+    return encoder(result, columns)
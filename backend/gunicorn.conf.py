@@ -0,0 +1,57 @@
+"""
+Gunicorn配置（在backend目录下启动gunicorn时自动加载）
+
+开启preload：master进程导入production_start并完成建表、迁移，worker通过fork
+共享已加载的代码和路由；每个worker在post_fork中打开自己的数据库连接、
+启动后台线程并预热，预热完成后才开始接收请求；worker退出时master合并并删除它的指标文件。
+开启组提交（GROUP_COMMIT=1）时默认使用gthread worker，每个进程GUNICORN_THREADS个线程，
+多个请求同时等待提交才能凑成批次。
+命令行参数（如 --workers、--bind）会覆盖这里的默认值。
+"""
+
+import os
+import time
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+group_commit = os.getenv('GROUP_COMMIT', '0') == '1'
+threads = int(os.getenv('GUNICORN_THREADS', 8 if group_commit else 1))
+if threads > 1:
+    worker_class = 'gthread'
+
+_started_at = time.perf_counter()
+
+
+def post_fork(server, worker):
+    from production_start import app, init_worker
+    if os.getenv('GROUP_COMMIT', '0') == '1' and worker.cfg.threads <= 1:
+        # 单线程worker一次只处理一个请求，每批只有一条，只会多等GROUP_COMMIT_MAX_DELAY_MS
+        server.log.warning('组提交需要多线程worker（GUNICORN_THREADS>1），已在该worker中关闭组提交')
+        os.environ['GROUP_COMMIT'] = '0'
+    init_worker(app)
+
+
+def on_starting(server):
+    # 清除上一次运行留下的各worker指标文件
+    from metrics import reset_directory
+    reset_directory()
+
+
+def worker_exit(server, worker):
+    # 在worker进程中执行：写出节流期间尚未写入的指标
+    from production_start import app
+    registry = app.extensions.get('metrics')
+    if registry is not None:
+        registry.flush(force=True)
+
+
+def child_exit(server, worker):
+    # 已退出worker的指标并入汇总文件并删除其文件
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    server.log.info('gunicorn启动完成，耗时 %.1fms', (time.perf_counter() - _started_at) * 1000)
@@ -0,0 +1,76 @@
+"""
+活动的iCalendar订阅源
+
+生成符合RFC 5545的VCALENDAR文本（CRLF换行、按75字节折行、转义特殊字符）。
+活动时间在数据库中以不带时区的本地时间保存，这里输出为浮动时间，由日历客户端按本地时区显示。
+"""
+
+import os
+from datetime import timedelta
+
+PRODID = '-//SAU BCIAI Club//Events//ZH'
+CALENDAR_NAME = 'SAU脑机与人工智能俱乐部活动'
+UID_DOMAIN = os.getenv('ICS_UID_DOMAIN', 'bciai-club')
+
+
+def escape_text(value):
+    """转义TEXT类型属性值中的反斜杠、分号、逗号和换行"""
+    return (str(value or '')
+            .replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """按75字节折行，续行以空格开头（不拆开多字节字符）"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    current, size, limit = [], 0, 75
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            parts.append(''.join(current))
+            current, size, limit = [], 0, 74
+        current.append(char)
+        size += char_size
+    parts.append(''.join(current))
+    return '\r\n '.join(parts)
+
+
+def _format_local(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _format_utc(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def build_calendar(events, duration=None):
+    """把活动列表生成为iCalendar文本，duration为每个活动的默认时长"""
+    duration = duration or timedelta(hours=float(os.getenv('ICS_EVENT_HOURS', 2)))
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(CALENDAR_NAME)}',
+    ]
+    for event in events:
+        stamp = event.updated_at or event.created_at or event.date
+        lines.extend([
+            'BEGIN:VEVENT',
+            f'UID:event-{event.id}@{UID_DOMAIN}',
+            f'DTSTAMP:{_format_utc(stamp)}',
+            f'DTSTART:{_format_local(event.date)}',
+            f'DTEND:{_format_local(event.date + duration)}',
+            f'SUMMARY:{escape_text(event.title)}',
+        ])
+        if event.description:
+            lines.append(f'DESCRIPTION:{escape_text(event.description)}')
+        if event.location:
+            lines.append(f'LOCATION:{escape_text(event.location)}')
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold_line(line) for line in lines) + '\r\n'
@@ -0,0 +1,123 @@
+"""
+表单重复提交防护
+
+- 幂等键：客户端在POST请求头中携带 Idempotency-Key，首次处理时把响应与业务数据写入
+  同一个事务；之后用同一个键重试会按主键查到原响应直接返回，不会再次插入或提交。
+  键在 IDEMPOTENCY_TTL_HOURS 小时后过期，由写入时定期清理。
+- 重复申请：Application.submission_hash 为 (学号, 职位) 的哈希并建有唯一索引，
+  同一学号重复申请同一职位时按索引一次查找即可发现。
+"""
+
+import hashlib
+import os
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, g, jsonify, request
+from sqlalchemy import delete, select
+
+from models import db, IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+TTL = timedelta(hours=float(os.getenv('IDEMPOTENCY_TTL_HOURS', 24)))
+
+# 每写入多少个键清理一次过期的键
+PURGE_EVERY = 100
+_writes = 0
+
+
+def _digest(*parts):
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def submission_hash(student_id, position):
+    """(学号, 职位) 的哈希，用于检测重复申请"""
+    return _digest(str(student_id).strip().lower(), str(position).strip())
+
+
+def current_key():
+    """当前请求的幂等键，在视图中取出后传给写操作"""
+    return g.get('idempotency_key')
+
+
+def lookup(session, key, request_hash, now=None):
+    """按主键查找未过期的响应，返回 (状态码, 响应体) 或 None；同一个键对应不同请求体时抛出ValueError"""
+    now = now or datetime.utcnow()
+    row = session.execute(
+        select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response_body)
+        .where(IdempotencyKey.key == key, IdempotencyKey.expires_at > now)
+    ).first()
+    if row is None:
+        return None
+    if row.request_hash != request_hash:
+        raise ValueError(f'{HEADER} 已用于内容不同的请求')
+    return row.status_code, row.response_body
+
+
+def remember(session, key, body, status_code, now=None):
+    """在业务数据所在的事务中保存响应（key为None时不做任何事）"""
+    global _writes
+    if key is None:
+        return
+    now = now or datetime.utcnow()
+    # 同一个键过期后可以再次使用，先删除过期的旧记录；未过期的重复键会违反主键约束
+    session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key[0], IdempotencyKey.expires_at <= now))
+    session.add(IdempotencyKey(
+        key=key[0], request_hash=key[1], status_code=status_code,
+        response_body=body, expires_at=now + TTL,
+    ))
+    _writes += 1
+    if _writes % PURGE_EVERY == 0:
+        session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now))
+
+
+def _replay(status_code, body):
+    response = Response(body, status=status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def replay_stored(key):
+    """返回该幂等键已保存的响应（用于并发的同键请求提交失败后），没有则返回None"""
+    if key is None:
+        return None
+    try:
+        stored = lookup(db.session, *key)
+    except ValueError:
+        return None
+    return _replay(*stored) if stored is not None else None
+
+
+def idempotent(scope):
+    """为POST视图启用Idempotency-Key
+
+    命中已保存的响应时直接重放；视图因并发的同键请求提交失败时，
+    改为返回另一个请求已经保存的响应。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            raw_key = request.headers.get(HEADER)
+            if not raw_key:
+                return view(*args, **kwargs)
+            if len(raw_key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'{HEADER} 长度不能超过 {MAX_KEY_LENGTH}'}), 400
+
+            key = (_digest(scope, raw_key), _digest(request.get_data(as_text=True)))
+            try:
+                stored = lookup(db.session, *key)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 422
+            if stored is not None:
+                return _replay(*stored)
+
+            g.idempotency_key = key
+            response = view(*args, **kwargs)
+            status_code = response[1] if isinstance(response, tuple) else response.status_code
+            if status_code >= 500:
+                db.session.rollback()
+                return replay_stored(key) or response
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+通讯群发端到端测试与吞吐量测量
+
+在本机启动一个简易SMTP服务器代替真实邮件服务（可模拟每封邮件的处理延迟、
+临时失败4xx、永久拒收5xx和连接断开），向临时SQLite数据库灌入订阅者，
+用 newsletter_sender 完整执行一次群发，然后核对：
+- 每个活跃订阅者恰好收到一封邮件（服务器收到的收件人与数据库记录一致）
+- 投递表中的状态、任务计数与服务器实际接收/拒收的数量一致
+并输出吞吐量（封/秒）。
+
+用法示例：
+    python mail_benchmark.py --subscribers 5000 --pool-size 8 --latency-ms 5
+    python mail_benchmark.py --temp-fail-rate 0.02 --reject-rate 0.01 --disconnect-every 300
+    python mail_benchmark.py --compare-sequential   # 同时测量单连接、每封重新连接的发送方式
+"""
+
+import argparse
+import os
+import random
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """只实现群发所需命令的SMTP服务器（EHLO/HELO、MAIL、RCPT、DATA、RSET、NOOP、QUIT）"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0, temp_fail_rate=0.0, reject_rate=0.0, disconnect_every=0, seed=42):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.latency = latency
+        self.temp_fail_rate = temp_fail_rate
+        self.reject_rate = reject_rate
+        self.disconnect_every = disconnect_every
+        self.received = Counter()  # 收件人 -> 收到的邮件数
+        self.rejected = set()      # 被永久拒收的收件人
+        self.sessions = 0
+        self.temp_failures = 0
+        self.disconnects = 0
+        self._commands = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='local-smtp', daemon=True).start()
+        return self
+
+    def decide(self, recipient):
+        """决定本次投递的结果：ok / temp_fail / reject / disconnect"""
+        with self._lock:
+            self._commands += 1
+            if self.disconnect_every and self._commands % self.disconnect_every == 0:
+                self.disconnects += 1
+                return 'disconnect'
+            if recipient in self.rejected:
+                return 'reject'
+            roll = self._random.random()
+            if roll < self.reject_rate:
+                self.rejected.add(recipient)
+                return 'reject'
+            if roll < self.reject_rate + self.temp_fail_rate:
+                self.temp_failures += 1
+                return 'temp_fail'
+            return 'ok'
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server._lock:
+            server.sessions += 1
+        self.reply('220 localhost ESMTP stand-in')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.wfile.write(b'250-localhost\r\n250-8BITMIME\r\n250-SMTPUTF8\r\n250 PIPELINING\r\n')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipient = command.split(':', 1)[1].split()[0].strip('<>')
+                outcome = server.decide(recipient)
+                if outcome == 'disconnect':
+                    return
+                if outcome == 'reject':
+                    self.reply('550 No such user')
+                elif outcome == 'temp_fail':
+                    self.reply('451 Try again later')
+                else:
+                    recipients.append(recipient)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    server.received.update(recipients)
+                self.reply('250 Queued')
+            elif verb == 'RSET':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+def seed_subscribers(count):
+    """灌入订阅者（每10个中有1个已取消订阅），返回活跃订阅者的邮箱集合"""
+    sys.path.insert(0, BACKEND_DIR)
+    from production_start import app
+    from models import db, Newsletter
+
+    now = datetime.utcnow()
+    rows = [{'email': f'subscriber{i}@example.com', 'subscribed_at': now, 'is_active': i % 10 != 0}
+            for i in range(count)]
+    with app.app_context():
+        for start in range(0, len(rows), 1000):
+            db.session.execute(Newsletter.__table__.insert(), rows[start:start + 1000])
+        db.session.commit()
+    return {row['email'] for row in rows if row['is_active']}
+
+
+def run_once(args, active, pool_size, messages_per_connection, label):
+    """启动一个SMTP服务器并执行一次群发，返回 (报告, 发现的问题列表)"""
+    from production_start import app
+    from models import db, NewsletterCampaign, NewsletterDelivery
+    from mailer import SMTPPool
+    import newsletter_sender
+
+    server = LocalSMTPServer(args.latency_ms / 1000, args.temp_fail_rate, args.reject_rate,
+                             args.disconnect_every).start()
+    try:
+        with app.app_context():
+            campaign_id = newsletter_sender.create_campaign(
+                db.session, f'{label}：俱乐部通讯', '本月活动安排……\n' * 20).id
+            db.session.commit()
+        pool = SMTPPool(host='127.0.0.1', port=server.port, security='none', size=pool_size,
+                        messages_per_connection=messages_per_connection, backoff=0.01, max_retries=5)
+        report = newsletter_sender.run_campaign(app, campaign_id, pool=pool)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    problems = []
+    duplicates = [email for email, count in server.received.items() if count > 1]
+    if duplicates:
+        problems.append(f'{len(duplicates)} 个收件人收到重复邮件')
+    unexpected = set(server.received) - active
+    if unexpected:
+        problems.append(f'{len(unexpected)} 封邮件发给了非活跃订阅者')
+    with app.app_context():
+        delivered = dict(db.session.query(NewsletterDelivery.email, NewsletterDelivery.status)
+                         .filter(NewsletterDelivery.campaign_id == campaign_id).all())
+        campaign = db.session.get(NewsletterCampaign, campaign_id)
+        if set(delivered) != active:
+            problems.append(f'收件人数 {len(delivered)} 与活跃订阅者数 {len(active)} 不一致')
+        sent = {email for email, status in delivered.items() if status == 'sent'}
+        if sent != set(server.received):
+            problems.append(f'记录为已发送 {len(sent)} 封，服务器实际收到 {len(server.received)} 封')
+        failed = {email for email, status in delivered.items() if status == 'failed'}
+        if failed - server.rejected:
+            problems.append(f'{len(failed - server.rejected)} 封记录为失败但未被服务器拒收')
+        if (campaign.sent_count, campaign.failed_count) != (len(sent), len(failed)):
+            problems.append('任务计数与投递记录不一致')
+        if campaign.status != 'completed':
+            problems.append(f'任务状态为 {campaign.status}')
+
+    report.update({'label': label, 'smtp_sessions': server.sessions,
+                   'temp_failures': server.temp_failures, 'disconnects': server.disconnects})
+    return report, problems
+
+
+def print_report(report):
+    print(f"\n[{report['label']}]")
+    print(f"  发送 {report['sent']} 封，失败 {report['failed']} 封，耗时 {report['seconds']} 秒")
+    print(f"  吞吐量 {report['messages_per_second']} 封/秒")
+    print(f"  SMTP会话 {report['smtp_sessions']} 个，重试 {report['retries']} 次"
+          f"（服务器临时失败 {report['temp_failures']} 次，断开连接 {report['disconnects']} 次）")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='通讯群发端到端测试与吞吐量测量')
+    parser.add_argument('--subscribers', type=int, default=5000, help='灌入的订阅者数（其中10%%已取消订阅）')
+    parser.add_argument('--pool-size', type=int, default=8, help='SMTP并发连接数')
+    parser.add_argument('--messages-per-connection', type=int, default=100, help='每个连接发送多少封后重新连接')
+    parser.add_argument('--latency-ms', type=float, default=5, help='模拟服务器处理每封邮件的延迟（毫秒）')
+    parser.add_argument('--temp-fail-rate', type=float, default=0.01, help='临时失败（451）的比例')
+    parser.add_argument('--reject-rate', type=float, default=0.002, help='永久拒收（550）的比例')
+    parser.add_argument('--disconnect-every', type=int, default=0, help='每处理多少个收件人主动断开一次连接')
+    parser.add_argument('--compare-sequential', action='store_true',
+                        help='另外测量单连接、每封邮件重新连接的发送方式作为对照')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix='bciai_mail_bench_') as workdir:
+        os.environ.update({
+            'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'mail_bench.db')}",
+            'CACHE_DIR': os.path.join(workdir, 'cache'),
+            'METRICS_DIR': os.path.join(workdir, 'metrics'),
+            'RATE_LIMIT_DB': os.path.join(workdir, 'ratelimit.db'),
+            'WARMUP': '0',
+        })
+        print(f'灌入 {args.subscribers} 个订阅者...')
+        active = seed_subscribers(args.subscribers)
+
+        runs = [('连接池', args.pool_size, args.messages_per_connection)]
+        if args.compare_sequential:
+            runs.append(('逐封发送', 1, 1))
+
+        all_problems = []
+        for label, pool_size, per_connection in runs:
+            report, problems = run_once(args, active, pool_size, per_connection, label)
+            print_report(report)
+            all_problems.extend(f'[{label}] {problem}' for problem in problems)
+
+        if all_problems:
+            print('\n❌ 校验失败：')
+            for problem in all_problems:
+                print(f'   - {problem}')
+            return 1
+        print('\n✓ 投递记录与SMTP服务器接收结果一致')
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+SMTP连接池
+
+多个发送线程各自持有一个SMTP连接，从队列中取出一批邮件在同一个会话里依次发送，
+每个连接发送 SMTP_MESSAGES_PER_CONNECTION 封后重新连接（避免超过服务器单次会话的限制），
+不必为每封邮件重新握手、STARTTLS和登录。
+
+- 临时错误（4xx应答、连接断开、超时）按指数退避重试，最多 SMTP_MAX_RETRIES 次
+- 永久错误（5xx应答）不重试，直接记为失败
+- 重试后仍无法连接或登录时停止整个连接池，剩余邮件保持未发送，修复配置后可以继续发送
+"""
+
+import os
+import queue
+import random
+import smtplib
+import ssl
+import threading
+import time
+from datetime import datetime
+
+SENT = 'sent'
+FAILED = 'failed'
+
+
+class SMTPUnavailable(Exception):
+    """无法连接或登录SMTP服务器"""
+
+
+def _is_permanent(error):
+    """5xx应答为永久错误，其余（4xx、断开、超时等）为临时错误"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    code = getattr(error, 'smtp_code', None)
+    return isinstance(code, int) and code >= 500
+
+
+def _describe(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        code, message = next(iter(error.recipients.values()))
+        error = smtplib.SMTPResponseException(code, message)
+    if isinstance(error, smtplib.SMTPResponseException):
+        message = error.smtp_error.decode('utf-8', 'replace') if isinstance(error.smtp_error, bytes) else error.smtp_error
+        return f'{error.smtp_code} {message}'[:300]
+    return f'{type(error).__name__}: {error}'[:300]
+
+
+class SMTPPool:
+    """并发发送邮件的SMTP连接池
+
+    submit() 放入的每批邮件为 [(编号, 收件人, 邮件字节), ...]，
+    每封邮件的结果 (编号, 状态, 尝试次数, 错误, 发送时间) 放入 results 队列。
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None, security=None, size=None,
+                 messages_per_connection=None, max_retries=None, backoff=None, timeout=None, sender=None):
+        self.host = host or os.getenv('SMTP_HOST', 'localhost')
+        self.port = port or int(os.getenv('SMTP_PORT', 25))
+        self.username = username if username is not None else os.getenv('SMTP_USERNAME', '')
+        self.password = password if password is not None else os.getenv('SMTP_PASSWORD', '')
+        self.security = security or os.getenv('SMTP_SECURITY', 'none')  # none, starttls, ssl
+        self.size = size or int(os.getenv('SMTP_POOL_SIZE', 4))
+        self.messages_per_connection = messages_per_connection or int(os.getenv('SMTP_MESSAGES_PER_CONNECTION', 100))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SMTP_MAX_RETRIES', 3))
+        self.backoff = backoff if backoff is not None else float(os.getenv('SMTP_RETRY_BACKOFF_MS', 500)) / 1000
+        self.timeout = timeout or float(os.getenv('SMTP_TIMEOUT', 30))
+        self.sender = sender or os.getenv('NEWSLETTER_FROM', 'noreply@localhost')
+        self.results = queue.Queue()
+        self.retries = 0
+        self.connections = 0
+        self.error = None
+        # 队列长度有限，生产者不会比发送速度快太多（背压）
+        self._queue = queue.Queue(maxsize=self.size * 2)
+        self._threads = []
+        self._closed = False
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._run, name=f'smtp-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, batch):
+        """放入一批邮件（队列满时阻塞）；连接池已停止时返回False"""
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(batch, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """等待已提交的邮件发送完毕并关闭所有连接（重复调用无副作用）"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def _connect(self):
+        if self.security == 'ssl':
+            client = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            client = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            client.ehlo()
+            if self.security == 'starttls':
+                client.starttls(context=ssl.create_default_context())
+                client.ehlo()
+            if self.username:
+                client.login(self.username, self.password)
+        except Exception:
+            _close(client)
+            raise
+        with self._lock:
+            self.connections += 1
+        return client
+
+    def _backoff(self, attempt):
+        delay = self.backoff * (2 ** (attempt - 1))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _run(self):
+        client, sent_on_connection = None, 0
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            for message_id, recipient, message in batch:
+                if self._stopped.is_set():
+                    # 连接池已停止：本批剩余的邮件不返回结果，保持未发送状态
+                    break
+                attempt = 0
+                while True:
+                    attempt += 1
+                    try:
+                        if client is None or sent_on_connection >= self.messages_per_connection:
+                            _close(client, quit=True)
+                            client, sent_on_connection = None, 0
+                            client = self._connect()
+                        options = ['SMTPUTF8'] if not recipient.isascii() else []
+                        client.sendmail(self.sender, [recipient], message, mail_options=options)
+                        sent_on_connection += 1
+                        self.results.put((message_id, SENT, attempt, None, datetime.utcnow()))
+                        break
+                    except Exception as e:
+                        if client is None:
+                            # 连接或登录失败：永久错误或重试耗尽时停止整个连接池
+                            if _is_permanent(e) or attempt > self.max_retries:
+                                self.error = SMTPUnavailable(_describe(e))
+                                self._stopped.set()
+                                break
+                        else:
+                            client = _reset(client, e)
+                            if _is_permanent(e) or attempt > self.max_retries:
+                                self.results.put((message_id, FAILED, attempt, _describe(e), None))
+                                break
+                        with self._lock:
+                            self.retries += 1
+                        self._backoff(attempt)
+        _close(client, quit=True)
+
+
+def _reset(client, error):
+    """单封邮件被拒绝时重置会话继续使用该连接，连接出错时关闭它，返回仍可用的连接或None"""
+    if isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+        try:
+            client.rset()
+            return client
+        except Exception:
+            pass
+    _close(client)
+    return None
+
+
+def _close(client, quit=False):
+    if client is None:
+        return
+    try:
+        if quit:
+            client.quit()
+        else:
+            client.close()
+    except Exception:
+        client.close()
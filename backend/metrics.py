@@ -0,0 +1,316 @@
+"""
+请求计时、SQL计数与Prometheus指标
+
+每个请求记录路由级别的延迟直方图、请求/响应大小，以及通过SQLAlchemy引擎事件统计的
+SQL语句条数和耗时。gunicorn各worker把自己的指标定期写入共享目录中的独立文件，
+/metrics 接口读取并合并所有文件后以Prometheus文本格式输出。
+worker退出后由gunicorn master（child_exit）把它的计数并入dead_workers.json并删除其文件，
+文件数不会随worker重启无限增长，计数器仍然单调递增；gunicorn启动时清空目录。
+超过阈值的慢请求会连同其执行的SQL一起写入日志，便于发现N+1查询和锁等待。
+"""
+
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from flask import Response, g, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP请求总数'),
+    'http_request_duration_seconds': ('histogram', 'HTTP请求处理耗时'),
+    'http_request_size_bytes': ('histogram', 'HTTP请求体大小'),
+    'http_response_size_bytes': ('histogram', 'HTTP响应体大小'),
+    'db_queries_per_request': ('histogram', '每个请求执行的SQL语句条数'),
+    'db_query_duration_seconds_total': ('counter', 'SQL语句累计耗时'),
+    'http_slow_requests_total': ('counter', '超过慢请求阈值的请求数'),
+}
+
+slow_logger = logging.getLogger('slow_requests')
+
+# 当前线程正在处理的请求的SQL记录（写线程、后台任务中执行的SQL不计入请求）
+_current = threading.local()
+
+
+def _default_metrics_dir():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'bciai_club_metrics')
+
+
+DEAD_WORKERS_FILE = 'dead_workers.json'
+
+
+def _merge(merged, values):
+    """把一个进程的指标累加到merged中"""
+    for name, series in values.items():
+        target = merged.setdefault(name, {})
+        for key, value in series.items():
+            if isinstance(value, dict):
+                current = target.get(key)
+                if current is None:
+                    target[key] = {'buckets': list(value['buckets']), 'sum': value['sum'],
+                                   'count': value['count'], 'le': value['le']}
+                else:
+                    current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+                    current['sum'] += value['sum']
+                    current['count'] += value['count']
+            else:
+                target[key] = target.get(key, 0) + value
+    return merged
+
+
+def _load(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_atomic(directory, path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def _worker_files(directory):
+    """返回 [(pid, 文件路径), ...]"""
+    files = []
+    for path in glob.glob(os.path.join(directory, 'worker_*.json')):
+        try:
+            files.append((int(os.path.basename(path).split('_')[1]), path))
+        except (IndexError, ValueError):
+            continue
+    return files
+
+
+def mark_process_dead(pid, directory=None):
+    """把已退出worker的指标并入dead_workers.json并删除它的文件（只由gunicorn master调用）
+
+    先写入合并结果（记录已并入的文件名），再删除worker文件；/metrics读取时跳过已并入的文件，
+    两步之间读取也不会重复计数。
+    """
+    directory = directory or os.getenv('METRICS_DIR') or _default_metrics_dir()
+    files = _worker_files(directory)
+    dead_paths = [path for file_pid, path in files if file_pid == pid]
+    if not dead_paths:
+        return
+    dead_path = os.path.join(directory, DEAD_WORKERS_FILE)
+    dead = _load(dead_path, {'files': [], 'values': {}})
+    # 只保留文件仍然存在的记录，列表不会无限增长
+    existing = {os.path.basename(path) for _, path in files}
+    merged_files = set(dead['files']) & existing
+    for path in dead_paths:
+        name = os.path.basename(path)
+        if name not in merged_files:
+            _merge(dead['values'], _load(path, {}))
+            merged_files.add(name)
+    dead['files'] = sorted(merged_files)
+    _write_atomic(directory, dead_path, json.dumps(dead))
+    for path in dead_paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def reset_directory(directory=None):
+    """删除上一次运行留下的指标文件（gunicorn启动时调用）"""
+    directory = directory or os.getenv('METRICS_DIR') or _default_metrics_dir()
+    paths = glob.glob(os.path.join(directory, 'worker_*.json')) + [os.path.join(directory, DEAD_WORKERS_FILE)]
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class MetricsRegistry:
+    """单个进程内的指标，定期写入共享目录供其他进程合并"""
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory or os.getenv('METRICS_DIR') or _default_metrics_dir()
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._values = {}
+        self._last_flush = 0.0
+        self._pid = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self):
+        # fork后pid改变，各worker自动写入各自的文件
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file = os.path.join(self.directory, f'worker_{self._pid}_{int(time.time() * 1000)}.json')
+            self._values = {}
+        return self._file
+
+    def inc(self, name, labels, amount=1):
+        key = json.dumps(labels, sort_keys=True)
+        with self._lock:
+            self._path()
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        key = json.dumps(labels, sort_keys=True)
+        with self._lock:
+            self._path()
+            series = self._values.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0, 'le': list(buckets)}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def flush(self, force=False):
+        """把本进程的指标写入共享目录（默认按时间间隔节流）"""
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        with self._lock:
+            path = self._path()
+            data = json.dumps(self._values)
+            self._last_flush = now
+        _write_atomic(self.directory, path, data)
+
+    def collect(self):
+        """合并所有worker文件和已退出worker的指标（保证计数器单调递增）"""
+        # 先读worker文件再读dead_workers.json，其间被并入的worker按后者计算
+        workers = [(os.path.basename(path), _load(path)) for _, path in _worker_files(self.directory)]
+        dead = _load(os.path.join(self.directory, DEAD_WORKERS_FILE), {'files': [], 'values': {}})
+        merged = _merge({}, dead['values'])
+        merged_files = set(dead['files'])
+        for name, values in workers:
+            if values is not None and name not in merged_files:
+                _merge(merged, values)
+        return merged
+
+    def render(self):
+        """输出Prometheus文本格式"""
+        lines = []
+        merged = self.collect()
+        for name, (kind, description) in METRICS.items():
+            series = merged.get(name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(series.items()):
+                labels = json.loads(key)
+                if kind == 'histogram':
+                    for bound, count in zip(value['le'], value['buckets']):
+                        lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {count}')
+                    lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {value["count"]}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {value["sum"]}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {value["count"]}')
+                else:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels, **extra):
+    items = dict(labels, **{k: str(v) for k, v in extra.items()})
+    if not items:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items.items())
+    return '{' + body + '}'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_current, 'queries', None) is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = getattr(_current, 'queries', None)
+    starts = conn.info.get('query_start')
+    if queries is None or not starts:
+        return
+    queries.append((statement, time.perf_counter() - starts.pop()))
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start'):
+        connection.info['query_start'].pop()
+
+
+def init_metrics(app, db, registry=None):
+    """为应用注册请求计时、SQL计数钩子和 /metrics 接口"""
+    registry = registry or MetricsRegistry()
+    app.extensions['metrics'] = registry
+    slow_threshold = float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 500)) / 1000
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(db.engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        _current.queries = []
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        queries = getattr(_current, 'queries', None) or []
+        _current.queries = None
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = {'method': request.method, 'route': route}
+        sql_time = sum(duration for _, duration in queries)
+
+        registry.inc('http_requests_total', dict(labels, status=str(response.status_code)))
+        registry.observe('http_request_duration_seconds', labels, elapsed, LATENCY_BUCKETS)
+        registry.observe('http_request_size_bytes', labels, request.content_length or 0, SIZE_BUCKETS)
+        if not response.is_streamed:
+            registry.observe('http_response_size_bytes', labels, response.calculate_content_length() or 0, SIZE_BUCKETS)
+        registry.observe('db_queries_per_request', labels, len(queries), QUERY_COUNT_BUCKETS)
+        registry.inc('db_query_duration_seconds_total', labels, sql_time)
+
+        if elapsed >= slow_threshold:
+            registry.inc('http_slow_requests_total', labels)
+            slow_logger.warning(
+                '慢请求 %s %s 耗时%.1fms，SQL %d条共%.1fms\n%s',
+                request.method, request.full_path, elapsed * 1000, len(queries), sql_time * 1000,
+                '\n'.join(f'  [{duration * 1000:.1f}ms] {statement}' for statement, duration in queries),
+            )
+
+        registry.flush()
+        return response
+
+    @app.teardown_request
+    def clear_request_queries(exc):
+        _current.queries = None
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus指标（合并所有worker）"""
+        registry.flush(force=True)
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    return registry
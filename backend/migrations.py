@@ -0,0 +1,312 @@
+"""
+数据库版本化迁移与查询计划检查
+
+每个迁移都有递增的版本号，执行后记录到schema_migrations表。
+多个gunicorn worker同时启动时（未使用--preload）通过迁移锁串行执行：SQLite在一个
+BEGIN IMMEDIATE事务中建表并执行全部迁移，等待锁的进程拿到锁后重新读取已应用的版本；
+其他数据库逐个迁移提交，因对象已存在而失败时若该版本已被其他进程记录则视为已应用。
+前置条件暂不满足的迁移（如SQLite版本不支持FTS5 trigram）抛出MigrationDeferred，
+不记录版本，之后每次启动时重试。
+
+用法：
+    python migrations.py              # 执行未应用的迁移
+    python migrations.py check-plans  # 检查接口查询是否走索引，出现全表扫描时返回非零状态码
+    python migrations.py rebuild-rollups  # 从原始数据重新生成按天汇总的统计表
+"""
+
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import inspect, select, func, text
+from sqlalchemy.exc import DBAPIError
+
+from models import (db, schema_migrations, Application, Event, Tag, application_tag, DailyRollup,
+                    IdempotencyKey, NewsletterCampaign, NewsletterDelivery)
+import idempotency
+import newsletter_sender
+import queries
+import rollups
+import search
+import tags
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationDeferred(Exception):
+    """迁移的前置条件暂不满足：跳过且不记录版本，下次执行迁移时重试"""
+
+
+def _create_indexes(conn, *names):
+    """按名称创建models.py中声明的索引（已存在则跳过）"""
+    indexes = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+def _add_column(conn, table, column, ddl_type):
+    """为已有表添加列（列已存在则跳过）"""
+    if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl_type}'))
+
+
+def _add_missing_columns(conn, model):
+    """补齐旧数据库中缺少的列（早期版本创建的表缺少后来添加的字段）
+
+    SQLite无法为已有行添加没有默认值的NOT NULL列，因此补齐的列一律可空，
+    必填校验由接口负责。
+    """
+    existing = {c['name'] for c in inspect(conn).get_columns(model.__tablename__)}
+    for column in model.__table__.columns:
+        if column.name not in existing:
+            _add_column(conn, model.__tablename__, column.name, column.type.compile(conn.dialect))
+
+
+def _migration_0001(conn):
+    _create_indexes(
+        conn,
+        'ix_application_status_created_at',
+        'ix_application_created_at',
+        'ix_newsletter_is_active',
+        'ix_event_date',
+    )
+
+
+def _migration_0002(conn):
+    _add_column(conn, 'application', 'updated_at', 'DATETIME')
+    conn.execute(text('UPDATE application SET updated_at = created_at WHERE updated_at IS NULL'))
+
+
+def _migration_0003(conn):
+    _add_missing_columns(conn, Application)
+    Tag.__table__.create(conn, checkfirst=True)
+    application_tag.create(conn, checkfirst=True)
+    tags.backfill(conn)
+
+
+def _migration_0004(conn):
+    if not search.fts5_available(conn):
+        raise MigrationDeferred('数据库不支持FTS5 trigram分词器（需要SQLite 3.34以上），搜索使用LIKE匹配')
+    search.create_fts_indexes(conn)
+
+
+def _migration_0005(conn):
+    DailyRollup.__table__.create(conn, checkfirst=True)
+    rollups.rebuild(conn)
+
+
+def _migration_0006(conn, chunk_size=500):
+    _add_column(conn, 'application', 'submission_hash', 'VARCHAR(32)')
+    IdempotencyKey.__table__.create(conn, checkfirst=True)
+
+    # 回填 (学号, 职位) 哈希；已有的重复申请只有最早的一条写入哈希，其余保持NULL，
+    # 不删除任何数据，同时保证唯一索引可以建立
+    seen = set(conn.execute(
+        select(Application.submission_hash).where(Application.submission_hash.is_not(None))
+    ).scalars())
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(Application.id, Application.student_id, Application.position)
+            .where(Application.id > last_id, Application.submission_hash.is_(None))
+            .order_by(Application.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            value = idempotency.submission_hash(row.student_id or '', row.position or '')
+            if value not in seen:
+                seen.add(value)
+                updates.append({'row_id': row.id, 'value': value})
+        if updates:
+            conn.execute(
+                text('UPDATE application SET submission_hash = :value WHERE id = :row_id'), updates
+            )
+        last_id = rows[-1].id
+    _create_indexes(conn, 'uq_application_submission_hash', 'ix_idempotency_key_expires_at')
+
+
+def _migration_0007(conn):
+    _add_column(conn, 'event', 'updated_at', 'DATETIME')
+    conn.execute(text('UPDATE event SET updated_at = created_at WHERE updated_at IS NULL'))
+    _create_indexes(conn, 'ix_event_updated_at')
+
+
+def _migration_0008(conn):
+    NewsletterCampaign.__table__.create(conn, checkfirst=True)
+    NewsletterDelivery.__table__.create(conn, checkfirst=True)
+
+
+def _migration_0009(conn):
+    _create_indexes(conn, 'ix_contact_message_is_read_created_at')
+
+
+# (版本号, 说明, 迁移函数)
+MIGRATIONS = [
+    (1, '为申请列表、统计和活动查询创建索引', _migration_0001),
+    (2, '为申请表添加updated_at列', _migration_0002),
+    (3, '创建兴趣方向/技术技能标签表并回填已有申请', _migration_0003),
+    (4, '创建申请和联系消息的FTS5全文索引', _migration_0004),
+    (5, '创建按天汇总的统计表并从已有数据生成', _migration_0005),
+    (6, '添加重复申请检测哈希和幂等键表', _migration_0006),
+    (7, '为活动表添加updated_at列', _migration_0007),
+    (8, '创建通讯群发任务和投递状态表', _migration_0008),
+    (9, '为联系消息创建按已读状态和时间的索引', _migration_0009),
+]
+
+
+# 等待其他进程执行迁移的最长时间（秒）
+MIGRATION_LOCK_TIMEOUT = int(os.getenv('MIGRATION_LOCK_TIMEOUT', 600))
+
+
+def _applied(conn):
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def applied_versions(engine):
+    """返回已应用的迁移版本集合"""
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return _applied(conn)
+
+
+@contextmanager
+def _sqlite_migration_lock(engine):
+    """取得SQLite写锁并在同一个事务中执行建表和迁移，其他进程在BEGIN IMMEDIATE处等待"""
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f'PRAGMA busy_timeout={MIGRATION_LOCK_TIMEOUT * 1000}')
+        try:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))}")
+
+
+def _run_locked(conn, create_tables):
+    if create_tables:
+        db.metadata.create_all(conn)
+    else:
+        schema_migrations.create(conn, checkfirst=True)
+    # 拿到锁之后再读取，等待期间其他进程可能已经执行完迁移
+    done = _applied(conn)
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            upgrade(conn)
+        except MigrationDeferred as e:
+            logger.warning('迁移 %d 暂缓执行：%s', version, e)
+            continue
+        conn.execute(schema_migrations.insert().values(
+            version=version, description=description, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+
+def _run_each(engine, create_tables):
+    """非SQLite数据库：逐个迁移提交，与其他进程冲突时以版本记录为准"""
+    if create_tables:
+        db.metadata.create_all(engine)
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version in applied_versions(engine):
+            continue
+        try:
+            with engine.begin() as conn:
+                upgrade(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()))
+            applied.append(version)
+        except MigrationDeferred as e:
+            logger.warning('迁移 %d 暂缓执行：%s', version, e)
+        except DBAPIError:
+            # 对象已存在、版本号重复等：其他进程已经完成了该迁移
+            if version not in applied_versions(engine):
+                raise
+    return applied
+
+
+def run_migrations(engine, create_tables=False):
+    """按版本顺序执行尚未应用的迁移（create_tables=True时先创建缺少的表），返回本次应用的版本列表"""
+    if engine.dialect.name != 'sqlite':
+        return _run_each(engine, create_tables)
+    with _sqlite_migration_lock(engine) as conn:
+        return _run_locked(conn, create_tables)
+
+
+# 允许使用临时B树排序的查询：只对筛选出的申请或每个标签一行排序，不随申请总数增长到全表
+BOUNDED_SORTS = {'按标签筛选申请列表', '标签统计', '筛选结果的标签统计'}
+
+
+def endpoint_queries():
+    """各接口实际执行的查询语句（与接口使用同样的构建函数），用于检查查询计划"""
+    last_page = (datetime(2025, 6, 1), 1000)
+    tag_filter = [tags.has_tag(tags.SKILL, 'python')]
+    return [
+        ('申请列表', queries.application_list(limit=51)),
+        ('申请列表下一页', queries.application_list(after=last_page, limit=51)),
+        ('按状态筛选申请列表', queries.application_list([Application.status == 'pending'], last_page, limit=51)),
+        ('按标签筛选申请列表', queries.application_list(tag_filter, limit=51)),
+        ('按状态和标签筛选申请列表', queries.application_list([Application.status == 'pending'] + tag_filter, limit=51)),
+        ('标签统计', tags.facet_counts_query()),
+        ('筛选结果的标签统计', tags.facet_counts_query(queries.filtered_application_ids(tag_filter))),
+        ('申请状态统计', queries.application_status_counts()),
+        ('联系消息、订阅者和活动计数', queries.stats_counts()),
+        ('活跃订阅者统计', queries.active_subscriber_count()),
+        ('群发读取活跃订阅者', newsletter_sender.active_subscriber_chunk(0, 500)),
+        ('群发读取未发送收件人', newsletter_sender.pending_deliveries(1, 0, 500)),
+        ('活动列表', queries.events()),
+        ('按日期范围查询活动', queries.events(datetime(2025, 1, 1), datetime(2025, 7, 1), limit=50)),
+        ('活动最后修改时间', select(func.max(Event.updated_at))),
+        ('最早未开始的活动', queries.next_event_start(datetime(2025, 1, 1))),
+        ('统计时间序列', rollups.timeseries_query(rollups.APPLICATIONS, 'status', date(2025, 1, 1), date(2025, 12, 31))),
+    ]
+
+
+def check_query_plans(engine, queries=None):
+    """对接口查询执行EXPLAIN QUERY PLAN，返回出现全表扫描或临时排序的问题列表"""
+    if engine.dialect.name != 'sqlite':
+        return []
+    problems = []
+    with engine.connect() as conn:
+        for name, stmt in queries or endpoint_queries():
+            sql = str(stmt.compile(engine, compile_kwargs={'literal_binds': True}))
+            details = [row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+            for detail in details:
+                # SCAN CONSTANT ROW是没有FROM的外层SELECT，不读取任何表
+                full_scan = detail.startswith('SCAN') and 'INDEX' not in detail and detail != 'SCAN CONSTANT ROW'
+                temp_sort = 'TEMP B-TREE' in detail and name not in BOUNDED_SORTS
+                if full_scan or temp_sort:
+                    problems.append(f'{name}: {detail}')
+    return problems
+
+
+if __name__ == '__main__':
+    from production_start import app
+
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'check-plans':
+            problems = check_query_plans(db.engine)
+            for problem in problems:
+                print(f'✗ {problem}')
+            if not problems:
+                print('✓ 所有接口查询均使用索引')
+            sys.exit(1 if problems else 0)
+
+        if len(sys.argv) > 1 and sys.argv[1] == 'rebuild-rollups':
+            with db.engine.begin() as conn:
+                rollups.rebuild(conn)
+            print('✓ 统计汇总表已重新生成')
+            sys.exit(0)
+
+        applied = run_migrations(db.engine)
+        print(f'已应用迁移: {applied}' if applied else '数据库已是最新版本')
@@ -1,9 +1,68 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from datetime import datetime
+import os
+import sqlite3
+import threading
+import time
 
 # 创建数据库实例
 db = SQLAlchemy()
 
+# SQLite连接参数：WAL模式允许读写并发，busy_timeout让写锁冲突时等待而不是直接报"database is locked"
+SQLITE_PRAGMAS = {
+    # 增量回收空闲页（只对新建的数据库生效，已有数据库见 archive.py enable-incremental-vacuum）
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),  # 毫秒
+    'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', 20000)),  # 负数表示KB
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),  # 字节
+    'temp_store': 'MEMORY',
+}
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新建的SQLite连接都应用上面的PRAGMA设置"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+def start_wal_checkpointer(app, interval=None, mode=None):
+    """启动后台线程定期执行wal_checkpoint，防止WAL文件在持续读取下无限增长"""
+    interval = interval or int(os.getenv('SQLITE_CHECKPOINT_INTERVAL', 300))
+    mode = mode or os.getenv('SQLITE_CHECKPOINT_MODE', 'PASSIVE')
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    if db.engine.dialect.name != 'sqlite':
+                        return
+                    with db.engine.connect() as conn:
+                        conn.exec_driver_sql(f'PRAGMA wal_checkpoint({mode})')
+            except Exception as e:
+                app.logger.warning(f'WAL检查点执行失败：{e}')
+
+    thread = threading.Thread(target=run, name='wal-checkpoint', daemon=True)
+    thread.start()
+    return thread
+
+# 已应用的数据库迁移版本记录（见migrations.py）
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, default=datetime.utcnow),
+)
+
 
 class Application(db.Model):
     """申请表模型 - 用于"加入我们"功能"""
@@ -24,14 +83,45 @@ class Application(db.Model):
     github_url = db.Column(db.String(200), nullable=True)  # GitHub链接
     other_info = db.Column(db.Text, nullable=True)  # 其他信息
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # 最后修改时间，用于ETag校验
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     interview_status = db.Column(db.String(20), default='not_scheduled')  # 面试状态：not_scheduled, scheduled, completed
     interview_notes = db.Column(db.Text, nullable=True)  # 面试备注
+    submission_hash = db.Column(db.String(32), nullable=True)  # (学号, 职位)的哈希，防止重复申请同一职位
+
+    __table_args__ = (
+        db.Index('ix_application_status_created_at', 'status', 'created_at'),  # 按状态筛选并按时间排序
+        db.Index('ix_application_created_at', 'created_at'),  # 全量列表按时间排序
+        db.Index('uq_application_submission_hash', 'submission_hash', unique=True),  # 重复申请检测
+    )
 
     def __repr__(self):
         return f'<Application {self.name} - {self.position}>'
 
 
+class Tag(db.Model):
+    """标签模型 - 申请中的兴趣方向和技术技能，用于按标签筛选和统计"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # interest, skill
+    name = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'name', name='uq_tag_kind_name'),
+    )
+
+    def __repr__(self):
+        return f'<Tag {self.kind}:{self.name}>'
+
+
+# 申请与标签的关联表
+application_tag = db.Table(
+    'application_tag',
+    db.Column('application_id', db.Integer, db.ForeignKey('application.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_application_tag_tag_id', 'tag_id', 'application_id'),  # 按标签查找申请
+)
+
+
 class ContactMessage(db.Model):
     """联系消息模型"""
     id = db.Column(db.Integer, primary_key=True)
@@ -42,6 +132,10 @@ class ContactMessage(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_contact_message_is_read_created_at', 'is_read', 'created_at'),  # 按已读状态导出和归档，统计消息数
+    )
+
     def __repr__(self):
         return f'<ContactMessage {self.contact_subject}>'
 
@@ -53,10 +147,54 @@ class Newsletter(db.Model):
     subscribed_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (
+        db.Index('ix_newsletter_is_active', 'is_active'),  # 统计活跃订阅者
+    )
+
     def __repr__(self):
         return f'<Newsletter {self.email}>'
 
 
+class NewsletterCampaign(db.Model):
+    """通讯群发任务"""
+    __tablename__ = 'newsletter_campaign'
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, completed, failed
+    total_recipients = db.Column(db.Integer, nullable=True)  # 生成收件人列表后写入，为空表示尚未生成
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(300), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<NewsletterCampaign {self.subject}>'
+
+
+class NewsletterDelivery(db.Model):
+    """每个收件人的投递状态"""
+    __tablename__ = 'newsletter_delivery'
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('newsletter_campaign.id', ondelete='CASCADE'), nullable=False)
+    newsletter_id = db.Column(db.Integer, nullable=False)
+    email = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(300), nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('uq_newsletter_delivery_campaign_subscriber', 'campaign_id', 'newsletter_id', unique=True),  # 同一任务每个订阅者只发一次
+        db.Index('ix_newsletter_delivery_campaign_status', 'campaign_id', 'status'),  # 按id顺序读取未发送的收件人
+    )
+
+    def __repr__(self):
+        return f'<NewsletterDelivery {self.campaign_id}/{self.email} {self.status}>'
+
+
 class Event(db.Model):
     """活动模型"""
     id = db.Column(db.Integer, primary_key=True)
@@ -65,6 +203,42 @@ class Event(db.Model):
     date = db.Column(db.DateTime, nullable=False)
     location = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # 最后修改时间，用于ETag和日历缓存校验
+
+    __table_args__ = (
+        db.Index('ix_event_date', 'date'),  # 活动按日期排序和按日期范围筛选
+        db.Index('ix_event_updated_at', 'updated_at'),  # 取最后修改时间
+    )
+
+    def __repr__(self):
+        return f'<Event {self.title}>'
+
+
+class IdempotencyKey(db.Model):
+    """幂等键 - 保存带Idempotency-Key的提交的响应，重试时直接返回，过期后清理"""
+    __tablename__ = 'idempotency_key'
+    key = db.Column(db.String(32), primary_key=True)  # 接口名和客户端幂等键的哈希
+    request_hash = db.Column(db.String(32), nullable=False)  # 请求体哈希，同一个键不能用于不同内容
+    status_code = db.Column(db.Integer, nullable=False)
+    response_body = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_idempotency_key_expires_at', 'expires_at'),  # 清理过期的键
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key}>'
+
+
+class DailyRollup(db.Model):
+    """按天汇总的计数 - 统计时间序列只读这张表，不扫描原始数据表"""
+    __tablename__ = 'daily_rollup'
+    metric = db.Column(db.String(30), primary_key=True)  # applications, contacts, subscriptions
+    dimension = db.Column(db.String(30), primary_key=True)  # all, status, position, major, interest
+    day = db.Column(db.Date, primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)  # 维度取值，dimension为all时为空字符串
+    count = db.Column(db.Integer, nullable=False, default=0)
 
     def __repr__(self):
-        return f'<Event {self.title}>'
\ No newline at end of file
+        return f'<DailyRollup {self.metric}/{self.dimension}={self.value} {self.day}: {self.count}>'
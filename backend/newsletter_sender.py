@@ -0,0 +1,312 @@
+"""
+通讯群发
+
+1. 生成收件人：沿 ix_newsletter_is_active 索引按id分块读取活跃订阅者，每块用一条
+   INSERT ... SELECT 写入newsletter_delivery（已存在的收件人跳过，可以重复执行）
+2. 发送：按id分块读取未发送的收件人，交给SMTP连接池（见mailer.py）并发发送
+3. 记录：发送结果攒够一批后用一条executemany UPDATE写回，同时累加任务的发送/失败计数
+
+任务在后台线程中执行，不占用处理请求的worker。中断（进程重启、SMTP不可用）后
+未发送的收件人保持pending，确认原发送线程已停止后可以继续发送：
+
+    python newsletter_sender.py send --subject "主题" --body-file body.txt
+    python newsletter_sender.py resume 3
+    python newsletter_sender.py status 3
+"""
+
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from email.message import EmailMessage
+from email.policy import SMTP
+from email.utils import formatdate
+
+from sqlalchemy import exists, func, literal, select, update
+
+from mailer import FAILED, SENT, SMTPPool
+from models import db, Newsletter, NewsletterCampaign, NewsletterDelivery
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+PENDING = 'pending'
+SENDING = 'sending'
+COMPLETED = 'completed'
+CAMPAIGN_FAILED = 'failed'
+
+CHUNK_SIZE = int(os.getenv('NEWSLETTER_CHUNK_SIZE', 500))  # 每次从数据库读取的收件人数
+BATCH_SIZE = int(os.getenv('NEWSLETTER_BATCH_SIZE', 25))   # 每次交给一个SMTP连接的邮件数
+FLUSH_SIZE = int(os.getenv('NEWSLETTER_FLUSH_SIZE', 200))  # 攒够多少个结果写回一次
+
+UNSUBSCRIBE_URL = os.getenv('NEWSLETTER_UNSUBSCRIBE_URL', '')  # 可包含{email}占位符
+MESSAGE_ID_DOMAIN = os.getenv('NEWSLETTER_MESSAGE_ID_DOMAIN', 'bciai-club')
+
+
+class MessageTemplate:
+    """同一任务的邮件正文和公共头部只编码一次，每个收件人只在前面加上自己的头部"""
+
+    def __init__(self, campaign, sender):
+        message = EmailMessage(policy=SMTP)
+        message['From'] = sender
+        message['Subject'] = campaign.subject
+        message['Date'] = formatdate(localtime=True)
+        message.set_content(campaign.body)
+        self.campaign_id = campaign.id
+        self.body = message.as_bytes()
+
+    def render(self, delivery_id, email):
+        headers = [f'To: {email}', f'Message-ID: <newsletter-{self.campaign_id}-{delivery_id}@{MESSAGE_ID_DOMAIN}>']
+        if UNSUBSCRIBE_URL:
+            headers.append(f'List-Unsubscribe: <{UNSUBSCRIBE_URL.format(email=email)}>')
+        return ('\r\n'.join(headers) + '\r\n').encode('utf-8') + self.body
+
+
+def create_campaign(session, subject, body):
+    """新建群发任务（不提交事务）"""
+    campaign = NewsletterCampaign(subject=subject, body=body, status=PENDING)
+    session.add(campaign)
+    session.flush()
+    return campaign
+
+
+def active_subscriber_chunk(last_id, chunk_size):
+    """id大于last_id的下一块活跃订阅者（沿ix_newsletter_is_active索引读取）"""
+    return (
+        select(Newsletter.id)
+        .where(Newsletter.is_active.is_(True), Newsletter.id > last_id)
+        .order_by(Newsletter.id)
+        .limit(chunk_size)
+    )
+
+
+def pending_deliveries(campaign_id, last_id, chunk_size):
+    """id大于last_id的下一块未发送收件人"""
+    return (
+        select(NewsletterDelivery.id, NewsletterDelivery.email)
+        .where(NewsletterDelivery.campaign_id == campaign_id, NewsletterDelivery.status == PENDING,
+               NewsletterDelivery.id > last_id)
+        .order_by(NewsletterDelivery.id)
+        .limit(chunk_size)
+    )
+
+
+def materialize_recipients(session, campaign_id, chunk_size=None):
+    """把当前的活跃订阅者分块写入收件人表，每块一个事务，返回收件人总数"""
+    chunk_size = chunk_size or CHUNK_SIZE
+    last_id = 0
+    while True:
+        chunk = active_subscriber_chunk(last_id, chunk_size).subquery()
+        chunk_end = session.execute(select(func.max(chunk.c.id))).scalar()
+        if chunk_end is None:
+            break
+        already_added = exists().where(
+            NewsletterDelivery.campaign_id == campaign_id,
+            NewsletterDelivery.newsletter_id == Newsletter.id,
+        )
+        session.execute(
+            NewsletterDelivery.__table__.insert().from_select(
+                ['campaign_id', 'newsletter_id', 'email', 'status', 'attempts'],
+                select(literal(campaign_id), Newsletter.id, Newsletter.email, literal(PENDING), literal(0))
+                .where(Newsletter.is_active.is_(True), Newsletter.id > last_id, Newsletter.id <= chunk_end,
+                       ~already_added)
+            )
+        )
+        session.commit()
+        last_id = chunk_end
+    total = session.execute(
+        select(func.count()).select_from(NewsletterDelivery).where(NewsletterDelivery.campaign_id == campaign_id)
+    ).scalar()
+    session.execute(update(NewsletterCampaign).where(NewsletterCampaign.id == campaign_id)
+                    .values(total_recipients=total))
+    session.commit()
+    return total
+
+
+def _flush_results(session, campaign_id, results):
+    """批量写回投递结果并累加任务计数，返回 (发送数, 失败数)"""
+    if not results:
+        return 0, 0
+    session.execute(update(NewsletterDelivery), [
+        {'id': delivery_id, 'status': status, 'attempts': attempts, 'last_error': error, 'sent_at': sent_at}
+        for delivery_id, status, attempts, error, sent_at in results
+    ])
+    sent = sum(1 for result in results if result[1] == SENT)
+    failed = sum(1 for result in results if result[1] == FAILED)
+    session.execute(
+        update(NewsletterCampaign).where(NewsletterCampaign.id == campaign_id)
+        .values(sent_count=NewsletterCampaign.sent_count + sent,
+                failed_count=NewsletterCampaign.failed_count + failed)
+    )
+    session.commit()
+    return sent, failed
+
+
+def _drain(pool, results):
+    while True:
+        try:
+            results.append(pool.results.get_nowait())
+        except queue.Empty:
+            return
+
+
+def send_pending(session, campaign, pool, chunk_size=None, batch_size=None, flush_size=None):
+    """发送该任务所有未发送的收件人，返回 (发送数, 失败数)"""
+    chunk_size = chunk_size or CHUNK_SIZE
+    batch_size = batch_size or BATCH_SIZE
+    flush_size = flush_size or FLUSH_SIZE
+    template = MessageTemplate(campaign, pool.sender)
+    campaign_id = campaign.id
+    totals = [0, 0]
+    results = []
+
+    def flush(force=False):
+        if results and (force or len(results) >= flush_size):
+            sent, failed = _flush_results(session, campaign_id, results)
+            totals[0] += sent
+            totals[1] += failed
+            results.clear()
+
+    last_id = 0
+    while not pool.stopped:
+        rows = session.execute(pending_deliveries(campaign_id, last_id, chunk_size)).all()
+        session.commit()
+        if not rows:
+            break
+        for start in range(0, len(rows), batch_size):
+            batch = [(row.id, row.email, template.render(row.id, row.email)) for row in rows[start:start + batch_size]]
+            if not pool.submit(batch):
+                break
+            _drain(pool, results)
+            flush()
+        last_id = rows[-1].id
+
+    pool.close()
+    _drain(pool, results)
+    flush(force=True)
+    return tuple(totals)
+
+
+def run_campaign(app, campaign_id, pool=None, resume=False):
+    """执行群发任务并返回报告；任务已在发送或已完成时返回None
+
+    resume=True 时也接受sending/failed状态的任务（调用方需确认原发送线程已停止）。
+    """
+    allowed = (PENDING, SENDING, CAMPAIGN_FAILED) if resume else (PENDING,)
+    with app.app_context():
+        session = db.session
+        claimed = session.execute(
+            update(NewsletterCampaign)
+            .where(NewsletterCampaign.id == campaign_id, NewsletterCampaign.status.in_(allowed))
+            .values(status=SENDING, last_error=None,
+                    started_at=func.coalesce(NewsletterCampaign.started_at, datetime.utcnow()))
+        ).rowcount
+        session.commit()
+        if not claimed:
+            return None
+
+        campaign = session.get(NewsletterCampaign, campaign_id)
+        started = time.perf_counter()
+        if campaign.total_recipients is None:
+            materialize_recipients(session, campaign_id)
+
+        pool = pool or SMTPPool()
+        pool.start()
+        try:
+            sent, failed = send_pending(session, campaign, pool)
+        except Exception as e:
+            session.rollback()
+            pool.close()
+            session.execute(update(NewsletterCampaign).where(NewsletterCampaign.id == campaign_id)
+                            .values(status=CAMPAIGN_FAILED, last_error=str(e)[:300]))
+            session.commit()
+            raise
+        seconds = time.perf_counter() - started
+
+        status = CAMPAIGN_FAILED if pool.error else COMPLETED
+        session.execute(
+            update(NewsletterCampaign).where(NewsletterCampaign.id == campaign_id)
+            .values(status=status, finished_at=datetime.utcnow(),
+                    last_error=str(pool.error)[:300] if pool.error else None)
+        )
+        session.commit()
+
+        report = {
+            'campaign_id': campaign_id,
+            'status': status,
+            'sent': sent,
+            'failed': failed,
+            'retries': pool.retries,
+            'connections': pool.connections,
+            'seconds': round(seconds, 3),
+            'messages_per_second': round((sent + failed) / seconds, 1) if seconds > 0 else 0,
+            'error': str(pool.error) if pool.error else None,
+        }
+        logger.info('群发任务 %d 结束：%s', campaign_id, report)
+        return report
+
+
+def start_campaign(app, campaign_id, resume=False):
+    """在后台线程中执行群发任务"""
+    def run():
+        try:
+            run_campaign(app, campaign_id, resume=resume)
+        except Exception as e:
+            logger.warning('群发任务 %d 失败：%s', campaign_id, e)
+
+    thread = threading.Thread(target=run, name=f'newsletter-{campaign_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def format_report(report):
+    return (f'任务 {report["campaign_id"]}：{report["status"]}，发送 {report["sent"]} 封，失败 {report["failed"]} 封，'
+            f'重试 {report["retries"]} 次，SMTP连接 {report["connections"]} 个，'
+            f'耗时 {report["seconds"]} 秒，{report["messages_per_second"]} 封/秒'
+            + (f'\n错误：{report["error"]}' if report['error'] else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='向活跃订阅者群发通讯')
+    commands = parser.add_subparsers(dest='command', required=True)
+    send = commands.add_parser('send', help='新建任务并发送')
+    send.add_argument('--subject', required=True)
+    send.add_argument('--body-file', required=True, help='UTF-8纯文本正文文件')
+    resume = commands.add_parser('resume', help='继续发送中断的任务')
+    resume.add_argument('campaign_id', type=int)
+    status = commands.add_parser('status', help='查看任务进度')
+    status.add_argument('campaign_id', type=int)
+    args = parser.parse_args(argv)
+
+    from production_start import app
+    import serializers
+
+    with app.app_context():
+        if args.command == 'status':
+            campaign = db.session.get(NewsletterCampaign, args.campaign_id)
+            if campaign is None:
+                print('任务不存在')
+                return 1
+            print(serializers.dumps(serializers.CAMPAIGN.one(campaign)).decode('utf-8'))
+            return 0
+        if args.command == 'send':
+            with open(args.body_file, encoding='utf-8') as f:
+                campaign_id = create_campaign(db.session, args.subject, f.read()).id
+            db.session.commit()
+        else:
+            campaign_id = args.campaign_id
+
+    report = run_campaign(app, campaign_id, resume=args.command == 'resume')
+    if report is None:
+        print('任务不存在或已在发送/已完成')
+        return 1
+    print(format_report(report))
+    return 0 if report['status'] == COMPLETED else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,31 +1,179 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
-from models import db, Application, ContactMessage, Newsletter, Event
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, start_wal_checkpointer, Application, ContactMessage, NewsletterCampaign, Event
+from cache import SharedCache
+from migrations import endpoint_queries, run_migrations
+from write_queue import GroupCommitQueue
+from conditional import conditional, make_etag
+from export import EXPORT_FORMATS, stream_rows
+from metrics import init_metrics
+from compression import init_compression
+from ratelimit import init_proxy_fix, init_rate_limit
+from archive import start_archiver
+from snapshot import current_snapshot, init_read_snapshot
+import serializers
+from serializers import json_response
+import subscriptions
+import ical
+import idempotency
+import newsletter_sender
+import queries
+import rollups
+import search
+import tags
 from dotenv import load_dotenv
+import base64
+import hmac
+import json
+import logging
 import os
-from datetime import datetime
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
 
 # 加载环境变量
 load_dotenv()
 
-# 创建Flask应用
-app = Flask(__name__)
+# 所有接口注册在蓝图上，由create_app()挂载到应用
+api = Blueprint('api', __name__)
 
-# 配置应用
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///./instance/bciai_club.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# 启用CORS
-CORS(app, resources={r"/*": {"origins": "*"}})
+def commit_write(work):
+    """执行写操作并提交：开启组提交时交给写队列批量提交，否则在当前会话直接提交"""
+    write_queue = current_app.extensions.get('write_queue')
+    if write_queue is not None:
+        # 先归还本请求读查询占用的连接，等待期间不占用连接池
+        db.session.close()
+        return write_queue.submit(work)
+    result = work(db.session)
+    db.session.commit()
+    return result
 
-# 初始化数据库
-db.init_app(app)
+# 统计数据缓存（所有worker共享，写操作后失效）
+STATS_CACHE_KEY = 'stats'
+stats_cache = SharedCache(default_ttl=int(os.getenv('STATS_CACHE_TTL', 60)))
+
+
+def invalidate_stats():
+    """写操作提交后使统计缓存失效"""
+    stats_cache.invalidate(STATS_CACHE_KEY)
+
+
+def get_stats_entry():
+    """读取统计缓存条目（包含数据、版本号和生成时间），未命中时重新计算"""
+    return stats_cache.get_or_set(STATS_CACHE_KEY, lambda: {
+        'version': uuid.uuid4().hex,
+        'generated_at': datetime.utcnow().isoformat(),
+        'payload': compute_stats(),
+    })
+
+
+def stats_version():
+    entry = get_stats_entry()
+    return entry['version'], datetime.fromisoformat(entry['generated_at'])
+
+
+def public_session():
+    """公开只读接口使用的会话：开启只读快照时读当前快照，否则读主库"""
+    snapshot = current_snapshot()
+    return snapshot.Session if snapshot is not None else db.session
+
+
+def public_stats_entry():
+    """公开统计接口的数据：快照模式下每份快照只计算一次，版本号取数据内容的哈希（各worker一致）"""
+    snapshot = current_snapshot()
+    if snapshot is None:
+        return get_stats_entry()
+
+    def compute():
+        payload = compute_stats(snapshot.Session)
+        return {
+            'version': make_etag(json.dumps(payload, sort_keys=True)),
+            'generated_at': snapshot.taken_at.isoformat(),
+            'payload': payload,
+        }
+    return snapshot.memoize(STATS_CACHE_KEY, compute)
+
+
+def public_stats_version():
+    entry = public_stats_entry()
+    return entry['version'], datetime.fromisoformat(entry['generated_at'])
+
+
+def events_version(session=None):
+    # 每个聚合单独作为子查询，max可以直接读取索引末端；
+    # 删除活动只改变行数，不改变max(updated_at)，因此活动接口只按ETag返回304
+    count, max_id, last_updated = (session or db.session).query(
+        select(func.count(Event.id)).scalar_subquery(),
+        select(func.max(Event.id)).scalar_subquery(),
+        select(func.max(Event.updated_at)).scalar_subquery(),
+    ).one()
+    if isinstance(last_updated, str):
+        last_updated = datetime.fromisoformat(last_updated)
+    return (count, max_id, last_updated), last_updated
+
+
+def public_events_version():
+    session = public_session()
+    token, last_updated = events_version(session)
+    if request.args.get('upcoming') != '1':
+        return token, last_updated
+    # upcoming=1的结果随时间变化：最早一个未开始的活动开始后列表就不同了，
+    # 把它作为版本的一部分；此时没有准确的最后修改时间，只使用ETag
+    next_start = session.execute(queries.next_event_start(datetime.now())).scalar()
+    return (token, str(next_start)), None
+
+
+def calendar_version():
+    # 日历只包含最近一段时间以来的活动，日期变化时也要重新生成
+    token, last_updated = events_version()
+    return (token, datetime.utcnow().date().isoformat()), last_updated
+
+
+def application_version(application_id):
+    updated_at = db.session.query(Application.updated_at).filter(Application.id == application_id).scalar()
+    if updated_at is None:
+        return None
+    return (application_id, updated_at.isoformat()), updated_at
+
+# 申请列表分页配置
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at, row_id):
+    """将(created_at, id)编码为不透明的分页游标"""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析分页游标，返回(created_at, id)，格式错误时抛出ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('无效的分页游标')
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """解析limit参数并限制在[1, maximum]范围内"""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit 必须为整数')
+    return max(1, min(limit, maximum))
 
-# 数据库初始化将在应用启动时进行
 
 # 导入所有路由功能（复制app.py中的路由定义）
-@app.route('/api/apply', methods=['POST'])
+@api.route('/api/apply', methods=['POST'])
+@idempotency.idempotent('apply')
 def submit_application():
     """处理"加入我们"申请表单提交"""
     try:
@@ -44,7 +192,7 @@ def submit_application():
         skills = ','.join(data.get('skills', [])) if isinstance(data.get('skills'), list) else data.get('skills', '')
         
         # 创建申请记录
-        application = Application(
+        fields = dict(
             name=data['name'],
             student_id=data['student_id'],
             email=data['email'],
@@ -59,52 +207,225 @@ def submit_application():
             reason=data.get('reason', ''),
             available_time=data.get('available_time', ''),
             github_url=data.get('github_url', ''),
-            other_info=data.get('other_info', '')
+            other_info=data.get('other_info', ''),
+            submission_hash=idempotency.submission_hash(data['student_id'], data['position'])
         )
         
-        db.session.add(application)
-        db.session.commit()
+        # 同一学号重复申请同一职位（按唯一索引查找）
+        def is_duplicate():
+            return db.session.execute(
+                select(Application.id).where(Application.submission_hash == fields['submission_hash'])
+            ).first() is not None
+        
+        if is_duplicate():
+            return jsonify({'error': '该学号已经申请过这个职位，请勿重复提交'}), 409
+        
+        body = {'success': True, 'message': '申请表提交成功！我们将尽快联系您安排面试。'}
+        key = idempotency.current_key()
         
-        return jsonify({'success': True, 'message': '申请表提交成功！我们将尽快联系您安排面试。'}), 201
+        def work(session):
+            application = Application(**fields)
+            session.add(application)
+            session.flush()
+            tags.set_application_tags(session, [(application.id, interests, skills)])
+            rollups.record_application(session, application)
+            idempotency.remember(session, key, serializers.dumps(body).decode('utf-8'), 201)
+        
+        try:
+            commit_write(work)
+        except IntegrityError:
+            # 并发提交时由主键/唯一索引拦截：同一个幂等键返回已保存的响应，否则为重复申请
+            db.session.rollback()
+            replayed = idempotency.replay_stored(key)
+            if replayed is not None:
+                return replayed
+            if is_duplicate():
+                return jsonify({'error': '该学号已经申请过这个职位，请勿重复提交'}), 409
+            raise
+        invalidate_stats()
+        
+        return json_response(body, 201)
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'提交失败：{str(e)}'}), 500
 
-@app.route('/api/applications', methods=['GET'])
+@api.route('/api/applications', methods=['GET'])
 def get_applications():
-    """获取申请列表（管理员功能）"""
+    """获取申请列表（管理员功能，基于(created_at, id)的游标分页）
+
+    传入 ?ids=1,2,3 时改为一次IN查询批量返回这些申请的完整详情。
+    """
     try:
-        # 支持按状态筛选
+        if 'ids' in request.args:
+            return get_applications_batch(request.args['ids'])
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 支持按状态和标签筛选，例如 ?skills=python&interests=脑机接口
         status = request.args.get('status')
-        query = Application.query
+        facet_filters = tags.parse_facet_filters(request.args)
+        conditions = [Application.status == status] if status else []
+        conditions.extend(tags.has_tag(kind, name) for kind, name in facet_filters)
         
-        if status:
-            query = query.filter_by(status=status)
-        
-        # 按创建时间降序排列
-        applications = query.order_by(Application.created_at.desc()).all()
-        
-        applications_list = []
-        for app in applications:
-            applications_list.append({
-                'id': app.id,
-                'name': app.name,
-                'position': app.position,
-                'major': app.major,
-                'email': app.email,
-                'phone': app.phone,
-                'status': app.status,
-                'interview_status': app.interview_status,
-                'created_at': app.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            })
-        
-        return jsonify({'applications': applications_list}), 200
+        # 只查询列表需要的列，从上一页最后一条记录之后继续；多取一条用于判断是否还有下一页
+        rows = db.session.execute(queries.application_list(conditions, after, limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        applications_list = serializers.APPLICATION_LIST.many(rows)
+        
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+        result = {'applications': applications_list, 'next_cursor': next_cursor}
+        
+        # 首页返回筛选结果中各标签的数量
+        if not cursor and (facet_filters or request.args.get('facets') == '1'):
+            result['facets'] = tags.facet_counts(db.session, queries.filtered_application_ids(conditions))
+        
+        return json_response(result)
         
     except Exception as e:
         return jsonify({'error': f'获取申请列表失败：{str(e)}'}), 500
 
-@app.route('/api/applications/<int:application_id>', methods=['GET'])
+# 批量读取/更新单次最多处理的申请数
+MAX_BATCH_SIZE = 500
+
+# 批量更新允许修改的字段及可选值（None表示字符串或null均可）
+BATCH_UPDATE_FIELDS = {
+    'status': ('pending', 'approved', 'rejected'),
+    'interview_status': ('not_scheduled', 'scheduled', 'completed'),
+    'interview_notes': None,
+}
+
+
+def invalid_batch_fields(item):
+    """返回一项批量更新中取值不合法的字段名"""
+    invalid = []
+    for field, choices in BATCH_UPDATE_FIELDS.items():
+        if field not in item:
+            continue
+        value = item[field]
+        valid = (value is None or isinstance(value, str)) if choices is None else value in choices
+        if not valid:
+            invalid.append(field)
+    return invalid
+
+
+def parse_ids(value):
+    """解析逗号分隔的id列表（去重并保持顺序）"""
+    ids = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if not item.isdigit():
+            raise ValueError(f'无效的申请id：{item}')
+        if int(item) not in ids:
+            ids.append(int(item))
+    return ids
+
+
+def get_applications_batch(ids_param):
+    """一次IN查询返回多个申请的完整详情，按请求中的顺序排列"""
+    try:
+        ids = parse_ids(ids_param)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ids:
+        return jsonify({'error': 'ids 不能为空'}), 400
+    if len(ids) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'单次最多查询 {MAX_BATCH_SIZE} 个申请'}), 400
+    
+    found = {application.id: application for application in Application.query.filter(Application.id.in_(ids))}
+    return json_response({
+        'applications': [serializers.APPLICATION_DETAIL.one(found[i]) for i in ids if i in found],
+        'missing': [i for i in ids if i not in found]
+    })
+
+@api.route('/api/applications', methods=['PATCH'])
+def batch_update_applications():
+    """批量更新申请状态、面试状态和面试备注（管理员功能）
+
+    请求体：{"updates": [{"id": 1, "status": "approved"}, ...]}，同一个id只能出现一次，
+    否则整个请求返回400并列出重复的id；status、interview_status必须为允许的取值，
+    interview_notes必须为字符串或null，否则返回400并列出出错的项。
+    修改内容相同的申请合并为一条 UPDATE ... WHERE id IN (...)，全部在同一个事务中提交。
+    """
+    try:
+        updates = (request.json or {}).get('updates')
+        if not isinstance(updates, list) or not updates:
+            return jsonify({'error': 'updates 必须为非空列表'}), 400
+        if len(updates) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'单次最多更新 {MAX_BATCH_SIZE} 个申请'}), 400
+        
+        ids = [item.get('id') if isinstance(item, dict) else None for item in updates]
+        # bool是int的子类，{"id": true}不能当作申请1
+        if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'error': '每一项都必须包含整数id'}), 400
+        duplicate_ids = sorted(i for i, count in Counter(ids).items() if count > 1)
+        if duplicate_ids:
+            return jsonify({'error': '同一个申请只能出现一次', 'duplicate_ids': duplicate_ids}), 400
+        invalid = [{'id': i, 'fields': fields} for i, fields in
+                   ((i, invalid_batch_fields(item)) for i, item in zip(ids, updates)) if fields]
+        if invalid:
+            return jsonify({
+                'error': 'status 只能为 pending、approved、rejected，interview_status 只能为 '
+                         'not_scheduled、scheduled、completed，interview_notes 必须为字符串或null',
+                'invalid': invalid
+            }), 400
+        
+        results = {}
+        groups = {}
+        for application_id, item in zip(ids, updates):
+            changes = {field: item[field] for field in BATCH_UPDATE_FIELDS if field in item}
+            if not changes:
+                results[application_id] = 'no_changes'
+                continue
+            results[application_id] = 'updated'
+            groups.setdefault(tuple(sorted(changes.items())), []).append(application_id)
+        
+        requested = [i for ids in groups.values() for i in ids]
+        existing = {row.id: row for row in db.session.execute(
+            select(Application.id, Application.status, Application.created_at).where(Application.id.in_(requested))
+        )} if requested else {}
+        
+        status_changes = []
+        for key, ids in groups.items():
+            ids = [i for i in ids if i in existing]
+            if ids:
+                changes = dict(key)
+                db.session.execute(
+                    update(Application).where(Application.id.in_(ids)).values(**changes)
+                )
+                if 'status' in changes:
+                    status_changes.extend(
+                        (existing[i].created_at, existing[i].status, changes['status']) for i in ids
+                    )
+        rollups.record_status_changes(db.session, status_changes)
+        db.session.commit()
+        if existing:
+            invalidate_stats()
+        
+        for application_id in requested:
+            if application_id not in existing:
+                results[application_id] = 'not_found'
+        
+        return jsonify({
+            'success': True,
+            'results': [{'id': i, 'result': result} for i, result in results.items()]
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'批量更新申请失败：{str(e)}'}), 500
+
+@api.route('/api/applications/<int:application_id>', methods=['GET'])
+@conditional(application_version)
 def get_application_detail(application_id):
     """获取申请详情（管理员功能）"""
     try:
@@ -113,33 +434,12 @@ def get_application_detail(application_id):
         if not application:
             return jsonify({'error': '申请不存在'}), 404
         
-        return jsonify({
-            'id': application.id,
-            'name': application.name,
-            'student_id': application.student_id,
-            'email': application.email,
-            'phone': application.phone,
-            'major': application.major,
-            'grade': application.grade,
-            'position': application.position,
-            'interests': application.interests.split(',') if application.interests else [],
-            'skills': application.skills.split(',') if application.skills else [],
-            'team_preference': application.team_preference,
-            'experience': application.experience,
-            'reason': application.reason,
-            'available_time': application.available_time,
-            'github_url': application.github_url,
-            'other_info': application.other_info,
-            'status': application.status,
-            'interview_status': application.interview_status,
-            'interview_notes': application.interview_notes,
-            'created_at': application.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        }), 200
+        return json_response(serializers.APPLICATION_DETAIL.one(application))
         
     except Exception as e:
         return jsonify({'error': f'获取申请详情失败：{str(e)}'}), 500
 
-@app.route('/api/applications/<int:application_id>', methods=['PUT'])
+@api.route('/api/applications/<int:application_id>', methods=['PUT'])
 def update_application(application_id):
     """更新申请状态（管理员功能）"""
     try:
@@ -150,8 +450,9 @@ def update_application(application_id):
         
         data = request.json
         
-        # 更新申请状态
+        # 更新申请状态（同时调整按天汇总中的状态计数）
         if 'status' in data:
+            rollups.record_status_changes(db.session, [(application.created_at, application.status, data['status'])])
             application.status = data['status']
         
         # 更新面试状态
@@ -163,6 +464,7 @@ def update_application(application_id):
             application.interview_notes = data['interview_notes']
         
         db.session.commit()
+        invalidate_stats()
         
         return jsonify({'success': True, 'message': '申请状态更新成功'}), 200
         
@@ -170,7 +472,8 @@ def update_application(application_id):
         db.session.rollback()
         return jsonify({'error': f'更新申请状态失败：{str(e)}'}), 500
 
-@app.route('/api/contact', methods=['POST'])
+@api.route('/api/contact', methods=['POST'])
+@idempotency.idempotent('contact')
 def submit_contact():
     """处理联系表单提交"""
     try:
@@ -183,23 +486,34 @@ def submit_contact():
                 return jsonify({'error': f'{field} 为必填字段'}), 400
         
         # 创建联系消息记录
-        contact = ContactMessage(
+        fields = dict(
             contact_name=data['contact-name'],
             contact_email=data['contact-email'],
             contact_subject=data['contact-subject'],
             contact_message=data['contact-message']
         )
         
-        db.session.add(contact)
-        db.session.commit()
+        body = {'success': True, 'message': '消息发送成功！我们将尽快回复您。'}
+        key = idempotency.current_key()
+        
+        def work(session):
+            message = ContactMessage(**fields)
+            session.add(message)
+            session.flush()
+            rollups.record_contact(session, message.created_at)
+            idempotency.remember(session, key, serializers.dumps(body).decode('utf-8'), 201)
         
-        return jsonify({'success': True, 'message': '消息发送成功！我们将尽快回复您。'}), 201
+        commit_write(work)
+        invalidate_stats()
+        
+        return json_response(body, 201)
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'发送失败：{str(e)}'}), 500
 
-@app.route('/api/newsletter', methods=['POST'])
+@api.route('/api/newsletter', methods=['POST'])
+@idempotency.idempotent('newsletter')
 def subscribe_newsletter():
     """处理通讯订阅"""
     try:
@@ -209,105 +523,539 @@ def subscribe_newsletter():
         if not data.get('email'):
             return jsonify({'error': '邮箱地址为必填字段'}), 400
         
-        # 检查是否已订阅
-        existing = Newsletter.query.filter_by(email=data['email']).first()
-        if existing:
-            if not existing.is_active:
-                # 重新激活
-                existing.is_active = True
-                existing.subscribed_at = datetime.utcnow()
-                db.session.commit()
-                return jsonify({'success': True, 'message': '您已成功重新订阅通讯！'}), 200
+        emails, _ = subscriptions.normalize_emails([data['email']])
+        if not emails:
+            return jsonify({'error': '邮箱地址格式不正确'}), 400
+        email = emails[0]
+        
+        key = idempotency.current_key()
+        
+        # 单条upsert语句完成新订阅或重新激活
+        def work(session):
+            outcome = subscriptions.subscribe(session, [email])[email]
+            if outcome == subscriptions.RESUBSCRIBED:
+                response = ({'success': True, 'message': '您已成功重新订阅通讯！'}, 200)
+            elif outcome == subscriptions.SUBSCRIBED:
+                response = ({'success': True, 'message': '订阅成功！您将收到我们的最新动态。'}, 201)
             else:
-                return jsonify({'error': '您已经订阅过通讯了！'}), 400
+                return None
+            idempotency.remember(session, key, serializers.dumps(response[0]).decode('utf-8'), response[1])
+            return response
         
-        # 创建新的订阅记录
-        newsletter = Newsletter(email=data['email'])
-        db.session.add(newsletter)
-        db.session.commit()
+        response = commit_write(work)
+        if response is None:
+            return jsonify({'error': '您已经订阅过通讯了！'}), 400
         
-        return jsonify({'success': True, 'message': '订阅成功！您将收到我们的最新动态。'}), 201
+        invalidate_stats()
+        return json_response(*response)
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'订阅失败：{str(e)}'}), 500
 
-@app.route('/api/events', methods=['GET'])
-def get_events():
-    """获取活动列表"""
+# 批量订阅接口单次请求最多处理的邮箱数
+MAX_BULK_EMAILS = 10000
+
+@api.route('/api/newsletter/bulk', methods=['POST'])
+def bulk_newsletter():
+    """批量订阅或取消订阅（管理员功能，用于导入活动报名表）"""
     try:
-        events = Event.query.order_by(Event.date).all()
+        data = request.json or {}
+        
+        action = data.get('action', 'subscribe')
+        if action not in ('subscribe', 'unsubscribe'):
+            return jsonify({'error': 'action 只能为 subscribe 或 unsubscribe'}), 400
+        
+        raw_emails = data.get('emails')
+        if not isinstance(raw_emails, list) or not raw_emails:
+            return jsonify({'error': 'emails 必须为非空列表'}), 400
+        if len(raw_emails) > MAX_BULK_EMAILS:
+            return jsonify({'error': f'单次最多处理 {MAX_BULK_EMAILS} 个邮箱'}), 400
         
-        events_list = []
-        for event in events:
-            events_list.append({
-                'id': event.id,
-                'title': event.title,
-                'description': event.description,
-                'date': event.date.strftime('%Y-%m-%d %H:%M'),
-                'location': event.location
-            })
+        emails, invalid = subscriptions.normalize_emails(raw_emails)
+        outcomes = subscriptions.apply_in_chunks(db.session, action, emails)
+        invalidate_stats()
         
-        return jsonify({'events': events_list}), 200
+        results = [{'email': email, 'result': outcome} for email, outcome in outcomes.items()]
+        results.extend({'email': raw, 'result': subscriptions.INVALID} for raw in invalid)
+        
+        summary = {}
+        for item in results:
+            summary[item['result']] = summary.get(item['result'], 0) + 1
+        
+        return jsonify({'success': True, 'summary': summary, 'results': results}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'批量订阅失败：{str(e)}'}), 500
+
+def check_send_token():
+    """群发接口需要在Authorization头中携带NEWSLETTER_SEND_TOKEN，未配置时不允许通过接口群发"""
+    token = os.getenv('NEWSLETTER_SEND_TOKEN', '')
+    if not token:
+        return jsonify({'error': '未配置 NEWSLETTER_SEND_TOKEN，不能通过接口群发'}), 403
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+        return jsonify({'error': '群发令牌无效'}), 401
+    return None
+
+@api.route('/api/newsletter/campaigns', methods=['POST'])
+def create_newsletter_campaign():
+    """新建群发任务并在后台发送（管理员功能），立即返回202"""
+    try:
+        denied = check_send_token()
+        if denied:
+            return denied
+
+        data = request.json or {}
+        subject = (data.get('subject') or '').strip()
+        body = data.get('body') or ''
+        if not subject or not body.strip():
+            return jsonify({'error': 'subject 和 body 不能为空'}), 400
+        if len(subject) > 200:
+            return jsonify({'error': 'subject 不能超过200个字符'}), 400
+
+        campaign = newsletter_sender.create_campaign(db.session, subject, body)
+        db.session.commit()
+        newsletter_sender.start_campaign(current_app._get_current_object(), campaign.id)
+        return json_response({'success': True, 'campaign': serializers.CAMPAIGN.one(campaign)}, 202)
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'创建群发任务失败：{str(e)}'}), 500
+
+@api.route('/api/newsletter/campaigns/<int:campaign_id>', methods=['GET'])
+def get_newsletter_campaign(campaign_id):
+    """查看群发任务进度"""
+    try:
+        campaign = db.session.get(NewsletterCampaign, campaign_id)
+        if campaign is None:
+            return jsonify({'error': '群发任务不存在'}), 404
+        return json_response(serializers.CAMPAIGN.one(campaign))
+
+    except Exception as e:
+        return jsonify({'error': f'获取群发任务失败：{str(e)}'}), 500
+
+@api.route('/api/newsletter/campaigns/<int:campaign_id>/resume', methods=['POST'])
+def resume_newsletter_campaign(campaign_id):
+    """继续发送中断的群发任务（确认原发送进程已停止后调用）"""
+    try:
+        denied = check_send_token()
+        if denied:
+            return denied
+
+        campaign = db.session.get(NewsletterCampaign, campaign_id)
+        if campaign is None:
+            return jsonify({'error': '群发任务不存在'}), 404
+        if campaign.status == newsletter_sender.COMPLETED:
+            return jsonify({'error': '群发任务已完成'}), 409
+        newsletter_sender.start_campaign(current_app._get_current_object(), campaign_id, resume=True)
+        return json_response({'success': True, 'campaign': serializers.CAMPAIGN.one(campaign)}, 202)
+
+    except Exception as e:
+        return jsonify({'error': f'继续群发任务失败：{str(e)}'}), 500
+
+def parse_datetime_param(value, field):
+    """解析YYYY-MM-DD或ISO格式的日期时间参数"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{field} 格式应为YYYY-MM-DD或YYYY-MM-DDTHH:MM')
+
+
+@api.route('/api/events', methods=['GET'])
+@conditional(public_events_version, use_last_modified=False)
+def get_events():
+    """获取活动列表（支持from/to日期范围、upcoming=1只看未开始的活动和limit，按ix_event_date范围扫描）"""
+    try:
+        try:
+            start = end = None
+            if request.args.get('upcoming') == '1':
+                start = datetime.now()
+            if request.args.get('from'):
+                start = max(filter(None, [start, parse_datetime_param(request.args['from'], 'from')]))
+            if request.args.get('to'):
+                # 只给日期时包含当天
+                end = parse_datetime_param(request.args['to'], 'to')
+                if len(request.args['to']) == 10:
+                    end += timedelta(days=1)
+            limit = parse_limit(request.args.get('limit')) if request.args.get('limit') else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        events = public_session().execute(queries.events(start, end, limit)).scalars().all()
+        return json_response({'events': serializers.EVENT.many(events)})
         
     except Exception as e:
         return jsonify({'error': f'获取活动失败：{str(e)}'}), 500
 
-@app.route('/api/stats', methods=['GET'])
-def get_stats():
-    """获取统计数据"""
+
+# 日历订阅源包含的已结束活动天数
+CALENDAR_PAST_DAYS = int(os.getenv('ICS_PAST_DAYS', 30))
+CALENDAR_CACHE_KEY = 'events_ics'
+
+
+def build_events_calendar():
+    """生成日历订阅源（最近CALENDAR_PAST_DAYS天以来的活动）"""
+    since = datetime.now() - timedelta(days=CALENDAR_PAST_DAYS)
+    events = db.session.execute(queries.events(start=since)).scalars().all()
+    return ical.build_calendar(events)
+
+
+@api.route('/api/events.ics', methods=['GET'])
+@conditional(calendar_version, use_last_modified=False)
+def get_events_calendar():
+    """活动日历订阅源（iCalendar格式）
+
+    生成结果与活动版本号一起保存在共享缓存中，活动没有变化时所有worker直接复用，
+    日历客户端带ETag轮询时返回304。
+    """
     try:
-        # 获取统计信息
-        total_applications = Application.query.count()
-        total_contacts = ContactMessage.query.count()
-        total_subscribers = Newsletter.query.filter_by(is_active=True).count()
-        total_events = Event.query.count()
-        
-        # 获取申请状态分布
-        pending_applications = Application.query.filter_by(status='pending').count()
-        approved_applications = Application.query.filter_by(status='approved').count()
-        
-        # 获取论文统计数据（模拟数据）
-        paper_stats = [
-            {'year': '2020', 'count': 2},
-            {'year': '2021', 'count': 3},
-            {'year': '2022', 'count': 4},
-            {'year': '2025', 'count': 12}
-        ]
-        
-        # 获取研究领域分布（模拟数据）
-        research_areas = [
-            {'area': '脑机接口', 'percentage': 35},
-            {'area': '人工智能', 'percentage': 25},
-            {'area': '神经科学', 'percentage': 20},
-            {'area': '医疗应用', 'percentage': 15},
-            {'area': '其他', 'percentage': 5}
-        ]
+        token = make_etag(calendar_version()[0])
+        cached = stats_cache.get(CALENDAR_CACHE_KEY)
+        if cached is not None and cached.get('token') == token:
+            body = cached['body']
+        else:
+            body = build_events_calendar()
+            stats_cache.set(CALENDAR_CACHE_KEY, {'token': token, 'body': body}, ttl=86400)
         
-        return jsonify({
-            'total_applications': total_applications,
-            'total_contacts': total_contacts,
-            'total_subscribers': total_subscribers,
-            'total_events': total_events,
-            'application_status': {
-                'pending': pending_applications,
-                'approved': approved_applications,
-                'rejected': total_applications - pending_applications - approved_applications
-            },
-            'paper_stats': paper_stats,
-            'research_areas': research_areas
-        }), 200
+        return Response(body, mimetype='text/calendar', headers={
+            'Content-Disposition': 'inline; filename="events.ics"'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'生成活动日历失败：{str(e)}'}), 500
+
+def compute_stats(session=None):
+    """聚合计算统计数据：申请状态一次分组查询，其余计数合并为一次查询"""
+    session = session or db.session
+    # 获取申请状态分布
+    status_counts = dict(session.execute(queries.application_status_counts()).all())
+    total_applications = sum(status_counts.values())
+    pending_applications = status_counts.get('pending', 0)
+    approved_applications = status_counts.get('approved', 0)
+    
+    # 获取其余统计信息
+    total_contacts, total_subscribers, total_events = session.execute(queries.stats_counts()).one()
+    
+    # 获取论文统计数据（模拟数据）
+    paper_stats = [
+        {'year': '2020', 'count': 2},
+        {'year': '2021', 'count': 3},
+        {'year': '2022', 'count': 4},
+        {'year': '2025', 'count': 12}
+    ]
+    
+    # 获取研究领域分布（模拟数据）
+    research_areas = [
+        {'area': '脑机接口', 'percentage': 35},
+        {'area': '人工智能', 'percentage': 25},
+        {'area': '神经科学', 'percentage': 20},
+        {'area': '医疗应用', 'percentage': 15},
+        {'area': '其他', 'percentage': 5}
+    ]
+    
+    return {
+        'total_applications': total_applications,
+        'total_contacts': total_contacts,
+        'total_subscribers': total_subscribers,
+        'total_events': total_events,
+        'application_status': {
+            'pending': pending_applications,
+            'approved': approved_applications,
+            'rejected': total_applications - pending_applications - approved_applications
+        },
+        'paper_stats': paper_stats,
+        'research_areas': research_areas
+    }
+
+@api.route('/api/stats', methods=['GET'])
+@conditional(public_stats_version)
+def get_stats():
+    """获取统计数据（优先读取只读快照或共享缓存）"""
+    try:
+        return json_response(public_stats_entry()['payload'])
         
     except Exception as e:
         return jsonify({'error': f'获取统计数据失败：{str(e)}'}), 500
 
-@app.route('/', methods=['GET'])
+# 可导出的数据表：资源名 -> (模型, 状态筛选函数)
+# 导出的资源 -> (模型, 导出的列, status参数的可选值, 按状态筛选的条件)
+# 只导出列出的列，submission_hash等内部字段不会出现在导出文件中
+EXPORT_RESOURCES = {
+    'applications': (
+        Application,
+        ('id', 'name', 'student_id', 'email', 'phone', 'major', 'grade', 'position', 'interests', 'skills',
+         'team_preference', 'experience', 'reason', 'available_time', 'github_url', 'other_info',
+         'status', 'interview_status', 'interview_notes', 'created_at', 'updated_at'),
+        BATCH_UPDATE_FIELDS['status'],
+        lambda status: Application.status == status,
+    ),
+    'contacts': (
+        ContactMessage,
+        ('id', 'contact_name', 'contact_email', 'contact_subject', 'contact_message', 'created_at', 'is_read'),
+        ('read', 'unread'),
+        lambda status: ContactMessage.is_read.is_(status == 'read'),
+    ),
+}
+
+
+def parse_date(value, field):
+    """解析YYYY-MM-DD格式的日期参数"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'{field} 日期格式应为YYYY-MM-DD')
+
+
+# 时间序列单次最多查询的天数
+MAX_TIMESERIES_DAYS = 3 * 366
+
+
+@api.route('/api/stats/timeseries', methods=['GET'])
+@conditional(stats_version)
+def get_stats_timeseries():
+    """按天/周/月统计申请、联系消息和订阅数量（只读汇总表，支持按状态、职位、专业、兴趣方向分组）"""
+    try:
+        metric = request.args.get('metric', rollups.APPLICATIONS)
+        if metric not in rollups.DIMENSIONS:
+            return jsonify({'error': f'metric 只能为 {"、".join(rollups.DIMENSIONS)}'}), 400
+        dimension = request.args.get('dimension', rollups.ALL)
+        if dimension not in rollups.DIMENSIONS[metric]:
+            return jsonify({'error': f'{metric} 的 dimension 只能为 {"、".join(rollups.DIMENSIONS[metric])}'}), 400
+        interval = request.args.get('interval', 'day')
+        if interval not in rollups.INTERVALS:
+            return jsonify({'error': 'interval 只能为 day、week 或 month'}), 400
+        
+        # 默认最近30天，to为包含当天的结束日期
+        try:
+            end = parse_date(request.args['to'], 'to').date() if request.args.get('to') else datetime.utcnow().date()
+            start = parse_date(request.args['from'], 'from').date() if request.args.get('from') else end - timedelta(days=29)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if start > end:
+            return jsonify({'error': 'from 不能晚于 to'}), 400
+        if (end - start).days >= MAX_TIMESERIES_DAYS:
+            return jsonify({'error': f'查询范围不能超过 {MAX_TIMESERIES_DAYS} 天'}), 400
+        
+        result = rollups.timeseries(db.session, metric, dimension, start, end, interval)
+        return json_response(dict(
+            metric=metric, dimension=dimension, interval=interval,
+            **{'from': start.isoformat(), 'to': end.isoformat()}, **result
+        ))
+        
+    except Exception as e:
+        return jsonify({'error': f'获取统计时间序列失败：{str(e)}'}), 500
+
+@api.route('/api/export/<resource>', methods=['GET'])
+def export_data(resource):
+    """流式导出申请或联系消息（管理员功能，支持csv/ndjson格式、状态和日期筛选）"""
+    try:
+        if resource not in EXPORT_RESOURCES:
+            return jsonify({'error': '不支持导出该数据'}), 404
+        
+        fmt = request.args.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': 'format 只能为 csv 或 ndjson'}), 400
+        
+        model, columns, statuses, status_filter = EXPORT_RESOURCES[resource]
+        stmt = select(*(model.__table__.c[column] for column in columns)).order_by(model.id)
+        
+        # 按状态筛选（申请：pending/approved/rejected；联系消息：read/unread）
+        status = request.args.get('status')
+        if status:
+            if status not in statuses:
+                return jsonify({'error': f'status 只能为 {"、".join(statuses)}'}), 400
+            stmt = stmt.where(status_filter(status))
+        
+        # 按创建日期筛选，to为包含当天的结束日期
+        try:
+            if request.args.get('from'):
+                stmt = stmt.where(model.created_at >= parse_date(request.args['from'], 'from'))
+            if request.args.get('to'):
+                end = parse_date(request.args['to'], 'to') + timedelta(days=1)
+                stmt = stmt.where(model.created_at < end)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 500))
+        filename = f'{resource}_{datetime.utcnow().strftime("%Y%m%d%H%M%S")}.{fmt}'
+        return Response(
+            stream_with_context(stream_rows(db.session, stmt, columns, fmt, chunk_size)),
+            content_type=EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+        
+    except Exception as e:
+        return jsonify({'error': f'导出失败：{str(e)}'}), 500
+
+@api.route('/api/search', methods=['GET'])
+def search_records():
+    """全文搜索申请和联系消息（管理员功能，按相关度排序并返回摘要片段）"""
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'error': 'q 为必填参数'}), 400
+        
+        target = request.args.get('type', 'all')
+        targets = list(search.SEARCH_TARGETS) if target == 'all' else [target]
+        if any(t not in search.SEARCH_TARGETS for t in targets):
+            return jsonify({'error': 'type 只能为 applications、contacts 或 all'}), 400
+        
+        try:
+            limit = parse_limit(request.args.get('limit'), default=20)
+            offset = max(0, int(request.args.get('offset', 0)))
+        except ValueError:
+            return jsonify({'error': 'limit 和 offset 必须为整数'}), 400
+        
+        # 多取一条用于判断是否还有下一页
+        results = {}
+        for t in targets:
+            rows = search.search(db.session, t, query, limit + 1, offset)
+            hits = []
+            for row in rows[:limit]:
+                hit = dict(row)
+                hit['created_at'] = str(hit['created_at'])[:19]
+                if 'is_read' in hit:
+                    hit['is_read'] = bool(hit['is_read'])
+                hits.append(hit)
+            results[t] = {
+                'hits': hits,
+                'next_offset': offset + limit if len(rows) > limit else None
+            }
+        
+        return json_response({'query': query, 'results': results})
+        
+    except Exception as e:
+        return jsonify({'error': f'搜索失败：{str(e)}'}), 500
+
+@api.route('/', methods=['GET'])
 def index():
     """根路径"""
     return jsonify({'message': 'SAU脑机与人工智能俱乐部后端API服务正在运行！'}), 200
 
+logger = logging.getLogger(__name__)
+
+
+def init_database(app):
+    """创建数据表并执行迁移，然后关闭连接
+
+    使用gunicorn --preload时只在master进程中执行一次；关闭连接池是为了不让
+    fork出的worker继承master打开的SQLite连接。
+    """
+    with app.app_context():
+        # 建表和迁移在同一个迁移锁内执行，多个worker同时启动时不会互相冲突
+        run_migrations(db.engine, create_tables=True)
+        db.engine.dispose()
+
+
+def warmup(app):
+    """预热：建立数据库连接、把各接口用到的表和索引页面读入缓存、生成统计缓存，
+    并走一遍完整的请求处理流程，让第一个真实请求不再承担这些开销"""
+    started = time.perf_counter()
+    connection_count = int(os.getenv('WARMUP_CONNECTIONS', 2))
+    with app.app_context():
+        connections = [db.engine.connect() for _ in range(connection_count)]
+        try:
+            for conn in connections:
+                for _, stmt in endpoint_queries():
+                    conn.execute(stmt).all()
+        finally:
+            for conn in connections:
+                conn.close()
+        public_stats_entry()
+    app.test_client().get('/')
+    return time.perf_counter() - started
+
+
+def init_worker(app):
+    """初始化每个worker进程自己的资源（同一进程内重复调用无副作用）
+
+    fork后的子进程不能复用父进程的数据库连接，后台线程也不会被复制，
+    因此连接池、WAL检查点线程和组提交写线程都在这里按进程创建。
+    """
+    if app.extensions.get('worker_pid') == os.getpid():
+        return
+    app.extensions['worker_pid'] = os.getpid()
+
+    with app.app_context():
+        # 只丢弃继承来的连接，不关闭它们（仍属于父进程）
+        db.engine.dispose(close=False)
+
+    # 定期执行WAL检查点
+    start_wal_checkpointer(app)
+
+    # 组提交模式：表单提交由写线程批量提交（GROUP_COMMIT=1开启）
+    if os.getenv('GROUP_COMMIT', '0') == '1':
+        app.extensions['write_queue'] = GroupCommitQueue(app).start()
+
+    # 定期归档历史数据（ARCHIVE_INTERVAL_HOURS>0时开启，多个worker之间用文件锁互斥）
+    start_archiver(app, db, on_change=invalidate_stats)
+
+    # 公开统计和活动列表读内存快照（READ_SNAPSHOT=1开启）
+    init_read_snapshot(app, db)
+
+    if os.getenv('WARMUP', '1') == '1':
+        elapsed = warmup(app)
+        logger.info('worker %d 预热完成，耗时 %.1fms', os.getpid(), elapsed * 1000)
+
+
+def create_app(worker=False):
+    """创建并配置Flask应用
+
+    默认不初始化worker资源（后台线程、预热等），导入本模块的命令行工具不会启动它们；
+    gunicorn在fork之后对每个worker调用init_worker()（见gunicorn.conf.py），master进程中
+    加载好的模块、路由和配置通过写时复制被所有worker共享。worker=True时立即初始化当前进程。
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+
+    # 配置应用
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///./instance/bciai_club.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # 每个worker的连接池配置
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 3600)),
+    }
+
+    # 部署在Nginx之后时，按X-Forwarded-For还原客户端IP（TRUSTED_PROXY_COUNT为可信代理层数）
+    init_proxy_fix(app)
+
+    # 启用CORS
+    CORS(app, resources={r"/*": {"origins": "*"}})
+
+    # 初始化数据库：建表并执行迁移
+    db.init_app(app)
+    init_database(app)
+
+    # 请求计时、SQL计数和 /metrics 接口
+    init_metrics(app, db)
+
+    # 按IP和路由限流，超限请求在进入数据库之前返回429
+    init_rate_limit(app)
+
+    # 按Accept-Encoding压缩较大的响应
+    init_compression(app)
+
+    app.register_blueprint(api)
+
+    if worker:
+        init_worker(app)
+
+    logger.info('应用初始化完成，耗时 %.1fms', (time.perf_counter() - started) * 1000)
+    return app
+
+
 # 导出应用实例供WSGI服务器使用
+app = create_app()
+
 if __name__ == '__main__':
+    # 直接运行时由当前进程处理请求，在这里启动worker资源
+    init_worker(app)
     # 生产环境不使用debug模式
     port = int(os.getenv('PORT', 8000))
     print(f"生产环境后端服务启动中...")
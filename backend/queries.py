@@ -0,0 +1,65 @@
+"""
+接口查询语句
+
+申请列表、统计和活动列表的查询在这里构建，接口和 `python migrations.py check-plans`
+使用同一份语句，查询计划检查的就是线上实际执行的查询。
+"""
+
+from sqlalchemy import and_, func, or_, select
+
+from models import Application, ContactMessage, Event, Newsletter
+import serializers
+
+# 申请列表只返回这些列，避免加载experience、reason等大文本字段
+APPLICATION_LIST_COLUMNS = tuple(getattr(Application, name) for name in serializers.APPLICATION_LIST.names)
+
+
+def application_list(conditions=(), after=None, limit=50):
+    """申请列表：按(created_at, id)降序的游标分页，after为上一页最后一条的(created_at, id)"""
+    stmt = select(*APPLICATION_LIST_COLUMNS).where(*conditions)
+    if after:
+        created_at, row_id = after
+        stmt = stmt.where(or_(
+            Application.created_at < created_at,
+            and_(Application.created_at == created_at, Application.id < row_id)
+        ))
+    return stmt.order_by(Application.created_at.desc(), Application.id.desc()).limit(limit)
+
+
+def filtered_application_ids(conditions):
+    """筛选后的申请id子查询（用于标签统计），没有筛选条件时返回None"""
+    return select(Application.id).where(*conditions) if conditions else None
+
+
+def application_status_counts():
+    """各申请状态的数量"""
+    return select(Application.status, func.count(Application.id)).group_by(Application.status)
+
+
+def stats_counts():
+    """联系消息数、活跃订阅数和活动数，每个计数单独作为子查询"""
+    return select(
+        select(func.count(ContactMessage.id)).scalar_subquery(),
+        active_subscriber_count().scalar_subquery(),
+        select(func.count(Event.id)).scalar_subquery(),
+    )
+
+
+def active_subscriber_count():
+    return select(func.count(Newsletter.id)).where(Newsletter.is_active.is_(True))
+
+
+def events(start=None, end=None, limit=None):
+    """活动列表：按ix_event_date范围扫描，[start, end)，按(date, id)排序"""
+    stmt = select(Event)
+    if start is not None:
+        stmt = stmt.where(Event.date >= start)
+    if end is not None:
+        stmt = stmt.where(Event.date < end)
+    stmt = stmt.order_by(Event.date, Event.id)
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def next_event_start(now):
+    """最早一个未开始的活动的开始时间"""
+    return select(func.min(Event.date)).where(Event.date >= now)
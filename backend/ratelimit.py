@@ -0,0 +1,249 @@
+"""
+跨worker的令牌桶限流
+
+每个客户端IP有一个全局桶，写接口另有按IP+路由的桶。桶的状态保存在共享目录
+（默认/dev/shm）中的一个独立SQLite小文件里，所有gunicorn worker扣减同一份令牌；
+补充和扣减在一条UPSERT语句中完成，因此多进程并发时不会超发。
+超限请求在before_request阶段直接返回429和Retry-After，不会进入ORM和业务数据库。
+一个请求需要同时检查全局桶和路由桶时，只有两个桶都有令牌才各扣一个。
+
+客户端IP取自request.remote_addr：设置了TRUSTED_PROXY_COUNT时由ProxyFix按X-Forwarded-For还原；
+未设置时，来自本机（Nginx经unix socket或127.0.0.1转发）的请求按一层代理还原，见LocalProxyFix。
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from flask import jsonify, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60, 'h': 3600, 'hour': 3600}
+
+# 超过该时间未访问的桶会被清理（届时已经补满，删除不影响限流结果）
+BUCKET_IDLE_SECONDS = 3600
+CLEANUP_EVERY = 1000
+
+_TAKE_SQL = """
+INSERT INTO buckets (key, tokens, updated_at, allowed) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT(key) DO UPDATE SET
+    allowed = min(:capacity, tokens + (:now - updated_at) * :rate) >= 1,
+    tokens = min(:capacity, tokens + (:now - updated_at) * :rate)
+             - (min(:capacity, tokens + (:now - updated_at) * :rate) >= 1),
+    updated_at = :now
+"""
+
+# SQLite 3.35起支持RETURNING，可以在一条语句内完成扣减并取回结果
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def parse_rate(value):
+    """解析 '10/s'、'5/min' 形式的速率，返回每秒补充的令牌数"""
+    try:
+        count, period = value.split('/', 1)
+        return float(count) / PERIODS[period.strip().lower()]
+    except (ValueError, KeyError):
+        raise ValueError(f'无效的限流速率：{value}')
+
+
+class Limit:
+    """一条限流规则：速率（令牌/秒）和桶容量"""
+
+    def __init__(self, rate, burst):
+        self.rate = parse_rate(rate) if isinstance(rate, str) else float(rate)
+        self.burst = max(1, int(burst))
+        if self.rate <= 0:
+            raise ValueError('限流速率必须大于0')
+
+
+def _default_limiter_path():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'bciai_club_ratelimit.db')
+
+
+class TokenBucketStore:
+    """保存在共享SQLite文件中的令牌桶"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('RATE_LIMIT_DB') or _default_limiter_path()
+        self._local = threading.local()
+        self._calls = 0
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, allowed INTEGER NOT NULL)'
+            )
+
+    def _connect(self):
+        # 每个线程一个连接；fork后pid改变时重新连接，不复用父进程的连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, limit, now=None):
+        """尝试从桶中取出一个令牌，返回 (是否允许, 需要等待的秒数)"""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        params = {'key': key, 'capacity': limit.burst, 'rate': limit.rate, 'now': now}
+        if HAS_RETURNING:
+            tokens, allowed = conn.execute(_TAKE_SQL + 'RETURNING tokens, allowed', params).fetchone()
+        else:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(_TAKE_SQL, params)
+                tokens, allowed = conn.execute(
+                    'SELECT tokens, allowed FROM buckets WHERE key = ?', (key,)
+                ).fetchone()
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+
+        self._calls += 1
+        if self._calls % CLEANUP_EVERY == 0:
+            conn.execute('DELETE FROM buckets WHERE updated_at < ?', (now - BUCKET_IDLE_SECONDS,))
+
+        if allowed:
+            return True, 0
+        return False, max(1, math.ceil((1 - tokens) / limit.rate))
+
+    def take_all(self, checks, now=None):
+        """checks为 [(key, limit), ...]：所有桶都有令牌时才各取一个，返回 (是否允许, 需要等待的秒数)"""
+        if len(checks) == 1:
+            return self.take(*checks[0], now=now)
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            for key, limit in checks:
+                row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = limit.burst if row is None else min(limit.burst, row[0] + (now - row[1]) * limit.rate)
+                levels.append(tokens)
+            allowed = all(tokens >= 1 for tokens in levels)
+            conn.executemany(
+                'INSERT INTO buckets (key, tokens, updated_at, allowed) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at, '
+                'allowed = excluded.allowed',
+                [(key, tokens - allowed, now, int(allowed)) for (key, _), tokens in zip(checks, levels)]
+            )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+        if allowed:
+            return True, 0
+        return False, max(max(1, math.ceil((1 - tokens) / limit.rate))
+                          for (_, limit), tokens in zip(checks, levels) if tokens < 1)
+
+    def reset(self):
+        """清空所有桶"""
+        self._connect().execute('DELETE FROM buckets')
+
+
+# 这些地址上的对端是本机的反向代理（unix socket时gunicorn给出空地址）
+LOCAL_PEERS = {None, '', '127.0.0.1', '::1'}
+
+
+class LocalProxyFix:
+    """未设置TRUSTED_PROXY_COUNT时使用：只信任本机对端转发的一层X-Forwarded-For
+
+    按部署指南Nginx通过unix socket或127.0.0.1转发，对端一定是Nginx，可以安全地取
+    它追加的最后一个地址；其他对端发来的X-Forwarded-For可以伪造，保持原地址不变。
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.proxied = ProxyFix(wsgi_app, x_for=1, x_proto=1)
+
+    def __call__(self, environ, start_response):
+        if environ.get('REMOTE_ADDR') in LOCAL_PEERS and 'HTTP_X_FORWARDED_FOR' in environ:
+            return self.proxied(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+
+def init_proxy_fix(app):
+    """按TRUSTED_PROXY_COUNT（可信代理层数）从X-Forwarded-For还原客户端IP，未设置时见LocalProxyFix"""
+    configured = os.getenv('TRUSTED_PROXY_COUNT')
+    if configured is None:
+        app.wsgi_app = LocalProxyFix(app.wsgi_app)
+    elif int(configured) > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(configured), x_proto=int(configured))
+
+
+def _limit_from_env(name, rate, burst):
+    return Limit(os.getenv(f'RATE_LIMIT_{name}', rate), int(os.getenv(f'RATE_LIMIT_{name}_BURST', burst)))
+
+
+# 写接口：(方法, 路由规则) -> 环境变量名前缀
+WRITE_ROUTES = {
+    ('POST', '/api/apply'): 'APPLY',
+    ('POST', '/api/contact'): 'CONTACT',
+    ('POST', '/api/newsletter'): 'NEWSLETTER',
+    ('POST', '/api/newsletter/bulk'): 'NEWSLETTER_BULK',
+    ('PATCH', '/api/applications'): 'ADMIN_WRITE',
+    ('PUT', '/api/applications/<int:application_id>'): 'ADMIN_WRITE',
+}
+
+DEFAULT_WRITE_LIMITS = {
+    'APPLY': ('5/min', 5),
+    'CONTACT': ('5/min', 5),
+    'NEWSLETTER': ('10/min', 10),
+    'NEWSLETTER_BULK': ('1/min', 2),
+    'ADMIN_WRITE': ('5/s', 20),
+}
+
+
+def init_rate_limit(app, store=None):
+    """注册限流钩子（RATE_LIMIT_ENABLED=0 时不启用）"""
+    if os.getenv('RATE_LIMIT_ENABLED', '1') != '1':
+        return None
+
+    store = store or TokenBucketStore()
+    proxy_count = os.getenv('TRUSTED_PROXY_COUNT')
+    warned = []
+    global_limit = _limit_from_env('GLOBAL', '20/s', 40)
+    route_limits = {name: _limit_from_env(name, *default) for name, default in DEFAULT_WRITE_LIMITS.items()}
+
+    @app.before_request
+    def enforce_rate_limit():
+        if not request.path.startswith('/api/') or request.method == 'OPTIONS':
+            return None
+
+        client = request.remote_addr or 'unknown'
+        if proxy_count == '0' and not warned and 'X-Forwarded-For' in request.headers:
+            # 位于代理之后却没有配置代理层数：所有客户端会共用代理地址的额度
+            warned.append(True)
+            logger.error('收到X-Forwarded-For但TRUSTED_PROXY_COUNT=0，限流按对端地址 %s 计算；'
+                         '位于Nginx之后时请把TRUSTED_PROXY_COUNT设为代理层数', client)
+        checks = [(f'ip:{client}', global_limit)]
+        rule = request.url_rule.rule if request.url_rule else None
+        name = WRITE_ROUTES.get((request.method, rule))
+        if name is not None:
+            checks.append((f'route:{name}:{client}', route_limits[name]))
+
+        try:
+            allowed, retry_after = store.take_all(checks)
+        except sqlite3.Error as e:
+            # 限流存储异常时放行，不影响正常业务
+            logger.warning('限流存储访问失败：%s', e)
+            return None
+        if not allowed:
+            response = jsonify({'error': '请求过于频繁，请稍后再试'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        return None
+
+    return store
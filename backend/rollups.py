@@ -0,0 +1,200 @@
+"""
+按天汇总的统计表
+
+申请、联系消息和订阅的数量按 (指标, 维度, 日期, 维度取值) 汇总到daily_rollup表，
+在每次写操作的同一个事务中增量更新，时间序列接口只读这张表，查询成本与原始表大小无关。
+
+- applications：按申请创建日期统计当前的申请数，维度为all/status/position/major/interest，
+  修改申请状态时把计数从旧状态移到新状态
+- contacts：按创建日期统计联系消息数
+- subscriptions：按订阅日期统计当前有效的订阅数，取消订阅时从原订阅日期中扣除
+
+汇总表出现偏差时可以用 `python migrations.py rebuild-rollups` 从原始数据重新生成。
+"""
+
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import Application, ContactMessage, DailyRollup, Newsletter, Tag, application_tag
+import tags
+
+APPLICATIONS = 'applications'
+CONTACTS = 'contacts'
+SUBSCRIPTIONS = 'subscriptions'
+
+ALL = 'all'
+
+# 指标 -> 支持的维度
+DIMENSIONS = {
+    APPLICATIONS: (ALL, 'status', 'position', 'major', tags.INTEREST),
+    CONTACTS: (ALL,),
+    SUBSCRIPTIONS: (ALL,),
+}
+
+INTERVALS = ('day', 'week', 'month')
+
+MAX_VALUE_LENGTH = 100
+
+
+def _day(value):
+    """datetime/date/'YYYY-MM-DD...' 字符串转为date"""
+    if isinstance(value, date):
+        return value if type(value) is date else value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+def bump(executor, deltas):
+    """把 {(指标, 维度, 取值, 日期): 增量} 累加到汇总表（不提交事务）"""
+    rows = [
+        {'metric': metric, 'dimension': dimension, 'value': (value or '')[:MAX_VALUE_LENGTH],
+         'day': _day(day), 'count': delta}
+        for (metric, dimension, value, day), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+    if tags._is_sqlite(executor):
+        stmt = sqlite_insert(DailyRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyRollup.metric, DailyRollup.dimension, DailyRollup.day, DailyRollup.value],
+            set_={'count': DailyRollup.count + stmt.excluded['count']},
+        )
+        executor.execute(stmt, rows)
+        return
+    for row in rows:
+        result = executor.execute(
+            update(DailyRollup)
+            .where(DailyRollup.metric == row['metric'], DailyRollup.dimension == row['dimension'],
+                   DailyRollup.day == row['day'], DailyRollup.value == row['value'])
+            .values(count=DailyRollup.count + row['count'])
+        )
+        if result.rowcount == 0:
+            executor.execute(DailyRollup.__table__.insert(), [row])
+
+
+def application_deltas(created_at, status, position, major, interests, sign=1, deltas=None):
+    """一个申请在各维度上对应的计数增量"""
+    deltas = Counter() if deltas is None else deltas
+    day = _day(created_at)
+    deltas[(APPLICATIONS, ALL, '', day)] += sign
+    deltas[(APPLICATIONS, 'status', status, day)] += sign
+    deltas[(APPLICATIONS, 'position', position, day)] += sign
+    deltas[(APPLICATIONS, 'major', major, day)] += sign
+    for name in tags.split_tags(interests):
+        deltas[(APPLICATIONS, tags.INTEREST, name, day)] += sign
+    return deltas
+
+
+def record_application(executor, application):
+    """新增申请后更新汇总"""
+    bump(executor, application_deltas(
+        application.created_at, application.status, application.position,
+        application.major, application.interests,
+    ))
+
+
+def record_status_changes(executor, changes):
+    """申请状态修改后更新汇总，changes为 [(created_at, 旧状态, 新状态), ...]"""
+    deltas = Counter()
+    for created_at, old, new in changes:
+        if old == new or created_at is None:
+            continue
+        deltas[(APPLICATIONS, 'status', old, _day(created_at))] -= 1
+        deltas[(APPLICATIONS, 'status', new, _day(created_at))] += 1
+    bump(executor, deltas)
+
+
+def record_contact(executor, created_at):
+    """新增联系消息后更新汇总"""
+    bump(executor, {(CONTACTS, ALL, '', created_at): 1})
+
+
+def record_subscriptions(executor, days, sign=1):
+    """订阅或取消订阅后更新汇总，days为对应订阅日期的列表"""
+    deltas = Counter()
+    for day in days:
+        deltas[(SUBSCRIPTIONS, ALL, '', _day(day))] += sign
+    bump(executor, deltas)
+
+
+def _grouped_counts(executor, metric, dimension, day_column, value_column=None, where=(), source=None):
+    """按 (日期, 维度取值) 分组计数，返回与bump相同格式的增量"""
+    day = func.date(day_column)
+    columns = [day] if value_column is None else [day, value_column]
+    stmt = select(*columns, func.count()).where(day_column.is_not(None), *where).group_by(*columns)
+    if source is not None:
+        stmt = stmt.select_from(source)
+    deltas = Counter()
+    for row in executor.execute(stmt):
+        value = row[1] if value_column is not None else ''
+        deltas[(metric, dimension, value or '', _day(row[0]))] += row[-1]
+    return deltas
+
+
+def rebuild(executor):
+    """清空汇总表并从原始数据重新生成（不提交事务）"""
+    executor.execute(delete(DailyRollup))
+
+    for dimension, column in ((ALL, None), ('status', Application.status),
+                              ('position', Application.position), ('major', Application.major)):
+        bump(executor, _grouped_counts(executor, APPLICATIONS, dimension, Application.created_at, column))
+
+    interests = application_tag.join(Application, Application.id == application_tag.c.application_id) \
+        .join(Tag, Tag.id == application_tag.c.tag_id)
+    bump(executor, _grouped_counts(executor, APPLICATIONS, tags.INTEREST, Application.created_at, Tag.name,
+                                   where=[Tag.kind == tags.INTEREST], source=interests))
+
+    bump(executor, _grouped_counts(executor, CONTACTS, ALL, ContactMessage.created_at))
+    bump(executor, _grouped_counts(executor, SUBSCRIPTIONS, ALL, Newsletter.subscribed_at,
+                                   where=[Newsletter.is_active.is_(True)]))
+
+
+def period_start(day, interval):
+    """日期所在统计周期的第一天"""
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _periods(start, end, interval):
+    current = period_start(start, interval)
+    while current <= end:
+        yield current
+        if interval == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=7 if interval == 'week' else 1)
+
+
+def timeseries_query(metric, dimension, start, end):
+    """汇总表中 [start, end] 范围内的行（沿主键范围扫描）"""
+    return (
+        select(DailyRollup.day, DailyRollup.value, DailyRollup.count)
+        .where(DailyRollup.metric == metric, DailyRollup.dimension == dimension,
+               DailyRollup.day >= start, DailyRollup.day <= end)
+    )
+
+
+def timeseries(executor, metric, dimension, start, end, interval='day'):
+    """从汇总表读取 [start, end] 范围内的时间序列，缺失的周期补0"""
+    rows = executor.execute(timeseries_query(metric, dimension, start, end)).all()
+
+    periods = list(_periods(start, end, interval))
+    index = {period: i for i, period in enumerate(periods)}
+    series = {}
+    for day, value, count in rows:
+        if not count:
+            continue
+        counts = series.setdefault(value, [0] * len(periods))
+        counts[index[period_start(_day(day), interval)]] += count
+
+    totals = {value: sum(counts) for value, counts in series.items()}
+    ordered = sorted(series, key=lambda value: (-totals[value], value))
+    return {
+        'periods': [period.isoformat() for period in periods],
+        'series': [{'value': value, 'counts': series[value], 'total': totals[value]} for value in ordered],
+    }
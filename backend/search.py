@@ -0,0 +1,142 @@
+"""
+基于SQLite FTS5的全文搜索
+
+application_fts 和 contact_fts 是外部内容（external content）FTS5表，只保存倒排索引，
+正文仍在原表中。原表上的触发器在插入、更新、删除时同步索引，因此无论数据从哪个接口、
+写队列还是批量任务写入，索引都保持一致。
+使用trigram分词器，中文无需额外分词即可按任意子串搜索（至少3个字符）。
+SQLite不支持FTS5 trigram（3.34之前）时不建立索引，搜索退化为对原表的LIKE匹配。
+返回的摘要片段已做HTML转义，只包含<mark>标签。
+"""
+
+import html
+
+from sqlalchemy import text
+
+# 索引名 -> (原表, 参与搜索的列)
+FTS_INDEXES = {
+    'application_fts': ('application', ('name', 'major', 'experience', 'reason', 'other_info')),
+    'contact_fts': ('contact_message', ('contact_name', 'contact_subject', 'contact_message')),
+}
+
+# trigram分词器能够利用索引的最短查询长度
+MIN_TERM_LENGTH = 3
+
+SNIPPET_TOKENS = 16
+
+
+def fts5_available(conn):
+    """判断当前数据库是否支持FTS5及trigram分词器（仅SQLite，需要3.34以上版本）"""
+    if conn.dialect.name != 'sqlite':
+        return False
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')"))
+        conn.execute(text('DROP TABLE temp.fts5_probe'))
+        return True
+    except Exception:
+        return False
+
+
+def create_fts_indexes(conn):
+    """创建FTS5索引表和同步触发器，并从原表重建索引（幂等）"""
+    for index, (table, columns) in FTS_INDEXES.items():
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+            f"{column_list}, content='{table}', content_rowid='id', tokenize='trigram')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {index}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {index}({index}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE OF {column_list} ON {table} BEGIN "
+            f"INSERT INTO {index}({index}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {index}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        ))
+        conn.execute(text(f"INSERT INTO {index}({index}) VALUES ('rebuild')"))
+
+
+def split_terms(query):
+    """按空白拆分搜索词"""
+    return [term for term in query.split() if term]
+
+
+def _match_expression(terms):
+    """把搜索词转换为FTS5短语查询（多个词之间为AND），避免用户输入被解析为查询语法"""
+    return ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+# 搜索目标 -> (索引名, 原表别名, 返回的列)
+SEARCH_TARGETS = {
+    'applications': ('application_fts', 'a', ('id', 'name', 'position', 'status', 'created_at')),
+    'contacts': ('contact_fts', 'c', ('id', 'contact_name', 'contact_subject', 'is_read', 'created_at')),
+}
+
+# snippet()中标记命中位置的占位符，转义正文之后再替换为<mark>标签
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def has_index(session, index):
+    """索引表是否已经建立（FTS5不可用时迁移不会创建）"""
+    if session.get_bind().dialect.name != 'sqlite':
+        return False
+    return session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': index}
+    ).first() is not None
+
+
+def highlight(fragment):
+    """转义申请人填写的原文，只把命中位置替换为<mark>标签，前端可以直接作为HTML渲染"""
+    escaped = html.escape(fragment or '')
+    return escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search(session, target, query, limit, offset):
+    """在指定目标中搜索，返回结果列表（包含已转义的snippet和score）
+
+    所有搜索词都不少于3个字符且索引已建立时走FTS5索引并按bm25排序；
+    否则退化为对原表的LIKE子串匹配，按时间倒序返回。
+    """
+    index, alias, result_columns = SEARCH_TARGETS[target]
+    table, columns = FTS_INDEXES[index]
+    terms = split_terms(query)
+    params = {'limit': limit, 'offset': offset}
+    selected = ', '.join(f'{alias}.{column}' for column in result_columns)
+
+    if has_index(session, index) and all(len(term) >= MIN_TERM_LENGTH for term in terms):
+        params.update(match=_match_expression(terms), mark_start=MARK_START, mark_end=MARK_END)
+        sql = (
+            f"SELECT {selected}, snippet({index}, -1, :mark_start, :mark_end, '…', {SNIPPET_TOKENS}) AS snippet, "
+            f"-bm25({index}) AS score "
+            f"FROM {index} JOIN {table} {alias} ON {alias}.id = {index}.rowid "
+            f"WHERE {index} MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"
+        )
+    else:
+        conditions = []
+        for i, term in enumerate(terms):
+            params[f'term{i}'] = _like_pattern(term)
+            conditions.append('(' + ' OR '.join(
+                f"{alias}.{column} LIKE :term{i} ESCAPE '\\'" for column in columns) + ')')
+        preview = " || ' ' || ".join(f"coalesce({alias}.{column}, '')" for column in columns)
+        sql = (
+            f"SELECT {selected}, substr({preview}, 1, 80) AS snippet, 0 AS score FROM {table} {alias} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY {alias}.id DESC LIMIT :limit OFFSET :offset"
+        )
+    rows = []
+    for row in session.execute(text(sql), params).mappings():
+        row = dict(row)
+        row['snippet'] = highlight(row['snippet'])
+        rows.append(row)
+    return rows
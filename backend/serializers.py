@@ -0,0 +1,111 @@
+"""
+JSON序列化层
+
+每个模型的输出字段在导入时编译为一个专用函数（类似namedtuple的做法），
+序列化时直接按属性取值，不再逐行手写字典和调用strftime。
+安装了orjson时使用orjson编码，否则退回标准库json。
+"""
+
+import json
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖
+    orjson = None
+
+
+def format_datetime(value):
+    """格式化为 YYYY-MM-DD HH:MM:SS"""
+    return value.isoformat(' ', 'seconds') if value is not None else None
+
+
+def format_minutes(value):
+    """格式化为 YYYY-MM-DD HH:MM"""
+    return value.isoformat(' ', 'minutes') if value is not None else None
+
+
+def split_list(value):
+    """逗号分隔的字符串转为列表"""
+    return value.split(',') if value else []
+
+
+class Projection:
+    """预编译的字段投影
+
+    字段可以是属性名，或 (输出名, 格式化函数)，或 (输出名, 属性名, 格式化函数)。
+    同时适用于ORM对象和按列查询返回的Row。
+    """
+
+    def __init__(self, *fields):
+        self.fields = []
+        for field in fields:
+            if isinstance(field, str):
+                field = (field, field, None)
+            elif len(field) == 2:
+                field = (field[0], field[0], field[1])
+            self.fields.append(field)
+        self.names = [name for name, _, _ in self.fields]
+        self._project = self._compile()
+
+    def _compile(self):
+        namespace = {}
+        items = []
+        for i, (name, source, formatter) in enumerate(self.fields):
+            if not (name.isidentifier() and source.isidentifier()):
+                raise ValueError(f'非法字段名：{name}')
+            if formatter is None:
+                items.append(f'{name!r}: obj.{source}')
+            else:
+                namespace[f'_f{i}'] = formatter
+                items.append(f'{name!r}: _f{i}(obj.{source})')
+        source_code = 'def project(obj):\n    return {' + ', '.join(items) + '}\n'
+        exec(compile(source_code, '<projection>', 'exec'), namespace)
+        return namespace['project']
+
+    def one(self, obj):
+        return self._project(obj)
+
+    def many(self, objs):
+        project = self._project
+        return [project(obj) for obj in objs]
+
+
+def dumps(data):
+    """序列化为UTF-8编码的JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200):
+    """用快速编码器生成JSON响应"""
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+# ---------------------------------------------------------------------------
+# 各接口的字段投影
+# ---------------------------------------------------------------------------
+
+APPLICATION_LIST = Projection(
+    'id', 'name', 'position', 'major', 'email', 'phone', 'status', 'interview_status',
+    ('created_at', format_datetime),
+)
+
+APPLICATION_DETAIL = Projection(
+    'id', 'name', 'student_id', 'email', 'phone', 'major', 'grade', 'position',
+    ('interests', split_list), ('skills', split_list),
+    'team_preference', 'experience', 'reason', 'available_time', 'github_url', 'other_info',
+    'status', 'interview_status', 'interview_notes',
+    ('created_at', format_datetime),
+)
+
+EVENT = Projection(
+    'id', 'title', 'description', ('date', format_minutes), 'location',
+)
+
+CAMPAIGN = Projection(
+    'id', 'subject', 'status', 'total_recipients', 'sent_count', 'failed_count', 'last_error',
+    ('created_at', format_datetime), ('started_at', format_datetime), ('finished_at', format_datetime),
+)
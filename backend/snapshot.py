@@ -0,0 +1,205 @@
+"""
+公开接口的只读内存快照
+
+开启后（READ_SNAPSHOT=1）每个worker在内存中保存一份主数据库的完整副本，
+/api/stats 和 /api/events 只读这份副本，不再与表单提交争用主库的连接池和磁盘I/O，
+统计数据也只在每次生成快照后计算一次：
+
+- 后台线程每隔 READ_SNAPSHOT_INTERVAL_MS 毫秒检查一次主库的 PRAGMA data_version，
+  只有其他连接提交过修改时才用SQLite在线备份API把主库整体复制到一个新的内存数据库
+- 新快照准备好之后整体替换旧快照（替换一个引用），正在处理的请求继续使用旧快照，
+  旧快照在最后一个使用它的请求结束后释放；快照连接设置了query_only，内容不会被修改
+- 公开接口的数据最多比主库落后一个检查周期加一次备份的时间
+"""
+
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = 'read_snapshot'
+_names = itertools.count(1)
+
+
+def _set_query_only(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA query_only=1')
+
+
+class Snapshot:
+    """某一时刻的主库内存副本（不可修改）"""
+
+    def __init__(self, source, generation):
+        self.generation = generation
+        self.taken_at = datetime.utcnow()
+        self.uri = f'file:read_snapshot_{os.getpid()}_{next(_names)}?mode=memory&cache=shared'
+        # 持有一个连接让内存数据库保持存在，其余连接通过共享缓存读取同一份数据
+        self._holder = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        started = time.perf_counter()
+        source.backup(self._holder)
+        self.backup_seconds = time.perf_counter() - started
+        self.engine = create_engine('sqlite://', creator=self._connect, poolclass=QueuePool,
+                                    pool_size=int(os.getenv('READ_SNAPSHOT_POOL_SIZE', 5)), max_overflow=10)
+        # 在models中通用的PRAGMA设置之后执行，快照连接只读
+        event.listen(self.engine, 'connect', _set_query_only)
+        self.Session = scoped_session(sessionmaker(bind=self.engine))
+        self._memo = {}
+        self._users = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+
+    @property
+    def in_use(self):
+        return self._users > 0
+
+    def _connect(self):
+        return sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+
+    def memoize(self, key, compute):
+        """同一快照上的计算结果只算一次（快照不会变化）"""
+        if key not in self._memo:
+            with self._lock:
+                if key not in self._memo:
+                    self._memo[key] = compute()
+        return self._memo[key]
+
+    def close(self):
+        self.Session.remove()
+        self.engine.dispose()
+        self._holder.close()
+
+
+class ReadSnapshot:
+    """维护当前快照并在后台按需刷新（每个worker一个）"""
+
+    def __init__(self, database_path, interval=None):
+        self.database_path = database_path
+        self.interval = interval or float(os.getenv('READ_SNAPSHOT_INTERVAL_MS', 1000)) / 1000
+        self.current = None
+        self.refreshes = 0
+        self._source = None
+        self._data_version = None
+        self._retired = []
+        self._thread = None
+
+    def _open_source(self):
+        source = sqlite3.connect(self.database_path, check_same_thread=False)
+        source.execute(f'PRAGMA busy_timeout={int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))}')
+        source.execute('PRAGMA query_only=1')
+        return source
+
+    def refresh(self, force=False):
+        """主库有变化时生成新快照并替换当前快照，返回是否刷新"""
+        if self._source is None:
+            self._source = self._open_source()
+        # data_version只在其他连接提交修改后变化，读取它不需要等待写锁
+        data_version = self._source.execute('PRAGMA data_version').fetchone()[0]
+        if not force and self.current is not None and data_version == self._data_version:
+            return False
+        snapshot = Snapshot(self._source, self.refreshes + 1)
+        previous, self.current = self.current, snapshot
+        self._data_version = data_version
+        self.refreshes += 1
+        if previous is not None:
+            self._retired.append(previous)
+        self._release_retired()
+        return True
+
+    def _release_retired(self):
+        """释放已被替换且没有请求在使用的快照"""
+        still_used = []
+        for snapshot in self._retired:
+            if snapshot.in_use:
+                still_used.append(snapshot)
+            else:
+                snapshot.close()
+        self._retired = still_used
+
+    def checkout(self):
+        """取出当前快照并登记使用，请求结束时调用release()"""
+        while True:
+            snapshot = self.current.acquire()
+            # 取出后又被替换时改用新快照，避免使用已释放的快照
+            if snapshot is self.current:
+                return snapshot
+            snapshot.release()
+
+    def start(self):
+        """同步生成第一份快照，然后启动后台刷新线程"""
+        self.refresh(force=True)
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    if not self.refresh():
+                        self._release_retired()
+                except Exception as e:
+                    # 刷新失败时继续使用旧快照，下个周期再试
+                    logger.warning('刷新只读快照失败：%s', e)
+                    self._close_source()
+
+        self._thread = threading.Thread(target=run, name='read-snapshot', daemon=True)
+        self._thread.start()
+        return self
+
+    def _close_source(self):
+        if self._source is not None:
+            try:
+                self._source.close()
+            finally:
+                self._source = None
+
+
+def current_snapshot():
+    """当前请求使用的快照（同一个请求内固定为同一份），未开启快照模式时返回None"""
+    if EXTENSION_KEY in g:
+        return g.get(EXTENSION_KEY)
+    manager = current_app.extensions.get(EXTENSION_KEY)
+    snapshot = manager.checkout() if manager is not None else None
+    g.setdefault(EXTENSION_KEY, snapshot)
+    return snapshot
+
+
+def init_read_snapshot(app, db):
+    """READ_SNAPSHOT=1 且主库为SQLite文件时，为当前worker启动只读快照"""
+    if os.getenv('READ_SNAPSHOT', '0') != '1':
+        return None
+    with app.app_context():
+        url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        logger.warning('只读快照只支持SQLite文件数据库，已忽略READ_SNAPSHOT')
+        return None
+
+    manager = ReadSnapshot(url.database).start()
+    app.extensions[EXTENSION_KEY] = manager
+
+    if not app.extensions.get('read_snapshot_teardown'):
+        app.extensions['read_snapshot_teardown'] = True
+
+        @app.teardown_appcontext
+        def release_snapshot_session(exception=None):
+            snapshot = g.pop(EXTENSION_KEY, None)
+            if snapshot is not None:
+                snapshot.Session.remove()
+                snapshot.release()
+
+    logger.info('worker %d 只读快照已生成，耗时 %.1fms', os.getpid(), manager.current.backup_seconds * 1000)
+    return manager
@@ -0,0 +1,156 @@
+"""
+通讯订阅的原子写入
+
+订阅使用 INSERT ... ON CONFLICT(email) DO UPDATE 语句写入，并发提交同一邮箱时
+不会因为唯一约束报IntegrityError。批量导入按块执行，每块一次查询已有邮箱（区分新订阅和
+重新激活）加一条upsert语句、一个事务，并返回每个邮箱的处理结果。
+订阅数的按天汇总（rollups）在同一个事务中更新。
+"""
+
+import re
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import Newsletter
+import rollups
+
+# 每个邮箱的处理结果
+SUBSCRIBED = 'subscribed'                  # 新订阅
+RESUBSCRIBED = 'resubscribed'              # 重新激活
+ALREADY_SUBSCRIBED = 'already_subscribed'  # 已经是活跃订阅
+UNSUBSCRIBED = 'unsubscribed'              # 已取消订阅
+NOT_SUBSCRIBED = 'not_subscribed'          # 不存在或本来就未激活
+INVALID = 'invalid'                        # 邮箱格式错误
+
+# 每行写入的列；多行VALUES的每一行占用同样多的绑定参数
+ROW_COLUMNS = ('email', 'subscribed_at', 'is_active')
+# SQLite 3.32之前单条语句最多999个绑定参数
+SQLITE_MAX_VARIABLES = 999
+# 每条upsert语句包含的邮箱数
+CHUNK_SIZE = SQLITE_MAX_VARIABLES // len(ROW_COLUMNS)
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def normalize_emails(emails):
+    """去除空白并去重，返回(有效邮箱列表, 无效输入列表)，保持原有顺序"""
+    valid, invalid, seen = [], [], set()
+    for raw in emails:
+        email = raw.strip() if isinstance(raw, str) else ''
+        if not email or len(email) > 100 or not EMAIL_PATTERN.match(email):
+            invalid.append(raw)
+        elif email not in seen:
+            seen.add(email)
+            valid.append(email)
+    return valid, invalid
+
+
+def _existing_status(session, emails):
+    """查询这块邮箱中已存在的订阅及其是否活跃"""
+    return dict(session.execute(
+        select(Newsletter.email, Newsletter.is_active).where(Newsletter.email.in_(emails))
+    ).all())
+
+
+def _row(email, now):
+    return dict(zip(ROW_COLUMNS, (email, now, True)))
+
+
+def _classify(is_active):
+    """按写入前的状态（None表示不存在）得到订阅结果"""
+    if is_active is None:
+        return SUBSCRIBED
+    return ALREADY_SUBSCRIBED if is_active else RESUBSCRIBED
+
+
+def _subscribe_chunk_sqlite(session, emails, now):
+    # 先查出已存在的邮箱用于区分新订阅和重新激活（不能用last_insert_rowid()判断，
+    # 它可能是同一连接上插入其他表时留下的值）
+    existing = _existing_status(session, emails)
+    stmt = sqlite_insert(Newsletter).values([_row(email, now) for email in emails])
+    # 更新值取自excluded，语句的绑定参数只有每行的列值
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Newsletter.email],
+        set_={'is_active': stmt.excluded.is_active, 'subscribed_at': stmt.excluded.subscribed_at},
+        where=Newsletter.is_active.is_(False),
+    )
+
+    if not session.get_bind().dialect.insert_returning:
+        # SQLite 3.35之前不支持RETURNING，按查询结果分类；查询之后被并发请求写入的邮箱
+        # 由upsert保证不报错，只是结果可能记为新订阅或重新激活
+        session.execute(stmt)
+        return {email: _classify(existing.get(email)) for email in emails}
+
+    # 只有新插入或被重新激活的行会出现在RETURNING中；查询之后被并发请求抢先激活的邮箱
+    # 不会出现，仍按已订阅处理
+    outcomes = dict.fromkeys(emails, ALREADY_SUBSCRIBED)
+    for email in session.execute(stmt.returning(Newsletter.email)).scalars():
+        outcomes[email] = RESUBSCRIBED if email in existing else SUBSCRIBED
+    return outcomes
+
+
+def _subscribe_chunk_generic(session, emails, now):
+    # 非SQLite数据库：每块一次查询、一次批量插入和一次批量更新
+    existing = _existing_status(session, emails)
+    outcomes = {email: _classify(existing.get(email)) for email in emails}
+    new_rows = [_row(email, now) for email, outcome in outcomes.items() if outcome == SUBSCRIBED]
+    if new_rows:
+        session.execute(Newsletter.__table__.insert(), new_rows)
+    inactive = [email for email, outcome in outcomes.items() if outcome == RESUBSCRIBED]
+    if inactive:
+        session.execute(
+            update(Newsletter).where(Newsletter.email.in_(inactive))
+            .values(is_active=True, subscribed_at=now)
+        )
+    return outcomes
+
+
+def subscribe(session, emails, now=None):
+    """批量订阅（不提交事务），返回 {邮箱: 处理结果}"""
+    now = now or datetime.utcnow()
+    if session.get_bind().dialect.name == 'sqlite':
+        outcomes = _subscribe_chunk_sqlite(session, emails, now)
+    else:
+        outcomes = _subscribe_chunk_generic(session, emails, now)
+    activated = sum(1 for outcome in outcomes.values() if outcome in (SUBSCRIBED, RESUBSCRIBED))
+    rollups.record_subscriptions(session, [now] * activated)
+    return outcomes
+
+
+def unsubscribe(session, emails):
+    """批量取消订阅（不提交事务），返回 {邮箱: 处理结果}"""
+    stmt = (
+        update(Newsletter)
+        .where(Newsletter.email.in_(emails), Newsletter.is_active.is_(True))
+        .values(is_active=False)
+    )
+    if session.get_bind().dialect.update_returning:
+        changed = session.execute(stmt.returning(Newsletter.email, Newsletter.subscribed_at)).all()
+    else:
+        changed = session.execute(
+            select(Newsletter.email, Newsletter.subscribed_at)
+            .where(Newsletter.email.in_(emails), Newsletter.is_active.is_(True))
+        ).all()
+        session.execute(stmt)
+    outcomes = dict.fromkeys(emails, NOT_SUBSCRIBED)
+    for email, _ in changed:
+        outcomes[email] = UNSUBSCRIBED
+    rollups.record_subscriptions(session, [subscribed_at for _, subscribed_at in changed if subscribed_at], sign=-1)
+    return outcomes
+
+
+def apply_in_chunks(session, action, emails, chunk_size=CHUNK_SIZE):
+    """按块执行批量订阅/取消订阅，每块单独提交，返回 {邮箱: 处理结果}"""
+    operation = subscribe if action == 'subscribe' else unsubscribe
+    outcomes = {}
+    for start in range(0, len(emails), chunk_size):
+        chunk = emails[start:start + chunk_size]
+        try:
+            outcomes.update(operation(session, chunk))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+    return outcomes
@@ -0,0 +1,146 @@
+"""
+申请的兴趣方向/技术技能标签
+
+Application.interests 和 Application.skills 仍以逗号分隔字符串保存，便于直接展示；
+同时拆分写入tag表和application_tag关联表，按标签筛选和统计时只走关联表索引，
+不需要对每一行做LIKE匹配或在Python中拆分字符串。
+"""
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import Application, Tag, application_tag
+
+INTEREST = 'interest'
+SKILL = 'skill'
+
+# 查询参数名 -> 标签类型
+FACET_PARAMS = {
+    'interests': INTEREST,
+    'skills': SKILL,
+}
+
+MAX_TAG_LENGTH = 50
+
+
+def split_tags(value):
+    """把逗号分隔的字符串拆分为去重后的标签列表"""
+    names = []
+    for name in (value or '').split(','):
+        name = name.strip()[:MAX_TAG_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _is_sqlite(executor):
+    """executor可以是Session或Connection"""
+    dialect = executor.dialect if hasattr(executor, 'dialect') else executor.get_bind().dialect
+    return dialect.name == 'sqlite'
+
+
+def get_tag_ids(executor, kind, names):
+    """返回 {标签名: id}，不存在的标签会被创建"""
+    if not names:
+        return {}
+    rows = [{'kind': kind, 'name': name} for name in names]
+    if _is_sqlite(executor):
+        executor.execute(sqlite_insert(Tag).values(rows).on_conflict_do_nothing())
+    else:
+        existing = set(executor.execute(
+            select(Tag.name).where(Tag.kind == kind, Tag.name.in_(names))
+        ).scalars())
+        missing = [row for row in rows if row['name'] not in existing]
+        if missing:
+            executor.execute(Tag.__table__.insert(), missing)
+    return dict(executor.execute(
+        select(Tag.name, Tag.id).where(Tag.kind == kind, Tag.name.in_(names))
+    ).all())
+
+
+def set_application_tags(executor, tagged):
+    """写入申请的标签关联
+
+    tagged 为 [(application_id, interests字符串, skills字符串), ...]，
+    同一批申请的标签合并为每种类型一次查询、一次批量插入。
+    """
+    names_by_kind = {INTEREST: set(), SKILL: set()}
+    parsed = []
+    for application_id, interests, skills in tagged:
+        item = (application_id, split_tags(interests), split_tags(skills))
+        names_by_kind[INTEREST].update(item[1])
+        names_by_kind[SKILL].update(item[2])
+        parsed.append(item)
+
+    ids = {kind: get_tag_ids(executor, kind, sorted(names)) for kind, names in names_by_kind.items()}
+    links = []
+    for application_id, interests, skills in parsed:
+        links.extend({'application_id': application_id, 'tag_id': ids[INTEREST][name]} for name in interests)
+        links.extend({'application_id': application_id, 'tag_id': ids[SKILL][name]} for name in skills)
+    if links:
+        stmt = application_tag.insert()
+        if _is_sqlite(executor):
+            stmt = stmt.prefix_with('OR IGNORE')
+        executor.execute(stmt, links)
+
+
+def backfill(conn, chunk_size=500):
+    """为已有申请补写标签关联（幂等，已有关联会被忽略）"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(Application.id, Application.interests, Application.skills)
+            .where(Application.id > last_id)
+            .order_by(Application.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        set_application_tags(conn, [tuple(row) for row in rows])
+        last_id = rows[-1].id
+
+
+def has_tag(kind, name):
+    """筛选条件：申请带有指定标签"""
+    return Application.id.in_(
+        select(application_tag.c.application_id)
+        .join(Tag, Tag.id == application_tag.c.tag_id)
+        .where(Tag.kind == kind, Tag.name == name)
+    )
+
+
+def parse_facet_filters(args):
+    """从查询参数解析标签筛选，返回 [(类型, 标签名), ...]，多个值用逗号分隔"""
+    filters = []
+    for param, kind in FACET_PARAMS.items():
+        for value in args.getlist(param):
+            filters.extend((kind, name) for name in split_tags(value))
+    return filters
+
+
+def facet_counts_query(application_ids=None):
+    """各标签下申请数量的查询，application_ids为筛选后的申请id子查询（None表示全部）
+
+    按关联表的tag_id分组，未筛选时顺序读取ix_application_tag_tag_id即可完成分组。
+    """
+    stmt = (
+        select(Tag.kind, Tag.name, func.count(application_tag.c.application_id))
+        .select_from(application_tag)
+        .join(Tag, Tag.id == application_tag.c.tag_id)
+        .group_by(application_tag.c.tag_id)
+        .order_by(func.count(application_tag.c.application_id).desc(), Tag.name)
+    )
+    if application_ids is not None:
+        stmt = stmt.where(application_tag.c.application_id.in_(application_ids))
+    return stmt
+
+
+def facet_counts(executor, application_ids=None):
+    """统计各标签下的申请数量，application_ids为筛选后的申请id子查询（None表示全部）"""
+    stmt = facet_counts_query(application_ids)
+    facets = {param: [] for param in FACET_PARAMS}
+    params = {kind: param for param, kind in FACET_PARAMS.items()}
+    for kind, name, count in executor.execute(stmt):
+        if kind in params:
+            facets[params[kind]].append({'name': name, 'count': count})
+    return facets
@@ -4,6 +4,7 @@
 """
 SAU脑机与人工智能俱乐部网站 - 部署测试脚本
 此脚本用于验证部署后的网站功能是否正常工作
+使用 --benchmark 参数进入并发压测模式（参数详见 benchmark.py）
 """
 
 import requests
@@ -186,6 +187,11 @@ def print_summary():
 
 def main():
     """主函数"""
+    # 压测模式：python test_deployment.py --benchmark [压测参数]
+    if len(sys.argv) > 1 and sys.argv[1] == '--benchmark':
+        import benchmark
+        sys.exit(benchmark.main(sys.argv[2:]))
+    
     print_header()
     
     # 获取命令行参数（如果提供）
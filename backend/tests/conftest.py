@@ -0,0 +1,53 @@
+"""
+测试公共配置
+
+导入production_start之前把数据库、缓存、指标和限流文件都指向临时目录，
+每个测试使用独立的SQLite数据库。
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_workdir = tempfile.mkdtemp(prefix='bciai_tests_')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_workdir, 'import.db')}",
+    'CACHE_DIR': os.path.join(_workdir, 'cache'),
+    'METRICS_DIR': os.path.join(_workdir, 'metrics'),
+    'RATE_LIMIT_DB': os.path.join(_workdir, 'ratelimit.db'),
+    'RATE_LIMIT_ENABLED': '0',
+    'WARMUP': '0',
+})
+
+
+@pytest.fixture
+def app_env():
+    """测试模块可以覆盖这个fixture，为create_app()额外设置环境变量"""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, app_env):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    for name, value in app_env.items():
+        monkeypatch.setenv(name, value)
+    from models import db
+    from production_start import CALENDAR_CACHE_KEY, create_app, invalidate_stats, stats_cache
+
+    app = create_app()
+    invalidate_stats()
+    stats_cache.delete(CALENDAR_CACHE_KEY)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
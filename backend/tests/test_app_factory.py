@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+THREADS_AFTER_IMPORT = (
+    'import threading, production_start\n'
+    'print(sorted(thread.name for thread in threading.enumerate()))\n'
+)
+
+
+def test_import_does_not_start_worker_services(tmp_path):
+    # 命令行工具只导入production_start，不应启动后台线程或预热
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'cli.db'}", WARMUP='1',
+               GROUP_COMMIT='1', READ_SNAPSHOT='1', ARCHIVE_INTERVAL_HOURS='1')
+    output = subprocess.run([sys.executable, '-c', THREADS_AFTER_IMPORT], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "['MainThread']"
+
+
+def test_init_worker_starts_services_once(app, monkeypatch):
+    from production_start import init_worker
+
+    monkeypatch.setenv('GROUP_COMMIT', '1')
+    init_worker(app)
+    write_queue = app.extensions['write_queue']
+    init_worker(app)
+    assert app.extensions['write_queue'] is write_queue
@@ -0,0 +1,80 @@
+from models import Application
+
+
+def apply(client, i, **fields):
+    body = dict(name=f'学生{i}', student_id=f'2024{i:04d}', email=f's{i}@example.com', phone='13800000000',
+                major='计算机', position='开发')
+    body.update(fields)
+    return client.post('/api/apply', json=body)
+
+
+def statuses(app):
+    with app.app_context():
+        return {a.id: a.status for a in Application.query.order_by(Application.id)}
+
+
+def test_batch_update(app, client):
+    for i in range(3):
+        assert apply(client, i).status_code == 201
+
+    response = client.patch('/api/applications', json={'updates': [
+        {'id': 1, 'status': 'approved'},
+        {'id': 2, 'status': 'rejected'},
+        {'id': 3},
+        {'id': 99, 'status': 'approved'},
+    ]})
+
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [
+        {'id': 1, 'result': 'updated'},
+        {'id': 2, 'result': 'updated'},
+        {'id': 3, 'result': 'no_changes'},
+        {'id': 99, 'result': 'not_found'},
+    ]
+    assert statuses(app) == {1: 'approved', 2: 'rejected', 3: 'pending'}
+
+
+def test_batch_update_rejects_duplicate_ids(app, client):
+    for i in range(2):
+        apply(client, i)
+
+    response = client.patch('/api/applications', json={'updates': [
+        {'id': 1, 'status': 'approved'},
+        {'id': 2, 'status': 'approved'},
+        {'id': 1, 'status': 'rejected'},
+    ]})
+
+    assert response.status_code == 400
+    assert response.get_json()['duplicate_ids'] == [1]
+    assert statuses(app) == {1: 'pending', 2: 'pending'}
+
+
+def test_batch_update_rejects_bool_id(app, client):
+    apply(client, 1)
+
+    response = client.patch('/api/applications', json={'updates': [{'id': True, 'status': 'approved'}]})
+
+    assert response.status_code == 400
+    assert statuses(app) == {1: 'pending'}
+
+
+def test_batch_update_validates_values(app, client):
+    for i in range(2):
+        apply(client, i)
+
+    response = client.patch('/api/applications', json={'updates': [
+        {'id': 1, 'status': 'archived'},
+        {'id': 2, 'interview_status': 'scheduled', 'interview_notes': ['不是字符串']},
+    ]})
+
+    assert response.status_code == 400
+    assert response.get_json()['invalid'] == [
+        {'id': 1, 'fields': ['status']},
+        {'id': 2, 'fields': ['interview_notes']},
+    ]
+    assert statuses(app) == {1: 'pending', 2: 'pending'}
+
+    response = client.patch('/api/applications', json={'updates': [
+        {'id': 1, 'interview_status': 'scheduled', 'interview_notes': None},
+    ]})
+    assert response.status_code == 200
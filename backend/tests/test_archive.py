@@ -0,0 +1,31 @@
+import importlib
+import os
+import sys
+
+import archive
+
+
+def test_import_does_not_require_fcntl(monkeypatch):
+    # Windows没有fcntl，production_start导入archive时不能失败
+    monkeypatch.setitem(sys.modules, 'fcntl', None)
+    importlib.reload(archive)
+    monkeypatch.undo()
+    importlib.reload(archive)
+
+
+def test_archive_db_sits_next_to_engine_database(app, tmp_path, monkeypatch):
+    from models import db
+
+    monkeypatch.delenv('ARCHIVE_DATABASE_URL', raising=False)
+    monkeypatch.chdir(tmp_path.parent)
+    with app.app_context():
+        url = archive.archive_url_for(db.engine.url)
+    assert url == f"sqlite:///{tmp_path / 'test_archive.db'}"
+
+
+def test_lock_is_exclusive(tmp_path):
+    path = tmp_path / 'archive.lock'
+    with open(path, 'w') as first, open(path, 'w') as second:
+        assert archive._try_lock(first)
+        assert not archive._try_lock(second)
+    assert os.path.exists(path)
@@ -0,0 +1,33 @@
+import json
+import time
+
+from cache import SharedCache
+
+
+def test_result_computed_before_invalidation_is_not_cached(tmp_path):
+    cache = SharedCache(cache_dir=str(tmp_path))
+
+    def compute_during_write():
+        # 计算过程中另一个worker提交了写操作
+        cache.invalidate('stats')
+        return 'stale'
+
+    assert cache.get_or_set('stats', compute_during_write) == 'stale'
+    assert cache.get('stats') is None
+    assert cache.get_or_set('stats', lambda: 'fresh') == 'fresh'
+    assert cache.get('stats') == 'fresh'
+
+
+def test_entry_written_with_old_generation_is_ignored(tmp_path):
+    cache = SharedCache(cache_dir=str(tmp_path))
+    generation = cache.generation('stats')
+    cache.invalidate('stats')
+
+    assert cache.set('stats', 'stale', generation=generation) is False
+    assert cache.get('stats') is None
+
+    # 检查代数之后、替换文件之前发生的失效：条目带着旧代数写入，读取时被忽略
+    entry = {'expires_at': time.time() + 60, 'generation': generation, 'value': 'stale'}
+    with open(tmp_path / 'stats.json', 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    assert cache.get('stats') is None
@@ -0,0 +1,44 @@
+import gzip
+from datetime import datetime
+
+from models import db, Event
+
+
+def add_events(count):
+    db.session.add_all([Event(title=f'活动{i}', description='介绍' * 50, date=datetime(2030, 1, 1 + i % 28),
+                              location='A101') for i in range(count)])
+    db.session.commit()
+
+
+def test_large_json_is_gzipped_with_a_weak_etag(app, client):
+    with app.app_context():
+        add_events(30)
+    plain = client.get('/api/events')
+
+    response = client.get('/api/events', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == plain.get_data()
+    assert response.headers['ETag'].startswith('W/')
+
+    # 客户端带着压缩响应的弱ETag验证时仍然返回304
+    revalidated = client.get('/api/events', headers={'Accept-Encoding': 'gzip',
+                                                     'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_small_response_is_not_compressed(client):
+    response = client.get('/api/events', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streamed_export_is_compressed_incrementally(app, client):
+    for i in range(20):
+        client.post('/api/contact', json={'contact-name': f'访客{i}', 'contact-email': f'v{i}@example.com',
+                                          'contact-subject': '咨询', 'contact-message': '你好' * 20})
+    plain = client.get('/api/export/contacts?format=ndjson').get_data()
+
+    response = client.get('/api/export/contacts?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert gzip.decompress(response.get_data()) == plain
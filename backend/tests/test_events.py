@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from models import db, Event
+
+
+def add_event(title, date):
+    db.session.add(Event(title=title, description='d', date=date, location='l'))
+    db.session.commit()
+
+
+def test_upcoming_etag_changes_when_an_event_starts(app, client):
+    with app.app_context():
+        add_event('soon', datetime.now() + timedelta(seconds=1))
+        add_event('later', datetime.now() + timedelta(days=7))
+
+    first = client.get('/api/events?upcoming=1')
+    assert [e['title'] for e in first.get_json()['events']] == ['soon', 'later']
+    etag = first.headers['ETag']
+    assert client.get('/api/events?upcoming=1', headers={'If-None-Match': etag}).status_code == 304
+
+    # 没有任何写入，只是时间过去了
+    with app.app_context():
+        db.session.query(Event).filter(Event.title == 'soon').update(
+            {Event.date: datetime.now() - timedelta(minutes=1), Event.updated_at: Event.updated_at})
+        db.session.commit()
+
+    response = client.get('/api/events?upcoming=1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [e['title'] for e in response.get_json()['events']] == ['later']
+
+
+def test_full_list_keeps_last_modified(app, client):
+    with app.app_context():
+        add_event('a', datetime(2030, 1, 1))
+    response = client.get('/api/events')
+    assert response.headers.get('Last-Modified')
+    assert client.get('/api/events', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_deleting_an_event_is_not_hidden_by_if_modified_since(app, client):
+    with app.app_context():
+        add_event('a', datetime(2030, 1, 1))
+        add_event('b', datetime(2030, 2, 1))
+    first = client.get('/api/events')
+
+    # 删除较早修改的活动，max(updated_at)不变
+    with app.app_context():
+        db.session.query(Event).filter(Event.title == 'a').delete()
+        db.session.commit()
+
+    response = client.get('/api/events', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 200
+    assert [e['title'] for e in response.get_json()['events']] == ['b']
+    assert client.get('/api/events', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+
+def titles(response):
+    assert response.status_code == 200
+    return [e['title'] for e in response.get_json()['events']]
+
+
+def test_date_range_and_limit(app, client):
+    with app.app_context():
+        for day in (3, 1, 2, 5, 4):
+            add_event(f'day{day}', datetime(2030, 3, day, 19))
+        add_event('day2-morning', datetime(2030, 3, 2, 9))
+
+    assert titles(client.get('/api/events')) == ['day1', 'day2-morning', 'day2', 'day3', 'day4', 'day5']
+    # 只给日期的to包含当天
+    assert titles(client.get('/api/events?from=2030-03-02&to=2030-03-03')) == ['day2-morning', 'day2', 'day3']
+    assert titles(client.get('/api/events?from=2030-03-02T12:00&limit=2')) == ['day2', 'day3']
+    assert client.get('/api/events?from=next-week').status_code == 400
+
+
+def test_calendar_feed(app, client):
+    with app.app_context():
+        add_event('很久以前', datetime.now() - timedelta(days=60))
+        db.session.add(Event(title='分享会; 第一期', description='第一行\n' + '很长的描述' * 20,
+                             date=datetime(2030, 5, 1, 19, 30), location='A101, 二楼'))
+        db.session.commit()
+
+    response = client.get('/api/events.ics')
+    assert response.mimetype == 'text/calendar'
+    body = response.get_data(as_text=True)
+    assert body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n')
+    assert '很久以前' not in body
+    assert 'SUMMARY:分享会\\; 第一期' in body
+    assert 'LOCATION:A101\\, 二楼' in body
+    assert 'DTSTART:20300501T193000' in body
+    assert all(len(line.encode('utf-8')) <= 75 for line in body.split('\r\n'))
+
+    etag = response.headers['ETag']
+    assert client.get('/api/events.ics', headers={'If-None-Match': etag}).status_code == 304
+    with app.app_context():
+        event = Event.query.filter(Event.date > datetime.now()).one()
+        event.title = '改名后的分享会'
+        db.session.commit()
+    response = client.get('/api/events.ics', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'SUMMARY:改名后的分享会' in response.get_data(as_text=True)
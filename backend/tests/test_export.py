@@ -0,0 +1,34 @@
+import csv
+import io
+import json
+
+CONTACT = {'contact-name': '张三', 'contact-email': 'zhangsan@example.com',
+           'contact-subject': '咨询', 'contact-message': '你好'}
+
+
+def test_application_export_omits_internal_columns(client):
+    body = dict(name='张三', student_id='20240001', email='zhangsan@example.com', phone='13800000000',
+                major='计算机', position='开发')
+    assert client.post('/api/apply', json=body).status_code == 201
+
+    response = client.get('/api/export/applications')
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True).lstrip('\ufeff'))))
+    assert 'submission_hash' not in rows[0]
+    assert dict(zip(*rows))['student_id'] == '20240001'
+
+    response = client.get('/api/export/applications', query_string={'format': 'ndjson'})
+    record = json.loads(response.get_data(as_text=True).splitlines()[0])
+    assert 'submission_hash' not in record and record['name'] == '张三'
+
+
+def test_contact_export_status_filter(client):
+    assert client.post('/api/contact', json=CONTACT).status_code == 201
+
+    unread = client.get('/api/export/contacts', query_string={'format': 'ndjson', 'status': 'unread'})
+    assert len(unread.get_data(as_text=True).splitlines()) == 1
+    read = client.get('/api/export/contacts', query_string={'format': 'ndjson', 'status': 'read'})
+    assert read.get_data(as_text=True) == ''
+
+    assert client.get('/api/export/contacts', query_string={'status': 'archived'}).status_code == 400
+    assert client.get('/api/export/applications', query_string={'status': 'unread'}).status_code == 400
@@ -0,0 +1,29 @@
+from models import Application, ContactMessage
+
+APPLICATION = dict(name='张三', student_id='20240001', email='zhangsan@example.com', phone='13800000000',
+                   major='计算机', position='开发')
+CONTACT = {'contact-name': '李四', 'contact-email': 'lisi@example.com',
+           'contact-subject': '咨询', 'contact-message': '你好'}
+
+
+def test_retry_with_same_key_replays_response(app, client):
+    headers = {'Idempotency-Key': 'key-1'}
+    first = client.post('/api/apply', json=APPLICATION, headers=headers)
+    retry = client.post('/api/apply', json=APPLICATION, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    with app.app_context():
+        assert Application.query.count() == 1
+
+
+def test_same_key_with_different_body_is_rejected(app, client):
+    headers = {'Idempotency-Key': 'key-2'}
+    assert client.post('/api/contact', json=CONTACT, headers=headers).status_code == 201
+
+    changed = dict(CONTACT, **{'contact-message': '改过的内容'})
+    assert client.post('/api/contact', json=changed, headers=headers).status_code == 422
+    # 前端在内容改变后换新键
+    assert client.post('/api/contact', json=changed, headers={'Idempotency-Key': 'key-3'}).status_code == 201
+    with app.app_context():
+        assert ContactMessage.query.count() == 2
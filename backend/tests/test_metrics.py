@@ -0,0 +1,44 @@
+import json
+import os
+
+import metrics
+
+
+def write_worker(directory, pid, count, started=1):
+    path = os.path.join(directory, f'worker_{pid}_{started}.json')
+    with open(path, 'w') as f:
+        json.dump({'http_requests_total': {'{}': count}}, f)
+    return path
+
+
+def total(registry):
+    return registry.collect().get('http_requests_total', {}).get('{}', 0)
+
+
+def test_dead_worker_files_are_folded_and_removed(tmp_path):
+    directory = str(tmp_path)
+    registry = metrics.MetricsRegistry(directory)
+    first = write_worker(directory, 101, 3)
+    write_worker(directory, 102, 4)
+    assert total(registry) == 7
+
+    metrics.mark_process_dead(101, directory)
+    assert not os.path.exists(first)
+    assert total(registry) == 7
+
+    # pid被新worker复用时，新文件照常计数，退出后同样并入
+    write_worker(directory, 101, 5, started=2)
+    assert total(registry) == 12
+    metrics.mark_process_dead(101, directory)
+    metrics.mark_process_dead(102, directory)
+    assert total(registry) == 12
+    assert sorted(os.listdir(directory)) == [metrics.DEAD_WORKERS_FILE]
+
+
+def test_reset_directory(tmp_path):
+    directory = str(tmp_path)
+    write_worker(directory, 7, 1)
+    metrics.mark_process_dead(7, directory)
+    write_worker(directory, 8, 1)
+    metrics.reset_directory(directory)
+    assert os.listdir(directory) == []
@@ -0,0 +1,74 @@
+import threading
+
+from sqlalchemy import create_engine, inspect, select, text
+
+from models import schema_migrations
+import migrations
+
+
+def test_concurrent_runners_apply_each_migration_once(tmp_path):
+    for attempt in range(5):
+        url = f"sqlite:///{tmp_path / f'concurrent{attempt}.db'}"
+        engines = [create_engine(url) for _ in range(3)]
+        barrier = threading.Barrier(len(engines))
+        results, errors = [], []
+
+        def run(engine):
+            barrier.wait()
+            try:
+                results.append(migrations.run_migrations(engine, create_tables=True))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(engine,)) for engine in engines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        versions = [version for version, _, _ in migrations.MIGRATIONS]
+        # 只有一个进程执行了全部迁移，其余进程拿到锁后发现已是最新版本
+        assert sorted(results) == [[], [], versions]
+        with engines[0].connect() as conn:
+            assert sorted(conn.execute(select(schema_migrations.c.version)).scalars()) == versions
+            assert 'submission_hash' in {c['name'] for c in inspect(conn).get_columns('application')}
+        for engine in engines:
+            engine.dispose()
+
+
+def test_rerun_is_noop(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rerun.db'}")
+    assert migrations.run_migrations(engine, create_tables=True)
+    assert migrations.run_migrations(engine, create_tables=True) == []
+    engine.dispose()
+
+
+def test_endpoint_queries_use_indexes(app):
+    from models import db
+
+    with app.app_context():
+        assert migrations.check_query_plans(db.engine) == []
+
+
+def test_checked_list_query_selects_served_columns():
+    import serializers
+
+    stmt = dict(migrations.endpoint_queries())['申请列表']
+    assert list(stmt.selected_columns.keys()) == list(serializers.APPLICATION_LIST.names)
+
+
+def test_check_plans_reports_stats_scan_without_index(app):
+    from models import db
+
+    with app.app_context():
+        db.session.execute(text('DROP INDEX ix_contact_message_is_read_created_at'))
+        db.session.commit()
+        problems = migrations.check_query_plans(db.engine)
+
+    assert problems == ['联系消息、订阅者和活动计数: SCAN contact_message']
+
+
+def test_facet_queries_are_checked():
+    names = {name for name, _ in migrations.endpoint_queries()}
+    assert {'按标签筛选申请列表', '标签统计', '筛选结果的标签统计', '联系消息、订阅者和活动计数'} <= names
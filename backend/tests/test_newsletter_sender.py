@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from mail_benchmark import LocalSMTPServer
+from mailer import FAILED, SENT, SMTPPool
+from models import db, Newsletter, NewsletterCampaign, NewsletterDelivery
+import newsletter_sender
+
+
+@pytest.fixture
+def smtp_server():
+    server = LocalSMTPServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def add_subscribers(count, inactive=0):
+    now = datetime.utcnow()
+    db.session.add_all([Newsletter(email=f'user{i}@example.com', subscribed_at=now, is_active=True)
+                        for i in range(count)])
+    db.session.add_all([Newsletter(email=f'gone{i}@example.com', subscribed_at=now, is_active=False)
+                        for i in range(inactive)])
+    db.session.commit()
+
+
+def new_campaign():
+    campaign = newsletter_sender.create_campaign(db.session, '十月通讯', '本月活动安排')
+    db.session.commit()
+    return campaign.id
+
+
+def pool_for(server, **options):
+    return SMTPPool(host='127.0.0.1', port=server.port, size=3, backoff=0.001, **options)
+
+
+def test_campaign_sends_one_message_per_active_subscriber(app, smtp_server):
+    with app.app_context():
+        add_subscribers(120, inactive=5)
+        campaign_id = new_campaign()
+
+    report = newsletter_sender.run_campaign(app, campaign_id, pool=pool_for(smtp_server, messages_per_connection=50))
+
+    assert report['status'] == newsletter_sender.COMPLETED
+    assert report['sent'] == 120 and report['failed'] == 0
+    assert set(smtp_server.received) == {f'user{i}@example.com' for i in range(120)}
+    assert set(smtp_server.received.values()) == {1}
+    with app.app_context():
+        campaign = db.session.get(NewsletterCampaign, campaign_id)
+        assert (campaign.total_recipients, campaign.sent_count, campaign.failed_count) == (120, 120, 0)
+        assert {d.status for d in NewsletterDelivery.query} == {SENT}
+
+    # 已完成的任务不会被再次执行
+    assert newsletter_sender.run_campaign(app, campaign_id, pool=pool_for(smtp_server)) is None
+
+
+def test_rejections_are_recorded_and_resume_skips_sent(app):
+    server = LocalSMTPServer(reject_rate=0.2, temp_fail_rate=0.1, seed=7).start()
+    try:
+        with app.app_context():
+            add_subscribers(80)
+            campaign_id = new_campaign()
+
+        report = newsletter_sender.run_campaign(app, campaign_id, pool=pool_for(server, max_retries=5))
+
+        assert report['sent'] + report['failed'] == 80
+        assert report['failed'] == len(server.rejected) > 0
+        assert report['retries'] >= server.temp_failures > 0
+        with app.app_context():
+            failed = {d.email for d in NewsletterDelivery.query.filter(NewsletterDelivery.status == FAILED)}
+        assert failed == server.rejected
+
+        # 模拟中断：任务失败，最后几个收件人还没有发送
+        with app.app_context():
+            unsent = [d.id for d in NewsletterDelivery.query.filter(NewsletterDelivery.status == SENT)
+                      .order_by(NewsletterDelivery.id.desc()).limit(5)]
+            NewsletterDelivery.query.filter(NewsletterDelivery.id.in_(unsent)).update(
+                {NewsletterDelivery.status: newsletter_sender.PENDING})
+            db.session.get(NewsletterCampaign, campaign_id).status = newsletter_sender.CAMPAIGN_FAILED
+            db.session.commit()
+
+        # 继续发送只投递未发送的收件人
+        received = sum(server.received.values())
+        server.reject_rate = server.temp_fail_rate = 0
+        report = newsletter_sender.run_campaign(app, campaign_id, pool=pool_for(server), resume=True)
+        assert (report['status'], report['sent'], report['failed']) == (newsletter_sender.COMPLETED, 5, 0)
+        assert sum(server.received.values()) == received + 5
+    finally:
+        server.shutdown()
+        server.server_close()
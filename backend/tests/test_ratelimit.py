@@ -0,0 +1,63 @@
+import pytest
+
+from ratelimit import Limit, TokenBucketStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TokenBucketStore(str(tmp_path / 'buckets.db'))
+
+
+def test_rejected_route_does_not_spend_global_token(store):
+    global_limit = Limit('1/h', 3)
+    route_limit = Limit('1/h', 1)
+    checks = [('ip:1.2.3.4', global_limit), ('route:APPLY:1.2.3.4', route_limit)]
+
+    assert store.take_all(checks, now=1000)[0]
+    allowed, retry_after = store.take_all(checks, now=1000)
+    assert not allowed and retry_after > 0
+
+    # 路由桶拒绝的请求没有扣全局令牌：全局桶还剩2个
+    assert store.take('ip:1.2.3.4', global_limit, now=1000)[0]
+    assert store.take('ip:1.2.3.4', global_limit, now=1000)[0]
+    assert not store.take('ip:1.2.3.4', global_limit, now=1000)[0]
+
+
+def test_global_rejection_does_not_spend_route_token(store):
+    global_limit = Limit('1/h', 1)
+    route_limit = Limit('1/h', 2)
+    store.take('ip:a', global_limit, now=0)
+
+    assert not store.take_all([('ip:a', global_limit), ('route:APPLY:a', route_limit)], now=0)[0]
+    assert store.take('route:APPLY:a', route_limit, now=0)[0]
+    assert store.take('route:APPLY:a', route_limit, now=0)[0]
+
+
+class TestBehindLocalProxy:
+
+    @pytest.fixture
+    def app_env(self, tmp_path):
+        return {'RATE_LIMIT_ENABLED': '1', 'RATE_LIMIT_DB': str(tmp_path / 'limits.db'),
+                'RATE_LIMIT_CONTACT': '2/h', 'RATE_LIMIT_CONTACT_BURST': '2'}
+
+    @pytest.fixture(autouse=True)
+    def no_proxy_count(self, monkeypatch):
+        monkeypatch.delenv('TRUSTED_PROXY_COUNT', raising=False)
+
+    def post(self, client, forwarded_for):
+        return client.post('/api/contact', environ_base={'REMOTE_ADDR': '127.0.0.1'},
+                           headers={'X-Forwarded-For': forwarded_for},
+                           json={'contact-name': 'a', 'contact-email': 'a@example.com',
+                                 'contact-subject': 's', 'contact-message': 'm'})
+
+    def test_clients_behind_nginx_get_separate_buckets(self, client):
+        assert [self.post(client, '10.0.0.1').status_code for _ in range(3)] == [201, 201, 429]
+        assert self.post(client, '10.0.0.2').status_code == 201
+
+    def test_remote_peer_cannot_spoof_forwarded_for(self, client):
+        statuses = [client.post('/api/contact', environ_base={'REMOTE_ADDR': '203.0.113.9'},
+                                headers={'X-Forwarded-For': f'10.0.0.{i}'},
+                                json={'contact-name': 'a', 'contact-email': 'a@example.com',
+                                      'contact-subject': 's', 'contact-message': 'm'}).status_code
+                    for i in range(3)]
+        assert statuses == [201, 201, 429]
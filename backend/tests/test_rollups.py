@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from models import db, DailyRollup
+import rollups
+
+
+def apply(client, i, **fields):
+    body = dict(name=f'学生{i}', student_id=f'2024{i:04d}', email=f's{i}@example.com', phone='13800000000',
+                major='计算机', position='开发')
+    body.update(fields)
+    assert client.post('/api/apply', json=body).status_code == 201
+
+
+def series(client, **params):
+    today = datetime.utcnow().date().isoformat()
+    response = client.get('/api/stats/timeseries', query_string=dict({'from': today, 'to': today}, **params))
+    assert response.status_code == 200
+    return {s['value']: s['total'] for s in response.get_json()['series']}
+
+
+def rollup_rows(app):
+    with app.app_context():
+        return sorted((r.metric, r.dimension, r.value, r.day, r.count)
+                      for r in DailyRollup.query.filter(DailyRollup.count != 0))
+
+
+def test_writes_update_rollups_incrementally(app, client):
+    apply(client, 1, interests=['脑机接口'])
+    apply(client, 2, position='设计', interests=['脑机接口', '机器学习'])
+    assert client.patch('/api/applications', json={'updates': [{'id': 1, 'status': 'approved'}]}).status_code == 200
+    assert client.post('/api/newsletter', json={'email': 'a@example.com'}).status_code == 201
+
+    assert series(client) == {'': 2}
+    assert series(client, dimension='status') == {'approved': 1, 'pending': 1}
+    assert series(client, dimension='position') == {'开发': 1, '设计': 1}
+    assert series(client, dimension='interest') == {'脑机接口': 2, '机器学习': 1}
+    assert series(client, metric='subscriptions') == {'': 1}
+
+    client.post('/api/newsletter/bulk', json={'action': 'unsubscribe', 'emails': ['a@example.com']})
+    assert series(client, metric='subscriptions') == {}
+
+
+def test_rebuild_matches_incremental_counts(app, client):
+    apply(client, 1, interests=['脑机接口'])
+    apply(client, 2, interests=['机器学习'])
+    client.patch('/api/applications', json={'updates': [{'id': 2, 'status': 'rejected'}]})
+    incremental = rollup_rows(app)
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            rollups.rebuild(conn)
+    assert rollup_rows(app) == incremental
+
+
+def test_weekly_series_fills_empty_periods(app, client):
+    apply(client, 1)
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=20)
+    response = client.get('/api/stats/timeseries', query_string={
+        'interval': 'week', 'from': start.isoformat(), 'to': today.isoformat()})
+    body = response.get_json()
+
+    assert body['periods'][0] == rollups.period_start(start, 'week').isoformat()
+    assert len(body['periods']) in (3, 4)
+    assert body['periods'][-1] == rollups.period_start(today, 'week').isoformat()
+    assert body['series'][0]['counts'] == [0] * (len(body['periods']) - 1) + [1]
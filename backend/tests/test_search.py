@@ -0,0 +1,82 @@
+import pytest
+
+from models import db, Application
+import migrations
+import search
+
+
+def apply(client, i, **fields):
+    body = dict(name=f'学生{i}', student_id=f'2024{i:04d}', email=f's{i}@example.com', phone='13800000000',
+                major='计算机', position='开发')
+    body.update(fields)
+    assert client.post('/api/apply', json=body).status_code == 201
+
+
+def hits(client, q, target='applications'):
+    response = client.get('/api/search', query_string={'q': q, 'type': target})
+    assert response.status_code == 200
+    return response.get_json()['results'][target]['hits']
+
+
+def test_fts_match_ranks_and_highlights(client):
+    apply(client, 1, experience='做过脑电信号分类项目')
+    apply(client, 2, experience='喜欢机器学习')
+
+    found = hits(client, '脑电信号')
+    assert [hit['name'] for hit in found] == ['学生1']
+    assert '<mark>脑电信号</mark>' in found[0]['snippet']
+
+
+def test_short_term_uses_like(client):
+    apply(client, 1, experience='会用Go')
+    apply(client, 2, experience='会用Python')
+
+    found = hits(client, 'Go')
+    assert [hit['name'] for hit in found] == ['学生1']
+    assert found[0]['score'] == 0
+
+
+def test_snippet_escapes_submitted_html(client):
+    apply(client, 1, experience='熟悉前端 <img src=x onerror=alert(1)> 开发')
+
+    for q in ('<img', 'x'):  # FTS5和LIKE两条路径
+        snippet = hits(client, q)[0]['snippet']
+        assert '&lt;' in snippet
+        assert '<' not in snippet.replace('<mark>', '').replace('</mark>', '')
+
+
+def test_triggers_follow_update_and_delete(app, client):
+    apply(client, 1, experience='研究脑机接口')
+    with app.app_context():
+        application = Application.query.one()
+        application.experience = '研究强化学习'
+        db.session.commit()
+    assert hits(client, '脑机接口') == []
+    assert len(hits(client, '强化学习')) == 1
+
+    with app.app_context():
+        db.session.delete(Application.query.one())
+        db.session.commit()
+    assert hits(client, '强化学习') == []
+
+
+@pytest.fixture
+def without_fts5(monkeypatch):
+    # SQLite 3.34之前没有trigram分词器
+    monkeypatch.setattr(search, 'fts5_available', lambda conn: False)
+    return monkeypatch
+
+
+def test_without_fts5_migration_stays_pending_and_search_uses_like(without_fts5, app, client):
+    with app.app_context():
+        assert 4 not in migrations.applied_versions(db.engine)
+        assert not search.has_index(db.session, 'application_fts')
+
+    apply(client, 1, experience='研究脑机接口')
+    assert [hit['name'] for hit in hits(client, '脑机接口')] == ['学生1']
+
+    # 数据库升级后重新执行迁移即可建立索引
+    without_fts5.undo()
+    with app.app_context():
+        assert migrations.run_migrations(db.engine) == [4]
+    assert '<mark>' in hits(client, '脑机接口')[0]['snippet']
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import db, Event
+from snapshot import EXTENSION_KEY, init_read_snapshot
+
+
+@pytest.fixture
+def app_env():
+    # 后台线程不会在测试期间刷新，由测试显式调用refresh()
+    return {'READ_SNAPSHOT': '1', 'READ_SNAPSHOT_INTERVAL_MS': '3600000'}
+
+
+def add_event(title):
+    db.session.add(Event(title=title, description='d', date=datetime(2030, 1, 1), location='l'))
+    db.session.commit()
+
+
+def titles(client):
+    return [e['title'] for e in client.get('/api/events').get_json()['events']]
+
+
+@pytest.fixture
+def manager(app):
+    with app.app_context():
+        add_event('a')
+    manager = init_read_snapshot(app, db)
+    yield manager
+    manager.current.close()
+
+
+def test_public_reads_come_from_the_snapshot(app, client, manager):
+    assert titles(client) == ['a']
+    assert client.get('/api/stats').get_json()['total_events'] == 1
+
+    with app.app_context():
+        add_event('b')
+    # 快照刷新之前公开接口仍读取旧数据
+    assert titles(client) == ['a']
+    assert manager.refresh() is True
+    assert titles(client) == ['a', 'b']
+    assert client.get('/api/stats').get_json()['total_events'] == 2
+
+    # 没有新的提交时不重新复制
+    assert manager.refresh() is False
+
+
+def test_snapshot_is_read_only(manager):
+    session = manager.current.Session
+    with pytest.raises(OperationalError):
+        session.execute(text("UPDATE event SET title = 'x'"))
+    session.rollback()
+    session.remove()
+
+
+def test_replaced_snapshot_lives_until_released(app, manager):
+    with app.app_context():
+        old = manager.checkout()
+        add_event('b')
+        manager.refresh()
+
+        # 请求仍在使用旧快照：内容不变且没有被关闭
+        assert manager.current is not old
+        assert old.Session.execute(text('SELECT count(*) FROM event')).scalar() == 1
+        old.Session.remove()
+        old.release()
+        manager._release_retired()
+        assert manager._retired == []
+        assert app.extensions[EXTENSION_KEY] is manager
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import db, Newsletter
+import subscriptions
+
+
+CONTACT = {
+    'contact-name': '张三',
+    'contact-email': 'zhangsan@example.com',
+    'contact-subject': '咨询',
+    'contact-message': '你好',
+}
+
+
+def test_new_email_after_insert_into_other_table(client):
+    # 同一连接上先插入其他表，last_insert_rowid()不再对应订阅表
+    assert client.post('/api/contact', json=CONTACT).status_code == 201
+
+    response = client.post('/api/newsletter', json={'email': 'new@example.com'})
+    assert response.status_code == 201
+
+    response = client.post('/api/newsletter/bulk', json={'emails': ['bulk@example.com']})
+    assert response.get_json()['results'] == [{'email': 'bulk@example.com', 'result': subscriptions.SUBSCRIBED}]
+
+
+def test_subscribe_classifies_each_email(app):
+    with app.app_context():
+        db.session.add_all([
+            Newsletter(email='active@example.com', subscribed_at=datetime.utcnow(), is_active=True),
+            Newsletter(email='inactive@example.com', subscribed_at=datetime.utcnow(), is_active=False),
+        ])
+        db.session.commit()
+
+        outcomes = subscriptions.apply_in_chunks(
+            db.session, 'subscribe', ['active@example.com', 'inactive@example.com', 'fresh@example.com'])
+
+        assert outcomes == {
+            'active@example.com': subscriptions.ALREADY_SUBSCRIBED,
+            'inactive@example.com': subscriptions.RESUBSCRIBED,
+            'fresh@example.com': subscriptions.SUBSCRIBED,
+        }
+        assert db.session.query(Newsletter).filter(Newsletter.is_active.is_(True)).count() == 3
+
+
+def test_resubscribe_and_duplicate(client):
+    assert client.post('/api/newsletter', json={'email': 'a@example.com'}).status_code == 201
+    assert client.post('/api/newsletter', json={'email': 'a@example.com'}).status_code == 400
+
+    client.post('/api/newsletter/bulk', json={'action': 'unsubscribe', 'emails': ['a@example.com']})
+    response = client.post('/api/newsletter', json={'email': 'a@example.com'})
+    assert response.status_code == 200
+
+
+def test_subscribe_without_returning(app, monkeypatch):
+    # SQLite 3.35之前没有RETURNING
+    with app.app_context():
+        monkeypatch.setattr(db.engine.dialect, 'insert_returning', False)
+        db.session.add(Newsletter(email='inactive@example.com', subscribed_at=datetime.utcnow(), is_active=False))
+        db.session.commit()
+
+        outcomes = subscriptions.apply_in_chunks(db.session, 'subscribe', ['inactive@example.com', 'fresh@example.com'])
+        again = subscriptions.apply_in_chunks(db.session, 'subscribe', ['fresh@example.com'])
+
+        assert outcomes == {'inactive@example.com': subscriptions.RESUBSCRIBED,
+                            'fresh@example.com': subscriptions.SUBSCRIBED}
+        assert again == {'fresh@example.com': subscriptions.ALREADY_SUBSCRIBED}
+        assert db.session.query(Newsletter).filter(Newsletter.is_active.is_(True)).count() == 2
+
+
+def test_chunk_stays_under_sqlite_variable_limit(app):
+    parameter_counts = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO newsletter'):
+            parameter_counts.append(len(parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            emails = [f'user{i}@example.com' for i in range(1000)]
+            outcomes = subscriptions.apply_in_chunks(db.session, 'subscribe', emails)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert set(outcomes.values()) == {subscriptions.SUBSCRIBED}
+    assert parameter_counts and max(parameter_counts) <= subscriptions.SQLITE_MAX_VARIABLES
@@ -0,0 +1,47 @@
+from models import db, Application, application_tag
+import tags
+
+
+def apply(client, i, **fields):
+    body = dict(name=f'学生{i}', student_id=f'2024{i:04d}', email=f's{i}@example.com', phone='13800000000',
+                major='计算机', position='开发')
+    body.update(fields)
+    assert client.post('/api/apply', json=body).status_code == 201
+
+
+def names(response):
+    return sorted(a['name'] for a in response.get_json()['applications'])
+
+
+def test_facet_filter_and_counts(client):
+    apply(client, 1, interests=['脑机接口', '机器学习'], skills='Python, C++')
+    apply(client, 2, interests=['机器学习'], skills=['Python'])
+    apply(client, 3, interests=['脑机接口'], skills=['Java'])
+
+    response = client.get('/api/applications', query_string={'skills': 'Python'})
+    assert names(response) == ['学生1', '学生2']
+    facets = response.get_json()['facets']
+    assert facets['skills'] == [{'name': 'Python', 'count': 2}, {'name': 'C++', 'count': 1}]
+    assert facets['interests'] == [{'name': '机器学习', 'count': 2}, {'name': '脑机接口', 'count': 1}]
+
+    # 多个值之间为AND
+    response = client.get('/api/applications', query_string={'skills': 'Python', 'interests': '脑机接口'})
+    assert names(response) == ['学生1']
+
+    response = client.get('/api/applications', query_string={'facets': '1'})
+    assert {f['name']: f['count'] for f in response.get_json()['facets']['interests']} == {'脑机接口': 2, '机器学习': 2}
+
+
+def test_backfill_tags_existing_applications(app, client):
+    with app.app_context():
+        db.session.add(Application(name='旧申请', student_id='20230001', email='old@example.com', phone='1',
+                                   major='计算机', position='开发', interests='脑机接口,机器学习', skills='Python'))
+        db.session.commit()
+
+        for _ in range(2):  # 重复执行不会产生重复关联
+            with db.engine.begin() as conn:
+                tags.backfill(conn)
+        assert db.session.query(application_tag).count() == 3
+
+    response = client.get('/api/applications', query_string={'interests': '脑机接口'})
+    assert names(response) == ['旧申请']
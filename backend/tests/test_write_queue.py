@@ -0,0 +1,59 @@
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from models import ContactMessage
+from write_queue import GroupCommitQueue
+
+
+def add_contact(name, calls=None):
+    def work(session):
+        if calls is not None:
+            calls.append(name)
+        session.add(ContactMessage(contact_name=name, contact_email='a@example.com',
+                                   contact_subject='s', contact_message='m'))
+        return name
+    return work
+
+
+def test_concurrent_submissions_share_a_batch(app):
+    write_queue = GroupCommitQueue(app, max_delay=0.2)
+    flushed = []
+    original = write_queue._flush
+    write_queue._flush = lambda batch: (flushed.append(len(batch)), original(batch))
+
+    threads = [threading.Thread(target=write_queue.submit, args=(add_contact(f'n{i}'),)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(flushed) == 5 and len(flushed) < 5
+    with app.app_context():
+        assert ContactMessage.query.count() == 5
+
+
+def test_timed_out_submission_is_not_committed(app):
+    write_queue = GroupCommitQueue(app, max_delay=0, timeout=0.1)
+    release = threading.Event()
+
+    def slow(session):
+        release.wait(5)
+        return add_contact('slow')(session)
+
+    blocker = threading.Thread(target=write_queue.submit, args=(slow,))
+    blocker.start()
+    time.sleep(0.05)
+
+    calls = []
+    with pytest.raises(FutureTimeoutError):
+        write_queue.submit(add_contact('late', calls))
+    release.set()
+    blocker.join()
+    time.sleep(0.1)
+
+    assert calls == []
+    with app.app_context():
+        assert [m.contact_name for m in ContactMessage.query.all()] == ['slow']